@@ -0,0 +1,118 @@
+"""
+Memory of active routes as plain dicts (the old pipeline) vs Route models
+
+Builds N synthetic routes in both shapes plus their fetch plans (a dict of
+route lists per key for dicts, a SubscriptionIndex for models) and reports
+tracemalloc sizes. No database needed:
+
+    python -m benchmarks.bench_models_memory [--routes 100000]
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+from models import Route
+from services.subscription_index import SubscriptionIndex
+
+CLASSES = ["Л", "К", "П", "С1", "С2", "С3"]
+
+
+def make_rows(routes: int) -> List[Dict[str, Any]]:
+    random.seed(1)
+    start = date.today()
+    rows = []
+
+    for route_id in range(1, routes + 1):
+        dates = sorted({start + timedelta(days=random.randint(0, 45)) for _ in range(random.randint(1, 8))})
+        rows.append({
+            "id": route_id,
+            "user_id": route_id // 3,
+            "station_from_id": 2200001 + random.randint(0, 200),
+            "station_from_name": "Київ-Пасажирський",
+            "station_to_id": 2218000 + random.randint(0, 200),
+            "station_to_name": "Львів",
+            "dates": dates,
+            "wagon_classes": random.sample(CLASSES, random.randint(1, 3)),
+            "is_active": True,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "telegram_id": 100000000 + route_id,
+            "username": f"user{route_id}",
+            "row_hash": random.getrandbits(31),
+        })
+
+    return rows
+
+
+def as_dicts(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # What dict(record) + json.loads produced before: fresh dicts, ISO strings, lists
+    return [
+        {
+            **row,
+            "dates": [travel_date.isoformat() for travel_date in row["dates"]],
+            "wagon_classes": list(row["wagon_classes"]),
+        }
+        for row in rows
+    ]
+
+
+def dict_plan(routes: List[Dict[str, Any]]) -> Dict[tuple, List[Dict[str, Any]]]:
+    plan: Dict[tuple, List[Dict[str, Any]]] = {}
+    for route in routes:
+        for travel_date in set(route["dates"]):
+            plan.setdefault((route["station_from_id"], route["station_to_id"], travel_date), []).append(route)
+    return plan
+
+
+def as_models(rows: List[Dict[str, Any]]) -> List[Route]:
+    return [Route.from_record(row) for row in rows]
+
+
+def index_models(routes: List[Route]) -> Tuple[Dict[int, Route], SubscriptionIndex]:
+    # The index only holds route ids, so keep the routes alive as the registry does
+    return {route.id: route for route in routes}, SubscriptionIndex.from_routes(routes)
+
+
+def measure(build: Callable[[], Any]) -> Dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"mb": round(current / 2 ** 20, 1), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def run(routes: int):
+    rows = make_rows(routes)
+
+    dict_routes = measure(lambda: as_dicts(rows))
+    model_routes = measure(lambda: as_models(rows))
+    dict_routes_and_plan = measure(lambda: dict_plan(as_dicts(rows)))
+    model_routes_and_plan = measure(lambda: index_models(as_models(rows)))
+
+    print(json.dumps({
+        "routes": routes,
+        "dicts": dict_routes,
+        "models": model_routes,
+        "dicts_with_plan": dict_routes_and_plan,
+        "models_with_plan": model_routes_and_plan,
+        "bytes_per_route": {
+            "dicts": round(dict_routes["mb"] * 2 ** 20 / routes),
+            "models": round(model_routes["mb"] * 2 ** 20 / routes),
+        }
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=100000)
+    args = parser.parse_args()
+    run(args.routes)
+
+
+if __name__ == "__main__":
+    main()
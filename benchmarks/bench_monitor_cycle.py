@@ -0,0 +1,409 @@
+"""
+Full monitor cycles at 1k, 10k and 100k routes against the local UZ stand-in
+
+Seeds a throwaway schema in BENCH_DATABASE_URL (defaults to DATABASE_URL)
+with synthetic users and routes. A few popular station pairs and
+near-term dates (weekends especially) take most routes, as in production.
+benchmarks/fake_uz.py then runs in a child process, and
+TicketMonitor.check_all_routes is run with every fetch key due:
+
+    python -m benchmarks.bench_monitor_cycle [--sizes 1000 10000 100000] [--cycles 3] [--output results.json]
+
+Each cycle reports:
+- wall time and the UZ requests the fake served, by status
+- DB round-trips, counted per db helper from ukz_db_query_seconds.
+  A raw connection (transactions, COPY) counts once, as "acquire".
+- notifications queued
+- event-loop lag: how late a 10 ms ticker woke up
+- peak RSS of this process so far; run one size per invocation to compare memory
+
+The first cycle of each size is cold: it loads the registry and the
+snapshots. The UZ response cache is off unless --cache-ttl is given, so
+every cycle reaches the fake. Results are printed as JSON along with the
+current git commit, so runs can be diffed between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import aiohttp
+import asyncpg
+from config import config
+from db.database import db
+from services.monitor import PollScheduler, TicketMonitor
+from services.notifier import NotificationDispatcher
+from utils.metrics import db_query_seconds, keys_fetched, metrics
+from utils.rate_limiter import TokenBucket
+from uz_api.client import UZApiClient
+from uz_api.session_pool import SessionPool
+from benchmarks.fake_uz import SCENARIO, load_scenario
+
+SCHEMA = "bench_monitor_cycle"
+CLASSES = ["Л", "К", "П", "С1", "С2"]
+STATIONS = 150
+
+
+class NullBot:
+    """Accepts every message, so notification delivery costs no network time"""
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return None
+
+
+class LoopLagProbe:
+    """Measures how late a fixed-interval ticker is woken up by the event loop"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.lags = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        lags = sorted(self.lags) or [0.0]
+        return {
+            "mean_ms": round(sum(lags) / len(lags) * 1000, 2),
+            "p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+            "max_ms": round(lags[-1] * 1000, 2),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+
+def bench_dsn() -> str:
+    dsn = os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL)
+    separator = "&" if "?" in dsn else "?"
+    return f"{dsn}{separator}search_path={SCHEMA}"
+
+
+def make_routes(count: int, horizon_days: int, seed: int):
+    """Users, routes and route dates with skewed pair popularity and date overlap"""
+    rng = random.Random(seed)
+    today = date.today()
+    users = max(1, count // 3)
+
+    # Hub stations take part in most pairs, and a few pairs take most routes
+    stations = [2200001 + i for i in range(STATIONS)]
+    hub_weights = [1 / (rank + 1) for rank in range(STATIONS)]
+    pair_count = min(max(count // 10, 50), 5000)
+    pairs = []
+    seen = set()
+    while len(pairs) < pair_count:
+        station_from, station_to = rng.choices(stations, hub_weights, k=2)
+        if station_from != station_to and (station_from, station_to) not in seen:
+            seen.add((station_from, station_to))
+            pairs.append((station_from, station_to))
+    pair_weights = list(accumulate(1 / (rank + 1) for rank in range(pair_count)))
+
+    days = list(range(1, horizon_days + 1))
+    day_weights = [
+        (2 if (today + timedelta(days=day)).weekday() in (4, 6) else 1) / (1 + day / 7)
+        for day in days
+    ]
+
+    routes = []
+    route_dates = []
+    for route_id in range(1, count + 1):
+        station_from, station_to = rng.choices(pairs, cum_weights=pair_weights)[0]
+        start = rng.choices(days, day_weights)[0]
+        length = rng.choices([1, 2, 3, 5, 7], [45, 20, 15, 12, 8])[0]
+        if rng.random() < 0.4:
+            # A date range, as added with the +5 days button
+            offsets = range(start, min(start + length, horizon_days + 1))
+        else:
+            offsets = {start} | {
+                min(horizon_days, max(1, start + rng.randint(-7, 7))) for _ in range(length - 1)
+            }
+        wagon_classes = rng.sample(CLASSES, rng.choices([1, 2, 3], [50, 35, 15])[0])
+        routes.append((
+            route_id,
+            rng.randint(1, users),
+            station_from,
+            station_to,
+            json.dumps(wagon_classes, ensure_ascii=False),
+            rng.random() < 0.9
+        ))
+        route_dates.extend((route_id, today + timedelta(days=offset)) for offset in sorted(offsets))
+
+    return users, routes, route_dates
+
+
+async def seed(count: int, horizon_days: int, seed_value: int) -> int:
+    users, routes, route_dates = make_routes(count, horizon_days, seed_value)
+
+    async with db.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO users (id, telegram_id, username)
+            SELECT i, 1000000 + i, 'user' || i FROM generate_series(1, $1) AS i
+            """,
+            users
+        )
+        ids, user_ids, froms, tos, wagon_classes, active = zip(*routes)
+        await conn.execute(
+            """
+            INSERT INTO routes
+            (id, user_id, station_from_id, station_from_name, station_to_id, station_to_name,
+             wagon_classes, is_active)
+            SELECT id, user_id, station_from_id, 'Станція ' || station_from_id,
+                   station_to_id, 'Станція ' || station_to_id, wagon_classes::jsonb, is_active
+            FROM unnest($1::int[], $2::int[], $3::int[], $4::int[], $5::text[], $6::bool[])
+                AS r(id, user_id, station_from_id, station_to_id, wagon_classes, is_active)
+            """,
+            list(ids), list(user_ids), list(froms), list(tos), list(wagon_classes), list(active)
+        )
+        route_ids, travel_dates = zip(*route_dates)
+        await conn.execute(
+            "INSERT INTO route_dates (route_id, travel_date) SELECT * FROM unnest($1::int[], $2::date[])",
+            list(route_ids), list(travel_dates)
+        )
+        await conn.execute("INSERT INTO monitorings (route_id) SELECT id FROM routes")
+        await conn.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), $1)", users)
+        await conn.execute("SELECT setval(pg_get_serial_sequence('routes', 'id'), $1)", count)
+        await conn.execute("ANALYZE")
+
+    return len(route_dates)
+
+
+def write_scenario(args) -> Path:
+    """The sample scenario with the benchmark's latency, faults and seat churn"""
+    scenario = load_scenario(SCENARIO)
+    scenario["seed"] = args.seed
+    scenario["latency"] = {"distribution": "lognormal", "median_ms": args.uz_latency_ms, "sigma": 0.5, "max_ms": 2000}
+    if not args.faults:
+        scenario["faults"] = {}
+        scenario["incidents"] = []
+    scenario["generated"]["change_every_seconds"] = args.seat_change_seconds
+
+    handle, path = tempfile.mkstemp(prefix="fake_uz_", suffix=".json")
+    with os.fdopen(handle, "w", encoding="utf-8") as file:
+        json.dump(scenario, file, ensure_ascii=False)
+    return Path(path)
+
+
+async def start_fake_uz(args, scenario: Path) -> Tuple[asyncio.subprocess.Process, str]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.fake_uz",
+        "--scenario", str(scenario), "--port", str(args.uz_port),
+        stdout=asyncio.subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{args.uz_port}"
+
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f"{url}/_fake/stats") as response:
+                    if response.status == 200:
+                        return process, url
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+
+    process.kill()
+    raise RuntimeError(f"Fake UZ didn't start on {url}")
+
+
+async def fake_uz_stats(url: str) -> Dict[str, Any]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/_fake/stats") as response:
+            return await response.json()
+
+
+def samples_by_label(metric, suffix: str, label: str) -> Dict[str, float]:
+    return {
+        labels[label]: value
+        for name, labels, value in metric.samples()
+        if name.endswith(suffix)
+    }
+
+
+def difference(after: Dict[str, float], before: Dict[str, float]) -> Dict[str, int]:
+    return {
+        key: int(value - before.get(key, 0))
+        for key, value in after.items() if value - before.get(key, 0)
+    }
+
+
+def uz_requests(stats: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        f"{endpoint}:{status}": count
+        for endpoint, statuses in stats["by_endpoint"].items()
+        for status, count in statuses.items()
+    }
+
+
+def git_commit() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True, text=True, cwd=Path(__file__).parent, check=False
+    )
+    return result.stdout.strip() or None
+
+
+def make_client(args, url: str) -> UZApiClient:
+    return UZApiClient(
+        rate_limiter=TokenBucket(args.uz_rate, burst=max(1, int(args.uz_rate))),
+        executor=ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="uz-http"),
+        session_pool=SessionPool(size=args.concurrency, proxy_urls=[None]),
+        base_url=f"{url}/api/"
+    )
+
+
+async def run_cycles(args, url: str) -> Dict[str, Any]:
+    monitor = TicketMonitor(NullBot())
+    monitor.uz_client = make_client(args, url)
+    monitor.notifier = NotificationDispatcher(
+        NullBot(), workers=config.NOTIFY_WORKERS, global_rate=1e6, chat_rate=1e6, queue_size=10 ** 7
+    )
+    monitor.notifier.start()
+    probe = LoopLagProbe()
+    cycles = []
+
+    try:
+        for cycle in range(args.cycles):
+            if cycle:
+                # Every key is due again, as if a full poll interval had passed
+                monitor.scheduler = PollScheduler(config.POLL_TIERS)
+                monitor.scheduler.add(monitor.registry.index, time.monotonic())
+
+            uz_before = uz_requests(await fake_uz_stats(url))
+            db_before = samples_by_label(db_query_seconds, "_count", "op")
+            keys_before = samples_by_label(keys_fetched, "", "result")
+            sent_before = monitor.notifier.sent
+
+            probe.start()
+            started = time.perf_counter()
+            await monitor.check_all_routes()
+            wall = time.perf_counter() - started
+            lag = await probe.stop()
+
+            await asyncio.wait_for(monitor.notifier.queue.join(), args.drain_timeout)
+            db_calls = difference(samples_by_label(db_query_seconds, "_count", "op"), db_before)
+            requests = difference(uz_requests(await fake_uz_stats(url)), uz_before)
+
+            cycles.append({
+                "cycle": cycle + 1,
+                "cold": cycle == 0,
+                "wall_seconds": round(wall, 3),
+                "keys": difference(samples_by_label(keys_fetched, "", "result"), keys_before),
+                "uz_requests": sum(requests.values()),
+                "uz_requests_by_status": requests,
+                "db_round_trips": sum(db_calls.values()),
+                "db_round_trips_by_op": db_calls,
+                "notifications": monitor.notifier.sent - sent_before,
+                "loop_lag": lag,
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            })
+    finally:
+        await monitor.stop()
+        monitor.uz_client.executor.shutdown(wait=False)
+
+    return {
+        "active_routes": len(monitor.registry),
+        "fetch_keys": len(monitor.registry.index),
+        "cycles": cycles,
+    }
+
+
+async def run(args):
+    # Counts DB round-trips and fetched keys; nothing is served
+    metrics.enabled = True
+    config.MONITOR_WORKERS = args.concurrency
+    config.MONITOR_MAX_KEYS_PER_CYCLE = 10 ** 9
+    config.UZ_CACHE_TRIPS_TTL = args.cache_ttl
+
+    scenario = write_scenario(args)
+    fake, url = await start_fake_uz(args, scenario)
+    admin = await asyncpg.connect(os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL))
+    results = []
+
+    try:
+        for size in args.sizes:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+
+            db.dsn = bench_dsn()
+            await db.init_db()
+            try:
+                started = time.perf_counter()
+                route_dates = await seed(size, args.horizon_days, args.seed)
+                seed_seconds = time.perf_counter() - started
+
+                results.append({
+                    "routes": size,
+                    "route_dates": route_dates,
+                    "seed_seconds": round(seed_seconds, 2),
+                    **await run_cycles(args, url),
+                })
+            finally:
+                await db.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+        fake.terminate()
+        await fake.wait()
+        scenario.unlink()
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "settings": {
+            "cycles": args.cycles,
+            "concurrency": args.concurrency,
+            "uz_rate": args.uz_rate,
+            "uz_latency_ms": args.uz_latency_ms,
+            "faults": args.faults,
+            "cache_ttl": args.cache_ttl,
+            "horizon_days": args.horizon_days,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=32, help="UZ sessions, HTTP threads and monitor workers")
+    parser.add_argument("--uz-rate", type=float, default=1000, help="UZ requests per second")
+    parser.add_argument("--uz-latency-ms", type=float, default=5, help="median fake UZ latency")
+    parser.add_argument("--uz-port", type=int, default=8089)
+    parser.add_argument("--faults", action="store_true", help="keep the scenario's 441/429/5xx and challenges")
+    parser.add_argument("--cache-ttl", type=int, default=0, help="UZ trips cache TTL in seconds")
+    parser.add_argument("--seat-change-seconds", type=int, default=5)
+    parser.add_argument("--horizon-days", type=int, default=45)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
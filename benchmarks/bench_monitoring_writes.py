@@ -0,0 +1,153 @@
+"""
+Benchmark of the end-of-cycle monitorings write paths
+
+Compares one UPDATE per route (the old path), a single executemany and
+COPY into a temp table + UPDATE ... FROM at 1k and 10k routes.
+
+Runs against BENCH_DATABASE_URL (defaults to DATABASE_URL) inside a
+throwaway schema that is dropped afterwards:
+
+    python -m benchmarks.bench_monitoring_writes [--sizes 1000 10000] [--repeat 3]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import date, timedelta
+import asyncpg
+from config import config
+from db.database import db
+from services.db_service import MonitoringService
+
+SCHEMA = "bench_monitoring_writes"
+
+
+def bench_dsn() -> str:
+    dsn = os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL)
+    separator = "&" if "?" in dsn else "?"
+    return f"{dsn}{separator}search_path={SCHEMA}"
+
+
+async def seed(routes: int):
+    await db.execute("INSERT INTO users (telegram_id, username) VALUES (1, 'bench')")
+    user_id = await db.fetchval("SELECT id FROM users WHERE telegram_id = 1")
+
+    await db.execute(
+        """
+        INSERT INTO routes
+        (user_id, station_from_id, station_from_name, station_to_id, station_to_name, wagon_classes)
+        SELECT $1, 2200001, 'A', 2218000 + i % 50, 'B', '["К"]'::jsonb
+        FROM generate_series(0, $2 - 1) AS i
+        """,
+        user_id, routes
+    )
+    await db.execute("INSERT INTO monitorings (route_id) SELECT id FROM routes")
+
+    return [row['id'] for row in await db.fetchall("SELECT id FROM routes ORDER BY id")]
+
+
+def make_updates(route_ids):
+    start = date.today()
+    updates = []
+
+    for route_id in route_ids:
+        dates = [(start + timedelta(days=d)).isoformat() for d in range(3)]
+        details = {
+            dates[0]: [{
+                "train_number": f"{random.randint(1, 150):03d}К",
+                "wagon_type": "К",
+                "free_seats": random.randint(1, 40),
+                "price": random.randint(40000, 120000)
+            }]
+        }
+        snapshot = {
+            dates[0]: {f"{ticket['train_number']}|К": [ticket["free_seats"], ticket["price"]]
+                       for ticket in details[dates[0]]}
+        }
+        last_result = {"has_tickets": True, "dates_with_tickets": [dates[0]], "details": details}
+        updates.append((route_id, last_result, dates, snapshot))
+
+    return updates
+
+
+# The old per-route write, one round trip and statement per route
+ROW_BY_ROW_UPDATE = """
+    UPDATE monitorings
+    SET last_check = NOW(),
+        last_result = $1::jsonb || jsonb_build_object(
+            'snapshot',
+            (COALESCE(last_result->'snapshot', '{}'::jsonb) - $2::text[]) || $3::jsonb
+        ),
+        check_count = check_count + 1,
+        found_tickets = (
+            (COALESCE(last_result->'snapshot', '{}'::jsonb) - $2::text[]) || $3::jsonb
+        ) <> '{}'::jsonb
+    WHERE route_id = $4
+"""
+
+
+async def row_by_row(updates):
+    for route_id, last_result, snapshot_dates, snapshot in updates:
+        await db.execute(ROW_BY_ROW_UPDATE, last_result, snapshot_dates, snapshot, route_id)
+
+
+async def timed(fn, updates, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn(updates)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def run(sizes, repeat: int):
+    # Keep the services' info logs out of the timings
+    logging.getLogger("services.db_service").setLevel(logging.WARNING)
+
+    admin = await asyncpg.connect(os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL))
+    results = []
+
+    try:
+        for size in sizes:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+
+            db.dsn = bench_dsn()
+            await db.init_db()
+            try:
+                updates = make_updates(await seed(size))
+
+                result = {"routes": size}
+                for name, fn in (
+                    ("row_by_row", row_by_row),
+                    ("executemany", MonitoringService.update_monitorings),
+                    ("copy", MonitoringService.update_monitorings_copy),
+                ):
+                    seconds = await timed(fn, updates, repeat)
+                    result[name] = {
+                        "seconds": round(seconds, 4),
+                        "rows_per_second": round(size / seconds)
+                    }
+                results.append(result)
+            finally:
+                await db.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Matching one fetched trips payload to the routes subscribed to its key
+
+Compares the old per-route scan (extract_tickets once per route with the
+route's wagon mask) with a single SubscriptionIndex.match pass at 10, 100
+and 1000 subscribers per key. Uses the sample payload in
+benchmarks/data/trips_sample.json; no database or network needed:
+
+    python -m benchmarks.bench_subscription_index [--subscribers 10 100 1000] [--number 200]
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import date
+from pathlib import Path
+from typing import List
+from models import FetchKey, Route, wagon_mask
+from services.subscription_index import SubscriptionIndex
+from uz_api.client import UZApiClient
+
+SAMPLE = Path(__file__).parent / "data" / "trips_sample.json"
+CLASSES = ["Л", "К", "П", "С1", "С2", "С3"]
+
+
+def make_routes(key: FetchKey, subscribers: int) -> List[Route]:
+    random.seed(subscribers)
+    return [
+        Route(
+            id=route_id,
+            user_id=route_id,
+            station_from_id=key.station_from_id,
+            station_from_name="Київ-Пасажирський",
+            station_to_id=key.station_to_id,
+            station_to_name="Львів",
+            dates=(key.travel_date,),
+            wagon_mask=wagon_mask(random.sample(CLASSES, random.randint(1, 3))),
+            is_active=True
+        )
+        for route_id in range(1, subscribers + 1)
+    ]
+
+
+def run(subscribers: List[int], number: int):
+    trains_data = json.loads(SAMPLE.read_text(encoding="utf-8"))
+    key = FetchKey(2200001, 2218000, date.max)
+    results = []
+
+    for count in subscribers:
+        routes = make_routes(key, count)
+        index = SubscriptionIndex()
+        for route in routes:
+            index.subscribe(key, route)
+
+        def per_route():
+            return {route.id: UZApiClient.extract_tickets(trains_data, route.wagon_mask) for route in routes}
+
+        def indexed():
+            return index.match(key, trains_data)
+
+        # Same offers for every route that has any
+        expected = {route_id: offers for route_id, offers in per_route().items() if offers}
+        assert indexed() == expected
+
+        per_route_s = min(timeit.repeat(per_route, number=number, repeat=3)) / number
+        indexed_s = min(timeit.repeat(indexed, number=number, repeat=3)) / number
+        results.append({
+            "subscribers": count,
+            "per_route_us": round(per_route_s * 1e6, 1),
+            "index_us": round(indexed_s * 1e6, 1),
+            "speedup": round(per_route_s / indexed_s, 1),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    run(args.subscribers, args.number)
+
+
+if __name__ == "__main__":
+    main()
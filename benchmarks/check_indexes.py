@@ -0,0 +1,172 @@
+"""
+Check that the hot queries use the indexes added by the migrations
+
+Seeds a throwaway schema in BENCH_DATABASE_URL (defaults to DATABASE_URL),
+runs the migrations, ANALYZEs and asserts on EXPLAIN plans:
+
+    python -m benchmarks.check_indexes [--routes 50000]
+
+Exits with status 1 if any query does not use its index.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, Iterator, List
+import asyncpg
+from config import config
+from db.migrations import migrate
+from services.db_service import ACTIVE_ROUTE_SELECT, ROUTE_SELECT
+
+SCHEMA = "bench_check_indexes"
+
+# (description, query, args, index that must appear in the plan)
+CHECKS = [
+    (
+        "user routes list",
+        f"{ROUTE_SELECT} WHERE r.user_id = $1 ORDER BY r.created_at DESC",
+        (42,),
+        "idx_routes_user_created",
+    ),
+    (
+        "active routes of a station pair",
+        f"""
+        {ACTIVE_ROUTE_SELECT}
+          AND (r.station_from_id, r.station_to_id) IN (
+              SELECT * FROM unnest($1::int[], $2::int[])
+          )
+        """,
+        ([2200001], [2218040]),
+        "idx_routes_active_pair",
+    ),
+    (
+        "past route dates purge",
+        "DELETE FROM route_dates WHERE travel_date < CURRENT_DATE",
+        (),
+        "idx_route_dates_travel_date",
+    ),
+    (
+        "last results of routes",
+        "SELECT route_id, last_result FROM monitorings WHERE route_id = ANY($1::int[])",
+        ([1, 2, 3],),
+        "idx_monitorings_route_id",
+    ),
+    (
+        "monitoring update",
+        "UPDATE monitorings SET check_count = check_count + 1 WHERE route_id = $1",
+        (7,),
+        "idx_monitorings_route_id",
+    ),
+    (
+        "due fetch keys",
+        """
+        SELECT station_from_id, station_to_id, travel_date
+        FROM fetch_keys
+        WHERE next_due_at <= NOW()
+          AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        ORDER BY next_due_at
+        LIMIT 20
+        """,
+        (),
+        "idx_fetch_keys_due",
+    ),
+]
+
+
+async def seed(conn: asyncpg.Connection, routes: int):
+    users = max(1, routes // 5)
+    await conn.execute(
+        "INSERT INTO users (telegram_id, username) SELECT i, 'user' || i FROM generate_series(1, $1) AS i",
+        users
+    )
+    await conn.execute(
+        """
+        INSERT INTO routes
+        (user_id, station_from_id, station_from_name, station_to_id, station_to_name,
+         wagon_classes, is_active, created_at)
+        SELECT 1 + i % $2, 2200001 + i % 40, 'A', 2218000 + i % 300, 'B',
+               '["К"]'::jsonb, i % 3 <> 0, NOW() - make_interval(mins => i)
+        FROM generate_series(0, $1 - 1) AS i
+        """,
+        routes, users
+    )
+    await conn.execute(
+        """
+        INSERT INTO route_dates (route_id, travel_date)
+        SELECT id, DATE '2030-01-01' + (id + i) % 60
+        FROM routes, generate_series(0, 4) AS i
+        """
+    )
+    await conn.execute("INSERT INTO monitorings (route_id) SELECT id FROM routes")
+    await conn.execute(
+        """
+        INSERT INTO fetch_keys (station_from_id, station_to_id, travel_date, next_due_at)
+        SELECT p.station_from_id, p.station_to_id, DATE '2030-01-01' + i,
+               NOW() + make_interval(mins => i)
+        FROM (SELECT DISTINCT station_from_id, station_to_id FROM routes) AS p,
+             generate_series(0, 59) AS i
+        """
+    )
+    await conn.execute("ANALYZE")
+
+
+def index_names(plan: Dict[str, Any]) -> Iterator[str]:
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from index_names(child)
+
+
+async def check(routes: int) -> List[Dict[str, Any]]:
+    """The index each hot query was expected to use and the ones its plan uses"""
+    admin = await asyncpg.connect(os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL))
+    results = []
+
+    try:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+
+        conn = await asyncpg.connect(
+            os.getenv("BENCH_DATABASE_URL", config.DATABASE_URL),
+            server_settings={"search_path": SCHEMA}
+        )
+        try:
+            await migrate(conn)
+            await seed(conn, routes)
+
+            for description, query, args, index in CHECKS:
+                # EXPLAIN without ANALYZE, so the UPDATE is planned but not run
+                raw = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+                plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+                used = sorted(set(index_names(plan)))
+                results.append({
+                    "query": description,
+                    "expected": index,
+                    "used": used,
+                    "ok": index in used
+                })
+        finally:
+            await conn.close()
+    finally:
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+    return results
+
+
+async def run(routes: int) -> bool:
+    results = await check(routes)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return all(result["ok"] for result in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", type=int, default=50000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args.routes)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Local stand-in for the UZ API
+
+Serves /api/stations and /api/v3/trips from a scenario file so the client,
+monitor and workers can be load-tested without touching app.uz.gov.ua.
+The scenario (see benchmarks/data/fake_uz_scenario.json) sets:
+
+- seed: every random choice below is reproducible for a given seed
+- time_scale: scenario seconds per wall second, to replay timelines faster
+- latency: response delay, one of
+  {"distribution": "fixed", "ms"}, {"distribution": "uniform", "min_ms", "max_ms"},
+  {"distribution": "lognormal", "median_ms", "sigma"}, {"distribution": "exponential", "mean_ms"},
+  each with an optional "max_ms" cap
+- faults: probability per request of "441", "429", "500", "502", "503" and
+  "challenge" (a Cloudflare-style 403 page), plus "retry_after" seconds sent with 429
+- incidents: [{"start", "end", "faults"}] windows of scenario time whose
+  faults replace the base ones, e.g. a burst of 429s
+- stations: [{"id", "name"}], searched by word prefix
+- trains: scripted trains for one station pair; each wagon class's "seats"
+  is a number or a timeline [[scenario second, free seats], ...]
+- generated: trains for every other pair, with seats re-rolled every
+  "change_every_seconds" so availability keeps appearing and disappearing
+
+Point the bot or a benchmark at it with UZ_API_BASE_URL=http://127.0.0.1:8089/api/
+(and UZ_WARMUP_URL=http://127.0.0.1:8089/):
+
+    python -m benchmarks.fake_uz [--scenario benchmarks/data/fake_uz_scenario.json] [--port 8089] [--seed N]
+
+Request counts by endpoint and status are served at /_fake/stats.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from aiohttp import web
+
+SCENARIO = Path(__file__).parent / "data" / "fake_uz_scenario.json"
+
+CHALLENGE_PAGE = (
+    "<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+    "<body><noscript>Enable JavaScript and cookies to continue</noscript></body></html>"
+)
+
+FAULT_STATUSES = {"441": 441, "429": 429, "500": 500, "502": 502, "503": 503, "challenge": 403}
+
+WAGON_NAMES = {
+    "Л": "Люкс",
+    "К": "Купе",
+    "П": "Плацкарт",
+    "С1": "Сидячий 1 клас",
+    "С2": "Сидячий 2 клас",
+    "С3": "Сидячий 3 клас",
+}
+
+
+def load_scenario(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def seats_at(seats, at: float) -> int:
+    """Free seats of a wagon class at scenario second `at`"""
+    if isinstance(seats, int):
+        return seats
+    current = 0
+    for since, count in seats:
+        if since > at:
+            break
+        current = count
+    return current
+
+
+def departure(travel_date: date, clock: str) -> datetime:
+    hours, minutes = (int(part) for part in clock.split(":"))
+    return datetime.combine(travel_date, datetime.min.time()) + timedelta(hours=hours, minutes=minutes)
+
+
+class FakeUZ:
+    """aiohttp application answering like the UZ API, as scripted by a scenario"""
+
+    def __init__(self, scenario: Dict[str, Any], seed: Optional[int] = None):
+        self.scenario = scenario
+        self.seed = seed if seed is not None else scenario.get("seed", 0)
+        self.random = random.Random(self.seed)
+        self.time_scale = scenario.get("time_scale", 1.0)
+        self.latency = scenario.get("latency", {"distribution": "fixed", "ms": 0})
+        self.faults = scenario.get("faults", {})
+        self.incidents = scenario.get("incidents", [])
+        self.stations = scenario.get("stations", [])
+        self.generated = scenario.get("generated")
+
+        self.trains: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        for train in scenario.get("trains", []):
+            self.trains.setdefault((train["from"], train["to"]), []).append(train)
+        self.station_names = {station["id"]: station["name"] for station in self.stations}
+
+        self.started = time.monotonic()
+        self.requests: Counter = Counter()
+
+    @property
+    def now(self) -> float:
+        """Seconds of scenario time since the server started"""
+        return (time.monotonic() - self.started) * self.time_scale
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def stats(self) -> Dict[str, Any]:
+        by_endpoint: Dict[str, Dict[str, int]] = {}
+        for (endpoint, status), count in self.requests.items():
+            by_endpoint.setdefault(endpoint, {})[str(status)] = count
+        return {
+            "scenario_seconds": round(self.now, 1),
+            "requests": self.total_requests,
+            "by_endpoint": by_endpoint,
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/", self.handle_warmup)
+        app.router.add_get("/api/stations", self.handle_stations)
+        app.router.add_get("/api/v3/trips", self.handle_trips)
+        app.router.add_get("/_fake/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8089) -> web.AppRunner:
+        """Serve from the running event loop, e.g. inside a benchmark"""
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def sample_latency(self) -> float:
+        spec = self.latency
+        distribution = spec.get("distribution", "fixed")
+        if distribution == "fixed":
+            ms = spec.get("ms", 0)
+        elif distribution == "uniform":
+            ms = self.random.uniform(spec["min_ms"], spec["max_ms"])
+        elif distribution == "lognormal":
+            ms = spec["median_ms"] * math.exp(self.random.gauss(0, spec.get("sigma", 0.5)))
+        elif distribution == "exponential":
+            ms = self.random.expovariate(1 / spec["mean_ms"])
+        else:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        return min(ms, spec.get("max_ms", ms)) / 1000
+
+    def active_faults(self) -> Dict[str, float]:
+        now = self.now
+        for incident in self.incidents:
+            if incident["start"] <= now < incident["end"]:
+                return incident["faults"]
+        return self.faults
+
+    def pick_fault(self) -> Optional[str]:
+        roll = self.random.random()
+        for fault, probability in self.active_faults().items():
+            if fault not in FAULT_STATUSES:
+                continue
+            if roll < probability:
+                return fault
+            roll -= probability
+        return None
+
+    def fault_response(self, fault: str) -> web.Response:
+        status = FAULT_STATUSES[fault]
+        if fault == "challenge":
+            return web.Response(
+                status=status,
+                text=CHALLENGE_PAGE,
+                content_type="text/html",
+                headers={"cf-mitigated": "challenge"}
+            )
+        headers = {}
+        if status == 429:
+            headers["Retry-After"] = str(self.active_faults().get("retry_after", self.faults.get("retry_after", 5)))
+        return web.json_response({"message": f"Fake UZ error {status}"}, status=status, headers=headers)
+
+    async def respond(self, endpoint: str, build) -> web.Response:
+        await asyncio.sleep(self.sample_latency())
+        fault = self.pick_fault()
+        response = self.fault_response(fault) if fault else build()
+        self.requests[(endpoint, response.status)] += 1
+        return response
+
+    async def handle_warmup(self, request: web.Request) -> web.Response:
+        self.requests[("warmup", 200)] += 1
+        return web.Response(text="<html><body>booking</body></html>", content_type="text/html")
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle_stations(self, request: web.Request) -> web.Response:
+        query = request.query.get("search", "").strip().lower()
+
+        def build():
+            found = [
+                station for station in self.stations
+                if query and any(word.startswith(query) for word in station["name"].lower().replace("-", " ").split())
+            ]
+            return web.json_response(found)
+
+        return await self.respond("stations", build)
+
+    async def handle_trips(self, request: web.Request) -> web.Response:
+        try:
+            station_from_id = int(request.query["station_from_id"])
+            station_to_id = int(request.query["station_to_id"])
+            travel_date = date.fromisoformat(request.query["date"])
+        except (KeyError, ValueError):
+            self.requests[("trips", 400)] += 1
+            return web.json_response({"message": "Invalid trip search"}, status=400)
+
+        def build():
+            return web.json_response({"direct": self.trips(station_from_id, station_to_id, travel_date)})
+
+        return await self.respond("trips", build)
+
+    def trips(self, station_from_id: int, station_to_id: int, travel_date: date) -> List[Dict[str, Any]]:
+        scripted = self.trains.get((station_from_id, station_to_id))
+        if scripted is not None:
+            now = self.now
+            trains = [
+                (train["number"], train["departs"], train["duration_minutes"], [
+                    (wagon["id"], wagon.get("name"), wagon["price"], seats_at(wagon["seats"], now))
+                    for wagon in train["wagon_classes"]
+                ])
+                for train in scripted
+                if "dates" not in train or travel_date.isoformat() in train["dates"]
+            ]
+        elif self.generated:
+            trains = self.generate_trains(station_from_id, station_to_id, travel_date)
+        else:
+            trains = []
+
+        station_from = self.station_names.get(station_from_id, str(station_from_id))
+        station_to = self.station_names.get(station_to_id, str(station_to_id))
+        trips = []
+        for number, departs, duration_minutes, wagons in trains:
+            depart_at = departure(travel_date, departs)
+            trips.append({
+                "train": {
+                    "number": number,
+                    "wagon_classes": [
+                        {
+                            "id": wagon_id,
+                            "name": name or WAGON_NAMES.get(wagon_id, wagon_id),
+                            "free_seats": free_seats,
+                            "price": price
+                        }
+                        for wagon_id, name, price, free_seats in wagons
+                    ]
+                },
+                "depart_at": int(depart_at.timestamp()),
+                "arrive_at": int((depart_at + timedelta(minutes=duration_minutes)).timestamp()),
+                "station_from": station_from,
+                "station_to": station_to
+            })
+        return trips
+
+    def generate_trains(self, station_from_id: int, station_to_id: int, travel_date: date):
+        spec = self.generated
+        # The timetable is fixed per pair and date; only the seats change between epochs
+        pair = f"{self.seed}:{station_from_id}:{station_to_id}:{travel_date.isoformat()}"
+        timetable = random.Random(pair)
+        epoch = int(self.now // spec.get("change_every_seconds", 300))
+        seats = random.Random(f"{pair}:{epoch}")
+
+        low, high = spec.get("trains_per_pair", [1, 3])
+        trains = []
+        for _ in range(timetable.randint(low, high)):
+            number = f"{timetable.randint(1, 799):03d}{timetable.choice('КПШО')}"
+            departs = f"{timetable.randint(0, 23):02d}:{timetable.choice(['00', '15', '30', '45'])}"
+            duration_minutes = timetable.randint(120, 900)
+            classes = timetable.sample(spec["wagon_classes"], timetable.randint(1, len(spec["wagon_classes"])))
+            wagons = []
+            for wagon_id in classes:
+                price = timetable.randint(300, 2500)
+                free_seats = (
+                    seats.randint(1, spec.get("max_seats", 20))
+                    if seats.random() < spec.get("seat_probability", 0.2) else 0
+                )
+                wagons.append((wagon_id, None, price, free_seats))
+            trains.append((number, departs, duration_minutes, wagons))
+        return trains
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", type=Path, default=SCENARIO)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fake = FakeUZ(load_scenario(args.scenario), seed=args.seed)
+    print(f"Fake UZ API on http://{args.host}:{args.port}/api/ (scenario {args.scenario}, seed {fake.seed})")
+    web.run_app(fake.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,10 +28,10 @@ async def show_my_routes(message: Message, state: FSMContext):
     
     routes_data = [
         {
-            "id": r['id'],
-            "station_from_name": r['station_from_name'],
-            "station_to_name": r['station_to_name'],
-            "is_active": r['is_active']
+            "id": r.id,
+            "station_from_name": r.station_from_name,
+            "station_to_name": r.station_to_name,
+            "is_active": r.is_active
         }
         for r in routes
     ]
@@ -59,10 +59,10 @@ async def show_my_routes_callback(callback: CallbackQuery, state: FSMContext):
     
     routes_data = [
         {
-            "id": r['id'],
-            "station_from_name": r['station_from_name'],
-            "station_to_name": r['station_to_name'],
-            "is_active": r['is_active']
+            "id": r.id,
+            "station_from_name": r.station_from_name,
+            "station_to_name": r.station_to_name,
+            "is_active": r.is_active
         }
         for r in routes
     ]
@@ -85,23 +85,23 @@ async def show_route_details(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Маршрут не знайдено", show_alert=True)
         return
     
-    status = "✅ Активний" if route['is_active'] else "⏸ Призупинено"
-    classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route['wagon_classes']])
+    status = "✅ Активний" if route.is_active else "⏸ Призупинено"
+    classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route.wagon_classes])
     
-    dates_preview = route['dates'][:5]
-    dates_str = ", ".join([d[5:] for d in dates_preview])
-    if len(route['dates']) > 5:
-        dates_str += f" ... (всього {len(route['dates'])})"
+    dates_preview = route.dates[:5]
+    dates_str = ", ".join([d.strftime("%m-%d") for d in dates_preview])
+    if len(route.dates) > 5:
+        dates_str += f" ... (всього {len(route.dates)})"
     
     await callback.message.edit_text(
-        f"🚉 Маршрут #{route['id']}\n\n"
-        f"Від: {route['station_from_name']}\n"
-        f"До: {route['station_to_name']}\n\n"
+        f"🚉 Маршрут #{route.id}\n\n"
+        f"Від: {route.station_from_name}\n"
+        f"До: {route.station_to_name}\n\n"
         f"📅 Дати: {dates_str}\n"
         f"🚂 Класи вагонів: {classes_str}\n\n"
         f"Статус: {status}\n"
-        f"Створено: {route['created_at'].strftime('%Y-%m-%d %H:%M')}",
-        reply_markup=get_route_details_keyboard(route['id'], route['is_active'])
+        f"Створено: {route.created_at.strftime('%Y-%m-%d %H:%M')}",
+        reply_markup=get_route_details_keyboard(route.id, route.is_active)
     )
     await callback.answer()
 
@@ -116,23 +116,23 @@ async def pause_route(callback: CallbackQuery):
         route = await RouteService.get_route_by_id(route_id)
         await callback.answer("⏸ Маршрут призупинено")
         
-        status = "✅ Активний" if route['is_active'] else "⏸ Призупинено"
-        classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route['wagon_classes']])
+        status = "✅ Активний" if route.is_active else "⏸ Призупинено"
+        classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route.wagon_classes])
         
-        dates_preview = route['dates'][:5]
-        dates_str = ", ".join([d[5:] for d in dates_preview])
-        if len(route['dates']) > 5:
-            dates_str += f" ... (всього {len(route['dates'])})"
+        dates_preview = route.dates[:5]
+        dates_str = ", ".join([d.strftime("%m-%d") for d in dates_preview])
+        if len(route.dates) > 5:
+            dates_str += f" ... (всього {len(route.dates)})"
         
         await callback.message.edit_text(
-            f"🚉 Маршрут #{route['id']}\n\n"
-            f"Від: {route['station_from_name']}\n"
-            f"До: {route['station_to_name']}\n\n"
+            f"🚉 Маршрут #{route.id}\n\n"
+            f"Від: {route.station_from_name}\n"
+            f"До: {route.station_to_name}\n\n"
             f"📅 Дати: {dates_str}\n"
             f"🚂 Класи вагонів: {classes_str}\n\n"
             f"Статус: {status}\n"
-            f"Створено: {route['created_at'].strftime('%Y-%m-%d %H:%M')}",
-            reply_markup=get_route_details_keyboard(route['id'], route['is_active'])
+            f"Створено: {route.created_at.strftime('%Y-%m-%d %H:%M')}",
+            reply_markup=get_route_details_keyboard(route.id, route.is_active)
         )
     else:
         await callback.answer("❌ Помилка", show_alert=True)
@@ -148,23 +148,23 @@ async def resume_route(callback: CallbackQuery):
         route = await RouteService.get_route_by_id(route_id)
         await callback.answer("▶️ Маршрут відновлено")
         
-        status = "✅ Активний" if route['is_active'] else "⏸ Призупинено"
-        classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route['wagon_classes']])
+        status = "✅ Активний" if route.is_active else "⏸ Призупинено"
+        classes_str = ", ".join([config.WAGON_CLASSES.get(c, c) for c in route.wagon_classes])
         
-        dates_preview = route['dates'][:5]
-        dates_str = ", ".join([d[5:] for d in dates_preview])
-        if len(route['dates']) > 5:
-            dates_str += f" ... (всього {len(route['dates'])})"
+        dates_preview = route.dates[:5]
+        dates_str = ", ".join([d.strftime("%m-%d") for d in dates_preview])
+        if len(route.dates) > 5:
+            dates_str += f" ... (всього {len(route.dates)})"
         
         await callback.message.edit_text(
-            f"🚉 Маршрут #{route['id']}\n\n"
-            f"Від: {route['station_from_name']}\n"
-            f"До: {route['station_to_name']}\n\n"
+            f"🚉 Маршрут #{route.id}\n\n"
+            f"Від: {route.station_from_name}\n"
+            f"До: {route.station_to_name}\n\n"
             f"📅 Дати: {dates_str}\n"
             f"🚂 Класи вагонів: {classes_str}\n\n"
             f"Статус: {status}\n"
-            f"Створено: {route['created_at'].strftime('%Y-%m-%d %H:%M')}",
-            reply_markup=get_route_details_keyboard(route['id'], route['is_active'])
+            f"Створено: {route.created_at.strftime('%Y-%m-%d %H:%M')}",
+            reply_markup=get_route_details_keyboard(route.id, route.is_active)
         )
     else:
         await callback.answer("❌ Помилка", show_alert=True)
@@ -190,10 +190,10 @@ async def delete_route(callback: CallbackQuery):
         
         routes_data = [
             {
-                "id": r['id'],
-                "station_from_name": r['station_from_name'],
-                "station_to_name": r['station_to_name'],
-                "is_active": r['is_active']
+                "id": r.id,
+                "station_from_name": r.station_from_name,
+                "station_to_name": r.station_to_name,
+                "is_active": r.is_active
             }
             for r in routes
         ]
@@ -8,15 +8,32 @@ from bot.keyboards.keyboards import (
     get_wagon_classes_keyboard,
     get_main_menu_keyboard
 )
-from uz_api.client import UZApiClient, UZApiException
+from uz_api.client import UZApiException, uz_client
 from services.db_service import UserService, RouteService
+from services.station_index import station_index
 from config import config
 from datetime import datetime, timedelta
 import logging
 
 router = Router()
 logger = logging.getLogger(__name__)
-uz_client = UZApiClient()
+
+
+async def find_stations(search_query: str):
+    """
+    Search the local station index first, falling back to the UZ API on a miss
+
+    The index only answers with prefix hits (and fuzzy ones once it was filled
+    by a bulk refresh), so stations nobody searched for yet still reach UZ.
+    """
+    stations = station_index.search(search_query)
+    if stations:
+        return stations
+    
+    stations = await uz_client.search_stations(search_query)
+    if stations:
+        await station_index.remember(stations)
+    return stations
 
 
 @router.message(F.text == "➕ Додати маршрут моніторингу")
@@ -33,7 +50,7 @@ async def process_departure_search(message: Message, state: FSMContext):
     search_query = message.text.strip()
     
     try:
-        stations = await uz_client.search_stations(search_query)
+        stations = await find_stations(search_query)
         
         if not stations:
             await message.answer(
@@ -83,7 +100,7 @@ async def process_arrival_search(message: Message, state: FSMContext):
     search_query = message.text.strip()
     
     try:
-        stations = await uz_client.search_stations(search_query)
+        stations = await find_stations(search_query)
         
         if not stations:
             await message.answer(
@@ -262,7 +279,7 @@ async def confirm_route_creation(callback: CallbackQuery, state: FSMContext):
         station_from_name=data["departure_station_name"],
         station_to_id=data["arrival_station_id"],
         station_to_name=data["arrival_station_name"],
-        dates=data["selected_dates"],
+        dates=[datetime.strptime(d, "%Y-%m-%d").date() for d in data["selected_dates"]],
         wagon_classes=data["wagon_classes"]
     )
     
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,24 +27,115 @@ class Config:
     DEFAULT_ACTIVE_CLASSES: List[str] = ["Л", "К", "П"]
     
     MONITORING_INTERVAL_SECONDS: int = int(os.getenv("MONITORING_INTERVAL", "300"))
+    MONITOR_WORKERS: int = int(os.getenv("MONITOR_WORKERS", "4"))
+    MONITOR_MAX_KEYS_PER_CYCLE: int = int(os.getenv("MONITOR_MAX_KEYS_PER_CYCLE", "50"))
+    # Failed fetches are retried after this delay instead of a full poll interval
+    MONITOR_RETRY_SECONDS: int = int(os.getenv("MONITOR_RETRY_SECONDS", "60"))
+    
+    # Poll interval by days to departure: "<max days>:<seconds>,...";
+    # dates beyond the last tier are polled with the last tier's interval
+    POLL_TIERS: List[Tuple[int, int]] = sorted(
+        tuple(int(part) for part in tier.split(":"))
+        for tier in os.getenv("POLL_TIERS", "1:120,3:300,7:600,21:1800,60:3600").split(",")
+    )
+    
+    # UZ endpoints; point them at benchmarks/fake_uz.py to run offline
+    UZ_API_BASE_URL: str = os.getenv("UZ_API_BASE_URL", "https://app.uz.gov.ua/api/").rstrip("/") + "/"
+    UZ_WARMUP_URL: str = os.getenv("UZ_WARMUP_URL", "https://booking.uz.gov.ua/")
+    
+    # Global rate limit shared by all UZ API calls
+    UZ_REQUESTS_PER_SECOND: float = float(os.getenv("UZ_REQUESTS_PER_SECOND", "0.5"))
+    UZ_REQUESTS_BURST: int = int(os.getenv("UZ_REQUESTS_BURST", "3"))
+    UZ_HTTP_WORKERS: int = int(os.getenv("UZ_HTTP_WORKERS", "8"))
+    
+    # Pool of UZ session identities, each optionally bound to its own proxy
+    UZ_SESSION_POOL_SIZE: int = int(os.getenv("UZ_SESSION_POOL_SIZE", "4"))
+    UZ_PROXY_URLS: List[str] = [url.strip() for url in os.getenv("UZ_PROXY_URLS", "").split(",") if url.strip()]
+    UZ_SESSION_WINDOW: int = int(os.getenv("UZ_SESSION_WINDOW", "20"))
+    UZ_SESSION_ERROR_THRESHOLD: float = float(os.getenv("UZ_SESSION_ERROR_THRESHOLD", "0.5"))
+    UZ_SESSION_QUARANTINE_SECONDS: int = int(os.getenv("UZ_SESSION_QUARANTINE_SECONDS", "120"))
+    
+    # In-process cache of UZ responses (TTL in seconds per endpoint)
+    UZ_CACHE_MAX_SIZE: int = int(os.getenv("UZ_CACHE_MAX_SIZE", "5000"))
+    UZ_CACHE_TRIPS_TTL: int = int(os.getenv("UZ_CACHE_TRIPS_TTL", "30"))
+    UZ_CACHE_STATIONS_TTL: int = int(os.getenv("UZ_CACHE_STATIONS_TTL", "86400"))
+    
+    # Circuit breaker around all UZ calls (delays in seconds)
+    UZ_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("UZ_BREAKER_FAILURE_THRESHOLD", "5"))
+    UZ_BREAKER_BASE_DELAY: float = float(os.getenv("UZ_BREAKER_BASE_DELAY", "10"))
+    UZ_BREAKER_MAX_DELAY: float = float(os.getenv("UZ_BREAKER_MAX_DELAY", "900"))
+    
+    # Sharded workers (worker.py); set MONITOR_IN_BOT=false when running them
+    MONITOR_IN_BOT: bool = os.getenv("MONITOR_IN_BOT", "true").lower() == "true"
+    WORKER_BATCH_SIZE: int = int(os.getenv("WORKER_BATCH_SIZE", "20"))
+    WORKER_LEASE_SECONDS: int = int(os.getenv("WORKER_LEASE_SECONDS", "120"))
+    WORKER_SYNC_SECONDS: int = int(os.getenv("WORKER_SYNC_SECONDS", "60"))
+    WORKER_IDLE_SECONDS: int = int(os.getenv("WORKER_IDLE_SECONDS", "5"))
+    
+    # How often the in-memory route registry is checked against the routes table
+    ROUTE_REGISTRY_RECONCILE_SECONDS: int = int(os.getenv("ROUTE_REGISTRY_RECONCILE_SECONDS", "600"))
+    
+    # Monitoring results are flushed once per cycle; batches this large go through COPY
+    DB_COPY_THRESHOLD: int = int(os.getenv("DB_COPY_THRESHOLD", "1000"))
+    
+    # Availability change history (availability_events), monthly partitions kept this many months
+    HISTORY_ENABLED: bool = os.getenv("HISTORY_ENABLED", "true").lower() == "true"
+    HISTORY_RETENTION_MONTHS: int = int(os.getenv("HISTORY_RETENTION_MONTHS", "6"))
+    
+    # Outgoing notifications: Telegram allows ~30 messages/s per bot and ~1/s per chat
+    NOTIFY_WORKERS: int = int(os.getenv("NOTIFY_WORKERS", "4"))
+    NOTIFY_GLOBAL_RATE: float = float(os.getenv("NOTIFY_GLOBAL_RATE", "25"))
+    NOTIFY_CHAT_RATE: float = float(os.getenv("NOTIFY_CHAT_RATE", "1"))
+    NOTIFY_MAX_ATTEMPTS: int = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+    NOTIFY_QUEUE_SIZE: int = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+    
+    # Voice calls: a user is rung at most once per cooldown
+    CALL_WORKERS: int = int(os.getenv("CALL_WORKERS", "2"))
+    CALL_COOLDOWN_SECONDS: int = int(os.getenv("CALL_COOLDOWN_SECONDS", "900"))
+    CALL_MAX_ATTEMPTS: int = int(os.getenv("CALL_MAX_ATTEMPTS", "3"))
+    # FloodWait reschedules a call without using up attempts, up to this much waiting in total
+    CALL_MAX_FLOOD_WAIT_SECONDS: int = int(os.getenv("CALL_MAX_FLOOD_WAIT_SECONDS", "1800"))
+    CALL_QUEUE_SIZE: int = int(os.getenv("CALL_QUEUE_SIZE", "1000"))
+    
+    # Notify when free seats of an already seen offer grow by at least this much
+    NOTIFY_SEATS_THRESHOLD: int = int(os.getenv("NOTIFY_SEATS_THRESHOLD", "2"))
     
     MAX_DATES_TO_SHOW: int = 50
     DATES_PER_PAGE: int = 9
     
     MAX_STATIONS_TO_SHOW: int = 10
+    # Bulk refresh of the local station index from UZ; fuzzy station search needs one. 0 disables
+    STATION_INDEX_REFRESH_HOURS: float = float(os.getenv("STATION_INDEX_REFRESH_HOURS", "24"))
     
     TIMEZONE: str = "Europe/Kiev"
     
+    # Prometheus /metrics endpoint on this port; 0 disables metrics collection entirely
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+    
+    # Share of alerts whose fetch -> diff -> DB -> send -> call timings are logged as JSON
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = "bot.log"
     
     LOGGER_BOT_TOKEN: str = os.getenv("LOGGER_BOT_TOKEN", "")
     LOGGER_CHAT_ID: str = os.getenv("LOGGER_CHAT_ID", "")
+    # Telegram log records are batched; at most this many wait for the next flush
+    LOGGER_MAX_RECORDS: int = int(os.getenv("LOGGER_MAX_RECORDS", "1000"))
+    LOGGER_FLUSH_SECONDS: float = float(os.getenv("LOGGER_FLUSH_SECONDS", "5"))
     
     API_ID: int = int(os.getenv("API_ID", "0"))
     API_HASH: str = os.getenv("API_HASH", "")
     PHONE_NUMBER: str = os.getenv("PHONE_NUMBER", "")
     SESSION_NAME: str = os.getenv("SESSION_NAME", "caller_session")
+    # Caller account pool: "<session>[:<phone>],..."; defaults to the single SESSION_NAME account
+    CALLER_SESSIONS: List[Tuple[str, str]] = [
+        (name.strip(), phone.strip() or os.getenv("PHONE_NUMBER", ""))
+        for name, _, phone in (
+            entry.partition(":")
+            for entry in os.getenv("CALLER_SESSIONS", "").split(",") if entry.strip()
+        )
+    ] or [(SESSION_NAME, PHONE_NUMBER)]
     
     # Proxy settings
     PROXY_ENABLED: bool = os.getenv("PROXY_ENABLED", "false").lower() == "true"
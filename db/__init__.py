@@ -1,3 +1,4 @@
 from db.database import db, Database
+from db.migrations import migrate, MIGRATIONS
 
-__all__ = ["db", "Database"]
+__all__ = ["db", "Database", "migrate", "MIGRATIONS"]
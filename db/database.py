@@ -1,8 +1,12 @@
 import asyncpg
+import json
+import time
 import traceback
 from contextlib import asynccontextmanager
 from typing import Optional
 from config import config
+from db.migrations import migrate
+from utils.metrics import db_query_seconds, metrics
 
 
 class Database:
@@ -15,7 +19,8 @@ class Database:
             self.pool = await asyncpg.create_pool(
                 dsn=self.dsn,
                 min_size=1,
-                max_size=10
+                max_size=10,
+                init=self.init_connection
             )
             print("[DB] Pool created successfully.")
             await self.create_tables()
@@ -24,89 +29,93 @@ class Database:
             traceback.print_exc()
             raise
     
+    @staticmethod
+    async def init_connection(conn: asyncpg.Connection):
+        # JSON columns are encoded/decoded by asyncpg, queries pass and get plain Python objects
+        for type_name in ("json", "jsonb"):
+            await conn.set_type_codec(
+                type_name,
+                encoder=json.dumps,
+                decoder=json.loads,
+                schema="pg_catalog"
+            )
+    
     async def create_tables(self):
+        # A failed migration must stop startup, not leave a half-migrated schema running
         async with self.pool.acquire() as conn:
-            try:
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        id SERIAL PRIMARY KEY,
-                        telegram_id BIGINT UNIQUE NOT NULL,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        created_at TIMESTAMP DEFAULT NOW(),
-                        is_active BOOLEAN DEFAULT TRUE
-                    )
-                """)
-                
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS routes (
-                        id SERIAL PRIMARY KEY,
-                        user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
-                        station_from_id INTEGER NOT NULL,
-                        station_from_name TEXT NOT NULL,
-                        station_to_id INTEGER NOT NULL,
-                        station_to_name TEXT NOT NULL,
-                        dates JSONB NOT NULL,
-                        wagon_classes JSONB NOT NULL,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT NOW(),
-                        updated_at TIMESTAMP DEFAULT NOW()
-                    )
-                """)
-                
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS monitorings (
-                        id SERIAL PRIMARY KEY,
-                        route_id INTEGER REFERENCES routes(id) ON DELETE CASCADE,
-                        last_check TIMESTAMP,
-                        last_result JSONB,
-                        check_count INTEGER DEFAULT 0,
-                        found_tickets BOOLEAN DEFAULT FALSE,
-                        notification_sent BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT NOW()
-                    )
-                """)
-                
-                print("[DB] Tables created successfully.")
-            except Exception:
-                traceback.print_exc()
+            await migrate(conn)
+            print("[DB] Tables created successfully.")
     
     @asynccontextmanager
     async def acquire(self):
+        started = time.perf_counter()
         async with self.pool.acquire() as conn:
-            yield conn
+            try:
+                yield conn
+            finally:
+                # Transactions and COPY through a raw connection, timed as a whole
+                db_query_seconds.observe(time.perf_counter() - started, "acquire")
     
     async def fetchone(self, query: str, *args):
         async with self.pool.acquire() as conn:
+            started = time.perf_counter()
             try:
                 return await conn.fetchrow(query, *args)
             except Exception:
                 traceback.print_exc()
                 return None
+            finally:
+                db_query_seconds.observe(time.perf_counter() - started, "fetchone")
     
     async def fetchall(self, query: str, *args):
         async with self.pool.acquire() as conn:
+            started = time.perf_counter()
             try:
                 return await conn.fetch(query, *args)
             except Exception:
                 traceback.print_exc()
                 return []
+            finally:
+                db_query_seconds.observe(time.perf_counter() - started, "fetchall")
     
     async def execute(self, query: str, *args):
         async with self.pool.acquire() as conn:
+            started = time.perf_counter()
             try:
                 await conn.execute(query, *args)
             except Exception:
                 traceback.print_exc()
+            finally:
+                db_query_seconds.observe(time.perf_counter() - started, "execute")
+    
+    async def executemany(self, query: str, args):
+        async with self.pool.acquire() as conn:
+            started = time.perf_counter()
+            try:
+                await conn.executemany(query, args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                db_query_seconds.observe(time.perf_counter() - started, "executemany")
     
     async def fetchval(self, query: str, *args):
         async with self.pool.acquire() as conn:
+            started = time.perf_counter()
             try:
                 return await conn.fetchval(query, *args)
             except Exception:
                 traceback.print_exc()
                 return None
+            finally:
+                db_query_seconds.observe(time.perf_counter() - started, "fetchval")
+    
+    def pool_metrics(self):
+        if self.pool is None:
+            return
+        help_text = "asyncpg pool connections"
+        yield "ukz_db_pool_connections", "gauge", help_text, {"state": "open"}, self.pool.get_size()
+        yield "ukz_db_pool_connections", "gauge", help_text, {"state": "idle"}, self.pool.get_idle_size()
+        yield "ukz_db_pool_connections", "gauge", help_text, {"state": "max"}, self.pool.get_max_size()
     
     async def close(self):
         if self.pool:
@@ -115,3 +124,4 @@ class Database:
 
 
 db = Database(config.DATABASE_URL)
+metrics.collector(db.pool_metrics)
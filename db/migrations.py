@@ -0,0 +1,252 @@
+import asyncpg
+from typing import List, Tuple
+
+# Arbitrary key for pg_advisory_lock, so concurrent processes don't migrate twice
+MIGRATION_LOCK_ID = 0x55A7_0001
+
+# (version, description, statements); every statement must be idempotent,
+# because databases created before versioning already have the baseline tables
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "baseline tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            telegram_id BIGINT UNIQUE NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            is_active BOOLEAN DEFAULT TRUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS routes (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            station_from_id INTEGER NOT NULL,
+            station_from_name TEXT NOT NULL,
+            station_to_id INTEGER NOT NULL,
+            station_to_name TEXT NOT NULL,
+            dates JSONB NOT NULL,
+            wagon_classes JSONB NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS monitorings (
+            id SERIAL PRIMARY KEY,
+            route_id INTEGER REFERENCES routes(id) ON DELETE CASCADE,
+            last_check TIMESTAMP,
+            last_result JSONB,
+            check_count INTEGER DEFAULT 0,
+            found_tickets BOOLEAN DEFAULT FALSE,
+            notification_sent BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS fetch_keys (
+            station_from_id INTEGER NOT NULL,
+            station_to_id INTEGER NOT NULL,
+            travel_date DATE NOT NULL,
+            next_due_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            worker_id TEXT,
+            lease_expires_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            PRIMARY KEY (station_from_id, station_to_id, travel_date)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stations (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            data JSONB NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+    ]),
+    (2, "route change notifications", [
+        # Route changes are pushed to the monitor's route registry
+        """
+        CREATE OR REPLACE FUNCTION notify_route_change() RETURNS trigger AS $$
+        DECLARE
+            changed_id INTEGER;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed_id := OLD.id;
+            ELSE
+                changed_id := NEW.id;
+            END IF;
+            PERFORM pg_notify(
+                'route_changes',
+                json_build_object('op', TG_OP, 'id', changed_id)::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS routes_notify_change ON routes",
+        """
+        CREATE TRIGGER routes_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON routes
+        FOR EACH ROW EXECUTE PROCEDURE notify_route_change()
+        """,
+    ]),
+    (3, "indexes for hot queries", [
+        # "Мої маршрути": WHERE user_id = $1 ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_routes_user_created ON routes (user_id, created_at DESC)",
+        # Active routes of a station pair (workers, fetch key sync); partial and covering the join column
+        """
+        CREATE INDEX IF NOT EXISTS idx_routes_active_pair
+        ON routes (station_from_id, station_to_id) INCLUDE (user_id)
+        WHERE is_active = TRUE
+        """,
+        # One monitoring row per route; keep the newest if older code inserted duplicates
+        """
+        DELETE FROM monitorings m
+        USING monitorings newer
+        WHERE m.route_id = newer.route_id AND m.id < newer.id
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_monitorings_route_id ON monitorings (route_id)",
+        # claim_due: WHERE next_due_at <= NOW() ORDER BY next_due_at
+        "CREATE INDEX IF NOT EXISTS idx_fetch_keys_due ON fetch_keys (next_due_at)",
+    ]),
+    (4, "route dates as rows", [
+        """
+        CREATE TABLE IF NOT EXISTS route_dates (
+            route_id INTEGER NOT NULL REFERENCES routes(id) ON DELETE CASCADE,
+            travel_date DATE NOT NULL,
+            PRIMARY KEY (route_id, travel_date)
+        )
+        """,
+        # Past date purge and the per-date fetch plan
+        "CREATE INDEX IF NOT EXISTS idx_route_dates_travel_date ON route_dates (travel_date)",
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'routes' AND column_name = 'dates'
+            ) THEN
+                INSERT INTO route_dates (route_id, travel_date)
+                SELECT r.id, d.value::date
+                FROM routes r, jsonb_array_elements_text(r.dates) AS d(value)
+                ON CONFLICT DO NOTHING;
+            END IF;
+        END;
+        $$
+        """,
+        "ALTER TABLE routes DROP COLUMN IF EXISTS dates",
+        # Date changes reach the route registry as changes of their route
+        """
+        CREATE OR REPLACE FUNCTION notify_route_dates_change() RETURNS trigger AS $$
+        DECLARE
+            changed_id INTEGER;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed_id := OLD.route_id;
+            ELSE
+                changed_id := NEW.route_id;
+            END IF;
+            PERFORM pg_notify(
+                'route_changes',
+                json_build_object('op', 'UPDATE', 'id', changed_id)::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS route_dates_notify_change ON route_dates",
+        """
+        CREATE TRIGGER route_dates_notify_change
+        AFTER INSERT OR UPDATE OR DELETE ON route_dates
+        FOR EACH ROW EXECUTE PROCEDURE notify_route_dates_change()
+        """,
+    ]),
+    (5, "availability history", [
+        # Monthly partitions are created and dropped at runtime by services/history.py
+        """
+        CREATE TABLE IF NOT EXISTS availability_events (
+            station_from_id INTEGER NOT NULL,
+            station_to_id INTEGER NOT NULL,
+            travel_date DATE NOT NULL,
+            train_number TEXT NOT NULL,
+            wagon_class TEXT NOT NULL,
+            seats INTEGER NOT NULL,
+            price INTEGER,
+            observed_at TIMESTAMPTZ NOT NULL
+        ) PARTITION BY RANGE (observed_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_availability_events_key
+        ON availability_events (station_from_id, station_to_id, travel_date, observed_at DESC)
+        """,
+    ]),
+    (6, "notification dead letters", [
+        # Notifications the dispatcher gave up on, kept for inspection and manual resend
+        """
+        CREATE TABLE IF NOT EXISTS notification_dead_letters (
+            id SERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            route_id INTEGER REFERENCES routes(id) ON DELETE SET NULL,
+            text TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+    ]),
+    (7, "caller peer cache", [
+        # Access hashes are per caller account, hence the session in the key
+        """
+        CREATE TABLE IF NOT EXISTS caller_peers (
+            session TEXT NOT NULL,
+            telegram_id BIGINT NOT NULL,
+            username TEXT,
+            peer_id BIGINT NOT NULL,
+            access_hash BIGINT NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (session, telegram_id)
+        )
+        """,
+    ]),
+]
+
+
+async def migrate(conn: asyncpg.Connection) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied"""
+    applied = []
+    # Taken first: concurrent CREATE TABLE IF NOT EXISTS can still fail on the catalog
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT NOW()
+            )
+            """
+        )
+        current = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES ($1, $2)",
+                    version, description
+                )
+
+            print(f"[DB] Applied migration {version}: {description}")
+            applied.append(version)
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    return applied
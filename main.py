@@ -9,8 +9,11 @@ from config import config
 from db.database import db
 from bot.handlers import start_router, routes_router, my_routes_router
 from services.monitor import TicketMonitor
+from services.station_index import station_index
 from services.telegram_caller import caller_instance
-from utils.telegram_logger import setup_logger
+from uz_api.client import uz_client, uz_http_executor
+from utils.metrics import start_metrics_server
+from utils.telegram_logger import setup_logger, close_telegram_logging
 
 logger = setup_logger(__name__)
 
@@ -34,6 +37,9 @@ async def main():
         logger.error("Database pool is not initialized. Cannot continue.")
         return
     
+    logger.info("Loading station index...")
+    await station_index.load()
+    
     logger.info("Initializing Pyrogram caller...")
     await caller_instance.initialize()
     
@@ -43,26 +49,49 @@ async def main():
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
+    metrics_runner = None
+    if config.METRICS_PORT:
+        logger.info(f"Serving metrics on port {config.METRICS_PORT}")
+        metrics_runner = await start_metrics_server(config.METRICS_PORT)
+    
+    station_refresh_task = None
+    if config.STATION_INDEX_REFRESH_HOURS > 0:
+        station_refresh_task = asyncio.create_task(
+            station_index.refresh_periodically(uz_client, config.STATION_INDEX_REFRESH_HOURS * 3600)
+        )
+    
     dp = Dispatcher(storage=MemoryStorage())
     
     dp.include_router(start_router)
     dp.include_router(routes_router)
     dp.include_router(my_routes_router)
     
-    logger.info("Starting ticket monitor...")
-    monitor = TicketMonitor(bot)
-    monitor_task = asyncio.create_task(monitor.start())
+    monitor = None
+    monitor_task = None
+    if config.MONITOR_IN_BOT:
+        logger.info("Starting ticket monitor...")
+        monitor = TicketMonitor(bot)
+        monitor_task = asyncio.create_task(monitor.start())
+    else:
+        logger.info("Ticket monitor disabled, run worker.py for monitoring")
     
     try:
         logger.info("Bot started successfully!")
         await dp.start_polling(bot)
     finally:
         logger.info("Shutting down...")
-        await monitor.stop()
-        await monitor_task
+        if station_refresh_task:
+            station_refresh_task.cancel()
+        if monitor:
+            await monitor.stop()
+            await monitor_task
         await caller_instance.close()
+        uz_http_executor.shutdown(wait=False)
         await db.close()
         await bot.session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await close_telegram_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+from models.offer import Availability, TicketOffer
+from models.route import FetchKey, Route
+from models.wagon import ALL_WAGON_CLASSES, WAGON_CLASS_BITS, wagon_classes, wagon_mask
+
+__all__ = [
+    "Availability",
+    "TicketOffer",
+    "FetchKey",
+    "Route",
+    "ALL_WAGON_CLASSES",
+    "WAGON_CLASS_BITS",
+    "wagon_classes",
+    "wagon_mask"
+]
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+class TicketOffer(NamedTuple):
+    """Free seats of one wagon class on one train"""
+    train_number: str
+    wagon_type: str
+    free_seats: int
+    price: Optional[int]
+    depart_at: Optional[int] = None
+    arrive_at: Optional[int] = None
+    wagon_name: Optional[str] = None
+    station_from: Optional[str] = None
+    station_to: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.train_number}|{self.wagon_type}"
+
+
+class Availability:
+    """Offers found per date, in date insertion order"""
+
+    __slots__ = ("details",)
+
+    def __init__(self):
+        self.details: Dict[date, List[TicketOffer]] = {}
+
+    @property
+    def has_tickets(self) -> bool:
+        return bool(self.details)
+
+    @property
+    def dates_with_tickets(self) -> List[date]:
+        return list(self.details)
+
+    def add(self, travel_date: date, offers: List[TicketOffer]):
+        if offers:
+            self.details[travel_date] = offers
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON shape stored in monitorings.last_result"""
+        return {
+            "has_tickets": self.has_tickets,
+            "dates_with_tickets": [travel_date.isoformat() for travel_date in self.details],
+            "details": {
+                travel_date.isoformat(): [offer._asdict() for offer in offers]
+                for travel_date, offers in self.details.items()
+            }
+        }
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+from typing import Any, Mapping, NamedTuple, Optional, Tuple
+from models.wagon import wagon_classes, wagon_mask
+
+
+class FetchKey(NamedTuple):
+    """One UZ trips request: a station pair on a date"""
+    station_from_id: int
+    station_to_id: int
+    travel_date: date
+
+
+class Route(NamedTuple):
+    id: int
+    user_id: int
+    station_from_id: int
+    station_from_name: str
+    station_to_id: int
+    station_to_name: str
+    dates: Tuple[date, ...]
+    wagon_mask: int
+    is_active: bool
+    created_at: Optional[datetime] = None
+    telegram_id: Optional[int] = None
+    username: Optional[str] = None
+    row_hash: int = 0
+
+    @classmethod
+    def from_record(cls, record: Mapping[str, Any]) -> "Route":
+        """Build from a routes row with aggregated `dates` (and the user columns when joined)"""
+        return cls(
+            id=record['id'],
+            user_id=record['user_id'],
+            station_from_id=record['station_from_id'],
+            station_from_name=record['station_from_name'],
+            station_to_id=record['station_to_id'],
+            station_to_name=record['station_to_name'],
+            dates=tuple(record['dates']),
+            wagon_mask=wagon_mask(record['wagon_classes']),
+            is_active=record['is_active'],
+            created_at=record.get('created_at'),
+            telegram_id=record.get('telegram_id'),
+            username=record.get('username'),
+            row_hash=record.get('row_hash') or 0
+        )
+
+    @property
+    def wagon_classes(self):
+        return wagon_classes(self.wagon_mask)
+
+    def fetch_keys(self, today: Optional[date] = None) -> Tuple[FetchKey, ...]:
+        """Fetch keys of the route's dates from today on"""
+        today = today or date.today()
+        return tuple(
+            FetchKey(self.station_from_id, self.station_to_id, travel_date)
+            for travel_date in self.dates
+            if travel_date >= today
+        )
@@ -0,0 +1,18 @@
+from typing import Iterable, List
+from config import config
+
+# One bit per wagon class a route can subscribe to, in config.WAGON_CLASSES order
+WAGON_CLASS_BITS = {code: 1 << index for index, code in enumerate(config.WAGON_CLASSES)}
+ALL_WAGON_CLASSES = sum(WAGON_CLASS_BITS.values())
+
+
+def wagon_mask(classes: Iterable[str]) -> int:
+    """Bitmask of wagon class codes; unknown codes are ignored"""
+    mask = 0
+    for code in classes:
+        mask |= WAGON_CLASS_BITS.get(code, 0)
+    return mask
+
+
+def wagon_classes(mask: int) -> List[str]:
+    return [code for code, bit in WAGON_CLASS_BITS.items() if mask & bit]
@@ -1,4 +1,4 @@
-from services.db_service import UserService, RouteService, MonitoringService
+from services.db_service import UserService, RouteService, MonitoringService, StationService, AvailabilityService, NotificationService, CallerPeerService
 from services.monitor import TicketMonitor
 from services.telegram_caller import TelegramCaller, caller_instance
 
@@ -6,6 +6,10 @@ __all__ = [
     "UserService",
     "RouteService",
     "MonitoringService",
+    "StationService",
+    "AvailabilityService",
+    "NotificationService",
+    "CallerPeerService",
     "TicketMonitor",
     "TelegramCaller",
     "caller_instance"
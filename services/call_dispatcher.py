@@ -0,0 +1,177 @@
+import asyncio
+import time
+from typing import Dict, List, NamedTuple, Optional, Set
+from pyrogram.errors import FloodWait
+from services.telegram_caller import TelegramCaller
+from utils.tracing import AlertTrace
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class CallRequest(NamedTuple):
+    telegram_id: int
+    username: Optional[str] = None
+    route_id: Optional[int] = None
+    trace: Optional[AlertTrace] = None
+    attempts: int = 0
+    flood_waited: float = 0
+
+
+class CallDispatcher:
+    """
+    Queue of voice calls placed by worker tasks
+
+    A user is rung at most once per `cooldown_seconds`: requests for a user
+    who is already queued or was called recently are dropped. FloodWait
+    doesn't block a worker; the call is put back after the wait and every
+    worker holds off until then, since the limit is on the caller account.
+    FloodWait doesn't use up attempts; a call is dropped only once its waits
+    add up to more than `max_flood_wait` seconds. Other errors are retried
+    with backoff up to `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        caller: TelegramCaller,
+        workers: int = 2,
+        cooldown_seconds: float = 900,
+        max_attempts: int = 3,
+        queue_size: int = 1000,
+        max_flood_wait: float = 1800
+    ):
+        self.caller = caller
+        self.workers = workers
+        self.cooldown_seconds = cooldown_seconds
+        self.max_attempts = max_attempts
+        self.max_flood_wait = max_flood_wait
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._pending: Set[int] = set()
+        self._called_at: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._delayed: Set[asyncio.Task] = set()
+        self.placed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Call dispatcher started with {self.workers} workers")
+
+    async def stop(self):
+        # Calls are only worth placing right after a find, so nothing is kept
+        tasks = self._tasks + list(self._delayed)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pending:
+            logger.warning(f"Call dispatcher stopped with {len(self._pending)} calls pending")
+        self._pending.clear()
+
+    def enqueue(self, request: CallRequest) -> bool:
+        """Queue a call unless the user is already queued or on cooldown"""
+        now = time.monotonic()
+        called_at = self._called_at.get(request.telegram_id)
+        if request.telegram_id in self._pending or (
+            called_at is not None and now - called_at < self.cooldown_seconds
+        ):
+            self.skipped += 1
+            return False
+
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            logger.error(f"Call queue full, dropping call to {request.telegram_id}")
+            return False
+
+        self._pending.add(request.telegram_id)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "pending": len(self._pending),
+            "placed": self.placed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+    async def _worker(self):
+        while True:
+            request = await self.queue.get()
+            try:
+                await self._place(request)
+            except Exception as e:
+                logger.error(f"Error placing call to {request.telegram_id}: {e}")
+                self._pending.discard(request.telegram_id)
+                if request.trace is not None:
+                    request.trace.finish("call_failed")
+            finally:
+                self.queue.task_done()
+
+    async def _place(self, request: CallRequest):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        try:
+            placed = await self.caller.call_user(request.telegram_id, request.username)
+        except FloodWait as e:
+            # Raised only when every pooled account is waiting
+            flood_waited = request.flood_waited + e.value
+            if flood_waited > self.max_flood_wait:
+                self._give_up(request, f"FloodWait would exceed {self.max_flood_wait}s in total: {e}")
+                return
+            self._paused_until = max(self._paused_until, time.monotonic() + e.value)
+            logger.warning(f"FloodWait for call to {request.telegram_id}, rescheduled in {e.value}s")
+            self._requeue(request._replace(flood_waited=flood_waited), e.value)
+            return
+        except Exception as e:
+            attempts = request.attempts + 1
+            if attempts >= self.max_attempts:
+                self._give_up(request._replace(attempts=attempts), f"{attempts} attempts: {e}")
+            else:
+                self._requeue(request._replace(attempts=attempts), min(2 ** attempts * 5, 120))
+            return
+
+        self._pending.discard(request.telegram_id)
+        if placed:
+            self.placed += 1
+            self._called_at[request.telegram_id] = time.monotonic()
+            self._sweep_cooldowns()
+        if request.trace is not None:
+            if placed:
+                request.trace.mark("called")
+            request.trace.finish("called" if placed else "call_failed")
+
+    def _give_up(self, request: CallRequest, reason: str):
+        self.failed += 1
+        self._pending.discard(request.telegram_id)
+        if request.trace is not None:
+            request.trace.finish("call_failed")
+        logger.error(f"Giving up call to {request.telegram_id} after {reason}")
+
+    def _requeue(self, request: CallRequest, delay: float):
+        task = asyncio.create_task(self._requeue_later(request, delay))
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    async def _requeue_later(self, request: CallRequest, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            logger.error(f"Call queue full, dropping call to {request.telegram_id}")
+            self._pending.discard(request.telegram_id)
+
+    def _sweep_cooldowns(self):
+        if len(self._called_at) < 1024:
+            return
+        cutoff = time.monotonic() - self.cooldown_seconds
+        self._called_at = {
+            telegram_id: called_at for telegram_id, called_at in self._called_at.items()
+            if called_at >= cutoff
+        }
@@ -0,0 +1,81 @@
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+from models import Availability, TicketOffer
+
+# {"YYYY-MM-DD": {"<train_number>|<wagon_type>": [free_seats, price]}}
+Snapshot = Dict[str, Dict[str, List[int]]]
+
+
+class ChangeDetector:
+    """
+    Keeps the last seen offers of every route and reports only transitions
+
+    An offer is reported when it newly appears, when its free seats grow by at
+    least `seats_threshold`, or when its price changes. Offers that disappear
+    are dropped from the snapshot, so their return is reported as new again.
+    """
+
+    def __init__(self, seats_threshold: int = 1):
+        self.seats_threshold = seats_threshold
+        self._snapshots: Dict[int, Snapshot] = {}
+
+    def is_loaded(self, route_id: int) -> bool:
+        return route_id in self._snapshots
+
+    def load(self, route_id: int, last_result: Optional[Dict[str, Any]]):
+        """Restore a route's snapshot from the persisted monitorings.last_result"""
+        snapshot = (last_result or {}).get("snapshot") or {}
+        self._snapshots[route_id] = {
+            date: dict(offers) for date, offers in snapshot.items()
+        }
+
+    def forget(self, route_id: int):
+        """Drop the snapshot of a route that is no longer monitored"""
+        self._snapshots.pop(route_id, None)
+
+    def snapshot(self, route_id: int) -> Snapshot:
+        return self._snapshots.get(route_id, {})
+
+    def diff(
+        self,
+        route_id: int,
+        route_dates: Iterable[date],
+        tickets_by_date: Dict[date, List[TicketOffer]],
+        checked_dates: Iterable[date]
+    ) -> Availability:
+        """Update the route's snapshot for `checked_dates` and return the changed offers"""
+        snapshot = self._snapshots.setdefault(route_id, {})
+        changes = Availability()
+
+        for travel_date in checked_dates:
+            day = travel_date.isoformat()
+            previous = snapshot.get(day, {})
+            current = {}
+            changed = []
+
+            for ticket in tickets_by_date.get(travel_date, []):
+                fingerprint = ticket.fingerprint
+                current[fingerprint] = [ticket.free_seats, ticket.price]
+
+                if fingerprint not in previous:
+                    changed.append(ticket)
+                    continue
+
+                old_seats, old_price = previous[fingerprint]
+                if ticket.free_seats - old_seats >= self.seats_threshold or ticket.price != old_price:
+                    changed.append(ticket)
+
+            if current:
+                snapshot[day] = current
+            else:
+                snapshot.pop(day, None)
+
+            changes.add(travel_date, changed)
+
+        # Dates removed from the route (or already past) are not kept around
+        route_days = {travel_date.isoformat() for travel_date in route_dates}
+        for day in list(snapshot):
+            if day not in route_days:
+                del snapshot[day]
+
+        return changes
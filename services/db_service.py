@@ -1,7 +1,9 @@
 import logging
 import json
-from typing import List, Optional, Dict, Any
+from datetime import date, datetime
+from typing import List, Optional, Dict, Any, Tuple
 from db.database import db
+from models import FetchKey, Route
 from utils.telegram_logger import setup_logger
 
 logger = setup_logger(__name__, telegram_logging=True)
@@ -38,6 +40,32 @@ class UserService:
         return dict(user) if user else None
 
 
+# Routes with their sorted dates aggregated from route_dates
+ROUTE_SELECT = """
+    SELECT r.*, COALESCE(d.dates, '{}'::date[]) AS dates
+    FROM routes r
+    LEFT JOIN LATERAL (
+        SELECT array_agg(rd.travel_date ORDER BY rd.travel_date) AS dates
+        FROM route_dates rd
+        WHERE rd.route_id = r.id
+    ) d ON TRUE
+"""
+
+# Active routes for monitoring; row_hash feeds the route registry checksum
+ACTIVE_ROUTE_SELECT = """
+    SELECT r.*, COALESCE(d.dates, '{}'::date[]) AS dates, u.telegram_id, u.username,
+           hashtext(r::text || COALESCE(d.dates, '{}'::date[])::text) AS row_hash
+    FROM routes r
+    JOIN users u ON r.user_id = u.id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(rd.travel_date ORDER BY rd.travel_date) AS dates
+        FROM route_dates rd
+        WHERE rd.route_id = r.id
+    ) d ON TRUE
+    WHERE r.is_active = TRUE
+"""
+
+
 class RouteService:
     @staticmethod
     async def create_route(
@@ -46,31 +74,44 @@ class RouteService:
         station_from_name: str,
         station_to_id: int,
         station_to_name: str,
-        dates: List[str],
+        dates: List[date],
         wagon_classes: List[str]
-    ) -> Dict[str, Any]:
-        route = await db.fetchone(
-            """
-            INSERT INTO routes 
-            (user_id, station_from_id, station_from_name, station_to_id, station_to_name, dates, wagon_classes)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
-            RETURNING *
-            """,
-            user_id, station_from_id, station_from_name, station_to_id, station_to_name,
-            json.dumps(dates), json.dumps(wagon_classes)
-        )
+    ) -> Optional[Route]:
+        async with db.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    route = await conn.fetchrow(
+                        """
+                        INSERT INTO routes 
+                        (user_id, station_from_id, station_from_name, station_to_id, station_to_name, wagon_classes)
+                        VALUES ($1, $2, $3, $4, $5, $6)
+                        RETURNING *
+                        """,
+                        user_id, station_from_id, station_from_name, station_to_id, station_to_name,
+                        wagon_classes
+                    )
+                    await conn.execute(
+                        """
+                        INSERT INTO route_dates (route_id, travel_date)
+                        SELECT $1, d FROM unnest($2::date[]) AS d
+                        ON CONFLICT DO NOTHING
+                        """,
+                        route['id'], dates
+                    )
+                    await conn.execute(
+                        "INSERT INTO monitorings (route_id) VALUES ($1)",
+                        route['id']
+                    )
+            except Exception as e:
+                logger.error(f"Failed to create route for user {user_id}: {e}")
+                return None
         
-        if route:
-            await db.execute(
-                "INSERT INTO monitorings (route_id) VALUES ($1)",
-                route['id']
-            )
-            logger.info(f"Created route {route['id']} for user {user_id}")
+        logger.info(f"Created route {route['id']} for user {user_id}")
         
-        return dict(route) if route else None
+        return Route.from_record({**dict(route), 'dates': sorted(set(dates))})
     
     @staticmethod
-    async def get_user_routes(telegram_id: int) -> List[Dict[str, Any]]:
+    async def get_user_routes(telegram_id: int) -> List[Route]:
         user = await db.fetchone(
             "SELECT id FROM users WHERE telegram_id = $1",
             telegram_id
@@ -80,33 +121,20 @@ class RouteService:
             return []
         
         routes = await db.fetchall(
-            "SELECT * FROM routes WHERE user_id = $1 ORDER BY created_at DESC",
+            f"{ROUTE_SELECT} WHERE r.user_id = $1 ORDER BY r.created_at DESC",
             user['id']
         )
         
-        result = []
-        for route in routes:
-            route_dict = dict(route)
-            route_dict['dates'] = json.loads(route_dict['dates']) if isinstance(route_dict['dates'], str) else route_dict['dates']
-            route_dict['wagon_classes'] = json.loads(route_dict['wagon_classes']) if isinstance(route_dict['wagon_classes'], str) else route_dict['wagon_classes']
-            result.append(route_dict)
-        
-        return result
+        return [Route.from_record(route) for route in routes]
     
     @staticmethod
-    async def get_route_by_id(route_id: int) -> Optional[Dict[str, Any]]:
+    async def get_route_by_id(route_id: int) -> Optional[Route]:
         route = await db.fetchone(
-            "SELECT * FROM routes WHERE id = $1",
+            f"{ROUTE_SELECT} WHERE r.id = $1",
             route_id
         )
         
-        if route:
-            route_dict = dict(route)
-            route_dict['dates'] = json.loads(route_dict['dates']) if isinstance(route_dict['dates'], str) else route_dict['dates']
-            route_dict['wagon_classes'] = json.loads(route_dict['wagon_classes']) if isinstance(route_dict['wagon_classes'], str) else route_dict['wagon_classes']
-            return route_dict
-        
-        return None
+        return Route.from_record(route) if route else None
     
     @staticmethod
     async def toggle_route_status(route_id: int) -> bool:
@@ -140,42 +168,438 @@ class RouteService:
         return False
     
     @staticmethod
-    async def get_all_active_routes() -> List[Dict[str, Any]]:
+    async def get_active_routes_by_ids(route_ids: List[int]) -> List[Route]:
+        routes = await db.fetchall(
+            f"{ACTIVE_ROUTE_SELECT} AND r.id = ANY($1::int[])",
+            route_ids
+        )
+        
+        return [Route.from_record(route) for route in routes]
+    
+    @staticmethod
+    async def get_active_routes_checksum() -> Optional[Tuple[int, int]]:
+        """(count, sum of row hashes) of active routes, matching row_hash of the loaders"""
+        row = await db.fetchone(
+            f"""
+            SELECT COUNT(*) AS count, COALESCE(SUM(a.row_hash::bigint), 0) AS checksum
+            FROM ({ACTIVE_ROUTE_SELECT}) AS a
+            """
+        )
+        
+        return (row['count'], row['checksum']) if row else None
+    
+    @staticmethod
+    async def get_active_routes_for_pairs(pairs: List[Tuple[int, int]]) -> List[Route]:
         routes = await db.fetchall(
+            f"""
+            {ACTIVE_ROUTE_SELECT}
+              AND (r.station_from_id, r.station_to_id) IN (
+                  SELECT * FROM unnest($1::int[], $2::int[])
+              )
+            """,
+            [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+        )
+        
+        return [Route.from_record(route) for route in routes]
+    
+    @staticmethod
+    async def get_active_routes_with_plan() -> Tuple[List[Route], List[Tuple[FetchKey, List[int]]]]:
+        """
+        Active routes and the fetch plan read from one snapshot
+
+        The plan is the unique (from, to, date) keys from today on, with the
+        ids of active routes wanting them. Both are read in one REPEATABLE READ
+        transaction, so they agree with each other. Errors are raised.
+        """
+        async with db.acquire() as conn:
+            async with conn.transaction(isolation='repeatable_read', readonly=True):
+                routes = await conn.fetch(ACTIVE_ROUTE_SELECT)
+                rows = await conn.fetch(
+                    """
+                    SELECT r.station_from_id, r.station_to_id, rd.travel_date, array_agg(r.id) AS route_ids
+                    FROM route_dates rd
+                    JOIN routes r ON r.id = rd.route_id
+                    WHERE r.is_active = TRUE AND rd.travel_date >= CURRENT_DATE
+                    GROUP BY r.station_from_id, r.station_to_id, rd.travel_date
+                    """
+                )
+        
+        return [Route.from_record(route) for route in routes], [
+            (FetchKey(row['station_from_id'], row['station_to_id'], row['travel_date']), row['route_ids'])
+            for row in rows
+        ]
+    
+    @staticmethod
+    async def purge_past_dates() -> int:
+        deleted = await db.fetchval(
             """
-            SELECT r.*, u.telegram_id, u.username 
-            FROM routes r 
-            JOIN users u ON r.user_id = u.id 
-            WHERE r.is_active = TRUE
+            WITH deleted AS (
+                DELETE FROM route_dates WHERE travel_date < CURRENT_DATE RETURNING 1
+            )
+            SELECT COUNT(*) FROM deleted
             """
         )
         
-        result = []
-        for route in routes:
-            route_dict = dict(route)
-            route_dict['dates'] = json.loads(route_dict['dates']) if isinstance(route_dict['dates'], str) else route_dict['dates']
-            route_dict['wagon_classes'] = json.loads(route_dict['wagon_classes']) if isinstance(route_dict['wagon_classes'], str) else route_dict['wagon_classes']
-            result.append(route_dict)
+        if deleted:
+            logger.info(f"Purged {deleted} past route dates")
         
-        return result
+        return deleted or 0
 
 
 class MonitoringService:
     @staticmethod
-    async def update_monitoring(
-        route_id: int,
-        last_result: dict,
-        found_tickets: bool
+    async def update_monitorings(updates: List[Tuple[int, Dict[str, Any], List[str], Dict[str, Any]]]) -> None:
+        """
+        Store the latest check results in one executemany (atomic in asyncpg)
+
+        Each update is (route_id, last_result, snapshot_dates, snapshot). Dates
+        listed in `snapshot_dates` are replaced by their entries in `snapshot`
+        (or dropped when absent) and all other dates are kept, so workers
+        checking different dates of one route don't overwrite each other.
+        Errors are raised, so the caller can keep the batch and hold back alerts.
+        """
+        async with db.acquire() as conn:
+            await conn.executemany(
+                """
+                UPDATE monitorings 
+                SET last_check = NOW(), 
+                    last_result = $2::jsonb || jsonb_build_object(
+                        'snapshot',
+                        (COALESCE(last_result->'snapshot', '{}'::jsonb) - $3::text[]) || $4::jsonb
+                    ), 
+                    check_count = check_count + 1, 
+                    found_tickets = (
+                        (COALESCE(last_result->'snapshot', '{}'::jsonb) - $3::text[]) || $4::jsonb
+                    ) <> '{}'::jsonb
+                WHERE route_id = $1
+                """,
+                updates
+            )
+        logger.info(f"Updated monitoring for {len(updates)} routes")
+    
+    @staticmethod
+    async def update_monitorings_copy(updates: List[Tuple[int, Dict[str, Any], List[str], Dict[str, Any]]]) -> None:
+        """Same as update_monitorings, via COPY into a temp table and a single UPDATE ... FROM; raises on errors"""
+        # The temp table takes JSON as text, COPY doesn't go through the jsonb codec
+        records = [
+            (route_id, json.dumps(last_result), snapshot_dates, json.dumps(snapshot))
+            for route_id, last_result, snapshot_dates, snapshot in updates
+        ]
+        
+        async with db.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    await conn.execute(
+                        """
+                        CREATE TEMP TABLE monitoring_updates (
+                            route_id INTEGER,
+                            last_result TEXT,
+                            snapshot_dates TEXT[],
+                            snapshot TEXT
+                        ) ON COMMIT DROP
+                        """
+                    )
+                    await conn.copy_records_to_table("monitoring_updates", records=records)
+                    await conn.execute(
+                        """
+                        UPDATE monitorings m
+                        SET last_check = NOW(),
+                            last_result = u.last_result::jsonb || jsonb_build_object(
+                                'snapshot',
+                                (COALESCE(m.last_result->'snapshot', '{}'::jsonb) - u.snapshot_dates)
+                                    || u.snapshot::jsonb
+                            ),
+                            check_count = m.check_count + 1,
+                            found_tickets = (
+                                (COALESCE(m.last_result->'snapshot', '{}'::jsonb) - u.snapshot_dates)
+                                    || u.snapshot::jsonb
+                            ) <> '{}'::jsonb
+                        FROM monitoring_updates u
+                        WHERE m.route_id = u.route_id
+                        """
+                    )
+            except Exception as e:
+                logger.error(f"Batched monitoring update failed: {e}")
+                raise
+        
+        logger.info(f"Updated monitoring for {len(updates)} routes")
+    
+    @staticmethod
+    async def get_last_results(route_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        rows = await db.fetchall(
+            "SELECT route_id, last_result FROM monitorings WHERE route_id = ANY($1::int[])",
+            route_ids
+        )
+        
+        return {row['route_id']: row['last_result'] for row in rows}
+
+
+class FetchKeyService:
+    """Leases of (from, to, date) fetch keys shared by sharded monitor workers"""
+    
+    @staticmethod
+    async def sync_keys() -> None:
+        await db.execute(
+            """
+            INSERT INTO fetch_keys (station_from_id, station_to_id, travel_date)
+            SELECT DISTINCT r.station_from_id, r.station_to_id, rd.travel_date
+            FROM route_dates rd
+            JOIN routes r ON r.id = rd.route_id
+            WHERE r.is_active = TRUE AND rd.travel_date >= CURRENT_DATE
+            ON CONFLICT DO NOTHING
+            """
+        )
+        await db.execute(
+            """
+            DELETE FROM fetch_keys f
+            WHERE f.travel_date < CURRENT_DATE
+               OR NOT EXISTS (
+                   SELECT 1 FROM route_dates rd
+                   JOIN routes r ON r.id = rd.route_id
+                   WHERE r.is_active = TRUE
+                     AND r.station_from_id = f.station_from_id
+                     AND r.station_to_id = f.station_to_id
+                     AND rd.travel_date = f.travel_date
+               )
+            """
+        )
+    
+    @staticmethod
+    async def claim_due(worker_id: str, limit: int, lease_seconds: int) -> List[FetchKey]:
+        rows = await db.fetchall(
+            """
+            WITH due AS (
+                SELECT station_from_id, station_to_id, travel_date
+                FROM fetch_keys
+                WHERE next_due_at <= NOW()
+                  AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+                ORDER BY next_due_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE fetch_keys f
+            SET worker_id = $1,
+                lease_expires_at = NOW() + make_interval(secs => $3),
+                heartbeat_at = NOW()
+            FROM due
+            WHERE f.station_from_id = due.station_from_id
+              AND f.station_to_id = due.station_to_id
+              AND f.travel_date = due.travel_date
+            RETURNING f.station_from_id, f.station_to_id, f.travel_date
+            """,
+            worker_id, limit, float(lease_seconds)
+        )
+        
+        return [
+            FetchKey(row['station_from_id'], row['station_to_id'], row['travel_date'])
+            for row in rows
+        ]
+    
+    @staticmethod
+    async def heartbeat(worker_id: str, lease_seconds: int) -> None:
+        """Extend every lease of the worker; raises on errors"""
+        async with db.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE fetch_keys
+                SET lease_expires_at = NOW() + make_interval(secs => $2),
+                    heartbeat_at = NOW()
+                WHERE worker_id = $1 AND lease_expires_at IS NOT NULL
+                """,
+                worker_id, float(lease_seconds)
+            )
+    
+    @staticmethod
+    async def release(worker_id: str, intervals: List[Tuple[FetchKey, int]]) -> None:
+        """Release leased keys, making each due again after its poll interval; raises on errors"""
+        async with db.acquire() as conn:
+            await conn.executemany(
+                """
+                UPDATE fetch_keys
+                SET next_due_at = NOW() + make_interval(secs => $4),
+                    worker_id = NULL,
+                    lease_expires_at = NULL
+                WHERE station_from_id = $1 AND station_to_id = $2 AND travel_date = $3
+                  AND worker_id = $5
+                """,
+                [
+                    (*key, float(interval), worker_id)
+                    for key, interval in intervals
+                ]
+            )
+
+
+class StationService:
+    @staticmethod
+    async def upsert_stations(stations: List[Dict[str, Any]]) -> None:
+        await db.executemany(
+            """
+            INSERT INTO stations (id, name, data)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (id) DO UPDATE
+            SET name = EXCLUDED.name, data = EXCLUDED.data, updated_at = NOW()
+            """,
+            [
+                (int(station["id"]), station["name"], station)
+                for station in stations
+                if station.get("id") is not None and station.get("name")
+            ]
+        )
+    
+    @staticmethod
+    async def get_all_stations() -> List[Dict[str, Any]]:
+        rows = await db.fetchall("SELECT data FROM stations")
+        return [row['data'] for row in rows]
+
+
+class AvailabilityService:
+    """availability_events: offer state changes per (from, to, date), partitioned by month"""
+    
+    @staticmethod
+    async def ensure_partitions(months: List[date]) -> None:
+        for month in months:
+            start = month.replace(day=1)
+            end = (start.replace(year=start.year + 1, month=1) if start.month == 12
+                   else start.replace(month=start.month + 1))
+            await db.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS availability_events_{start:%Y_%m}
+                PARTITION OF availability_events
+                FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')
+                """
+            )
+    
+    @staticmethod
+    async def drop_partitions_before(cutoff: date) -> List[str]:
+        """Drop monthly partitions that end on or before `cutoff`"""
+        rows = await db.fetchall(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'availability_events'
+              AND p.relnamespace = current_schema()::regnamespace
+            """
+        )
+        
+        dropped = []
+        for row in rows:
+            try:
+                month = datetime.strptime(row['relname'][-7:], "%Y_%m").date()
+            except ValueError:
+                continue
+            
+            end = (month.replace(year=month.year + 1, month=1) if month.month == 12
+                   else month.replace(month=month.month + 1))
+            if end <= cutoff:
+                await db.execute(f"DROP TABLE IF EXISTS {row['relname']}")
+                dropped.append(row['relname'])
+        
+        if dropped:
+            logger.info(f"Dropped availability history partitions: {', '.join(dropped)}")
+        
+        return dropped
+    
+    @staticmethod
+    async def insert_events(events: List[Tuple]) -> None:
+        """COPY events in (from, to, date, train, class, seats, price, observed_at) order; raises on errors"""
+        async with db.acquire() as conn:
+            try:
+                await conn.copy_records_to_table(
+                    "availability_events",
+                    columns=[
+                        "station_from_id", "station_to_id", "travel_date", "train_number",
+                        "wagon_class", "seats", "price", "observed_at"
+                    ],
+                    records=events
+                )
+            except Exception as e:
+                logger.error(f"Failed to write {len(events)} availability events: {e}")
+                raise
+    
+    @staticmethod
+    async def get_latest_states(keys: List[FetchKey]) -> Dict[FetchKey, Dict[Tuple[str, str], List[int]]]:
+        """Last recorded open offers of each key: {key: {(train, class): [seats, price]}}"""
+        rows = await db.fetchall(
+            """
+            SELECT * FROM (
+                SELECT DISTINCT ON (e.station_from_id, e.station_to_id, e.travel_date, e.train_number, e.wagon_class)
+                       e.station_from_id, e.station_to_id, e.travel_date, e.train_number, e.wagon_class,
+                       e.seats, e.price
+                FROM availability_events e
+                JOIN unnest($1::int[], $2::int[], $3::date[]) AS k(station_from_id, station_to_id, travel_date)
+                  ON e.station_from_id = k.station_from_id
+                 AND e.station_to_id = k.station_to_id
+                 AND e.travel_date = k.travel_date
+                ORDER BY e.station_from_id, e.station_to_id, e.travel_date, e.train_number, e.wagon_class,
+                         e.observed_at DESC
+            ) latest
+            WHERE seats > 0
+            """,
+            [key.station_from_id for key in keys], [key.station_to_id for key in keys],
+            [key.travel_date for key in keys]
+        )
+        
+        states = {key: {} for key in keys}
+        for row in rows:
+            key = FetchKey(row['station_from_id'], row['station_to_id'], row['travel_date'])
+            states[key][(row['train_number'], row['wagon_class'])] = [row['seats'], row['price']]
+        
+        return states
+
+
+class NotificationService:
+    @staticmethod
+    async def add_dead_letter(
+        chat_id: int,
+        text: str,
+        attempts: int,
+        error: Optional[str] = None,
+        route_id: Optional[int] = None
     ) -> None:
         await db.execute(
             """
-            UPDATE monitorings 
-            SET last_check = NOW(), 
-                last_result = $1, 
-                check_count = check_count + 1, 
-                found_tickets = $2
-            WHERE route_id = $3
+            INSERT INTO notification_dead_letters (chat_id, route_id, text, attempts, error)
+            VALUES ($1, $2, $3, $4, $5)
             """,
-            json.dumps(last_result), found_tickets, route_id
+            chat_id, route_id, text, attempts, error
+        )
+
+
+class CallerPeerService:
+    """caller_peers: resolved Telegram peers per caller session"""
+    
+    @staticmethod
+    async def get_peers(session: str) -> Dict[int, Tuple[int, int]]:
+        rows = await db.fetchall(
+            "SELECT telegram_id, peer_id, access_hash FROM caller_peers WHERE session = $1",
+            session
+        )
+        return {row['telegram_id']: (row['peer_id'], row['access_hash']) for row in rows}
+    
+    @staticmethod
+    async def save_peer(
+        session: str,
+        telegram_id: int,
+        username: Optional[str],
+        peer_id: int,
+        access_hash: int
+    ) -> None:
+        await db.execute(
+            """
+            INSERT INTO caller_peers (session, telegram_id, username, peer_id, access_hash)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (session, telegram_id) DO UPDATE
+            SET username = EXCLUDED.username, peer_id = EXCLUDED.peer_id,
+                access_hash = EXCLUDED.access_hash, updated_at = NOW()
+            """,
+            session, telegram_id, username, peer_id, access_hash
+        )
+    
+    @staticmethod
+    async def delete_peer(session: str, telegram_id: int) -> None:
+        await db.execute(
+            "DELETE FROM caller_peers WHERE session = $1 AND telegram_id = $2",
+            session, telegram_id
         )
-        logger.info(f"Updated monitoring for route {route_id}")
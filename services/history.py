@@ -0,0 +1,103 @@
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from services.db_service import AvailabilityService
+from models import FetchKey, TicketOffer
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# {(train_number, wagon_class): [seats, price]}
+OfferState = Dict[Tuple[str, str], List[int]]
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class AvailabilityHistory:
+    """
+    Append-only history of offer state changes per fetch key
+
+    Every poll is compared with the key's last known offers and only changes
+    are written: an offer appearing, its seats or price changing, or it
+    disappearing (recorded with 0 seats). Events are buffered and written with
+    COPY on flush; a failed flush raises and keeps them for the next one.
+    Partitions for the current and next month are created and partitions
+    older than `retention_months` dropped once a day.
+    """
+
+    def __init__(self, retention_months: int = 6):
+        self.retention_months = retention_months
+        self._state: Dict[FetchKey, OfferState] = {}
+        self._events: List[Tuple] = []
+        self._maintained_on: Optional[date] = None
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    async def observe(self, tickets_by_key: Dict[FetchKey, List[TicketOffer]], reload_state: bool = False):
+        """
+        Record changes of successfully fetched keys
+
+        `reload_state` re-reads the last state of every key, for sharded
+        workers where a key may have been polled by another worker since.
+        """
+        if reload_state:
+            unknown = list(tickets_by_key)
+        else:
+            unknown = [key for key in tickets_by_key if key not in self._state]
+        if unknown:
+            # Continue from the stored state after a restart instead of re-recording every offer
+            self._state.update(await AvailabilityService.get_latest_states(unknown))
+
+        observed_at = datetime.now(timezone.utc)
+        for key, tickets in tickets_by_key.items():
+            self._diff(key, tickets, observed_at)
+
+    async def flush(self) -> int:
+        today = date.today()
+        if self._maintained_on != today:
+            await self.maintain(today)
+
+        if not self._events:
+            return 0
+
+        events, self._events = self._events, []
+        try:
+            await AvailabilityService.insert_events(events)
+        except Exception:
+            # The state already moved past these events; keep them, ahead of any recorded meanwhile
+            self._events = events + self._events
+            raise
+        return len(events)
+
+    async def maintain(self, today: date):
+        month = today.replace(day=1)
+        await AvailabilityService.ensure_partitions([month, add_months(month, 1)])
+        await AvailabilityService.drop_partitions_before(add_months(month, -self.retention_months))
+
+        # Past dates are never polled again
+        for key in [key for key in self._state if key.travel_date < today]:
+            del self._state[key]
+
+        self._maintained_on = today
+
+    def _diff(self, key: FetchKey, tickets: List[TicketOffer], observed_at: datetime):
+        previous = self._state.get(key, {})
+        current: OfferState = {}
+
+        for ticket in tickets:
+            if not ticket.train_number:
+                continue
+            offer = (ticket.train_number, ticket.wagon_type)
+            price = int(ticket.price) if ticket.price is not None else None
+            current[offer] = [ticket.free_seats, price]
+
+            if previous.get(offer) != current[offer]:
+                self._events.append((*key, *offer, *current[offer], observed_at))
+
+        for offer in previous.keys() - current.keys():
+            self._events.append((*key, *offer, 0, None, observed_at))
+
+        self._state[key] = current
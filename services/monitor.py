@@ -1,26 +1,155 @@
 import asyncio
+import heapq
 import logging
-import random
-from datetime import datetime
+import time
+from datetime import datetime, date
+from typing import Dict, Iterable, List, Optional, Tuple
 from aiogram import Bot
-from uz_api.client import UZApiClient
+from uz_api.client import uz_client
 from services.db_service import RouteService, MonitoringService
+from models import ALL_WAGON_CLASSES, Availability, FetchKey, Route, TicketOffer
+from services.subscription_index import SubscriptionIndex
+from services.route_registry import RouteRegistry
+from services.change_detector import ChangeDetector
+from services.result_writer import MonitoringResultBuffer
+from services.history import AvailabilityHistory
+from services.notifier import Notification, NotificationDispatcher
+from services.call_dispatcher import CallDispatcher, CallRequest
 from services.telegram_caller import caller_instance
 from config import config
+from utils.metrics import cycle_seconds, key_staleness_seconds, keys_fetched, metrics
+from utils.tracing import AlertTrace, Tracer
 from utils.telegram_logger import setup_logger
 
 logger = setup_logger(__name__)
 
 
+class PollScheduler:
+    """
+    Min-heap of fetch keys ordered by next due time
+
+    Each key's interval comes from its days to departure (config.POLL_TIERS),
+    so near dates are polled often and far-future dates rarely. Past dates
+    are never scheduled.
+    """
+    
+    def __init__(self, tiers: List[Tuple[int, int]]):
+        self.tiers = sorted(tiers)
+        self._heap: List[Tuple[float, FetchKey]] = []
+        self._due: Dict[FetchKey, float] = {}
+    
+    def __len__(self) -> int:
+        return len(self._due)
+    
+    def interval_for(self, key: FetchKey, today: Optional[date] = None) -> Optional[int]:
+        today = today or date.today()
+        days = (key.travel_date - today).days
+        if days < 0:
+            return None
+        
+        for max_days, interval in self.tiers:
+            if days <= max_days:
+                return interval
+        
+        return self.tiers[-1][1]
+    
+    def _push(self, key: FetchKey, due: float):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
+    
+    def add(self, keys: Iterable[FetchKey], now: float):
+        """Schedule new keys immediately"""
+        today = date.today()
+        for key in keys:
+            if key not in self._due and self.interval_for(key, today) is not None:
+                self._push(key, now)
+    
+    def discard(self, keys: Iterable[FetchKey]):
+        """Forget keys nobody subscribes to anymore"""
+        for key in keys:
+            self._due.pop(key, None)
+        
+        # Drop stale heap entries once they dominate the heap
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, key) for key, due in self._due.items()]
+            heapq.heapify(self._heap)
+    
+    def pop_due(self, now: float, limit: int) -> List[FetchKey]:
+        """Pop up to `limit` due keys, most overdue first"""
+        keys = []
+        
+        while self._heap and len(keys) < limit:
+            due, key = self._heap[0]
+            if due > now:
+                break
+            
+            heapq.heappop(self._heap)
+            if self._due.get(key) != due:
+                continue
+            
+            del self._due[key]
+            # Dates that passed while waiting in the heap are dropped, not fetched
+            if self.interval_for(key) is not None:
+                keys.append(key)
+        
+        return keys
+    
+    def reschedule(self, key: FetchKey, now: float, delay: Optional[float] = None):
+        """Schedule the next poll after the key's tier interval, or after `delay` if given"""
+        interval = self.interval_for(key)
+        if interval is not None:
+            self._push(key, now + (interval if delay is None else min(delay, interval)))
+    
+    def seconds_until_next_due(self, now: float) -> Optional[float]:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        
+        if not self._heap:
+            return None
+        
+        return max(0.0, self._heap[0][0] - now)
+
+
 class TicketMonitor:
     def __init__(self, bot: Bot):
         self.bot = bot
-        self.uz_client = UZApiClient()
+        self.uz_client = uz_client
+        self.registry = RouteRegistry(config.ROUTE_REGISTRY_RECONCILE_SECONDS)
+        self.scheduler = PollScheduler(config.POLL_TIERS)
+        self.change_detector = ChangeDetector(config.NOTIFY_SEATS_THRESHOLD)
+        self.results = MonitoringResultBuffer(config.DB_COPY_THRESHOLD)
+        self.history = AvailabilityHistory(config.HISTORY_RETENTION_MONTHS) if config.HISTORY_ENABLED else None
+        self.notifier = NotificationDispatcher(
+            bot,
+            workers=config.NOTIFY_WORKERS,
+            global_rate=config.NOTIFY_GLOBAL_RATE,
+            chat_rate=config.NOTIFY_CHAT_RATE,
+            max_attempts=config.NOTIFY_MAX_ATTEMPTS,
+            queue_size=config.NOTIFY_QUEUE_SIZE
+        )
+        self.calls = CallDispatcher(
+            caller_instance,
+            workers=max(config.CALL_WORKERS, len(config.CALLER_SESSIONS)),
+            cooldown_seconds=config.CALL_COOLDOWN_SECONDS,
+            max_attempts=config.CALL_MAX_ATTEMPTS,
+            max_flood_wait=config.CALL_MAX_FLOOD_WAIT_SECONDS,
+            queue_size=config.CALL_QUEUE_SIZE
+        )
+        self.purged_on: Optional[date] = None
+        # Last successful fetch per key, kept only while metrics are enabled
+        self.fetched_at: Dict[FetchKey, float] = {}
+        self.tracer = Tracer(config.TRACE_SAMPLE_RATE)
         self.is_running = False
+        self._stopped: Optional[asyncio.Event] = None
+        metrics.collector(self.collect_metrics)
     
     async def start(self):
         self.is_running = True
+        self._stopped = asyncio.Event()
         logger.info("Ticket monitoring started")
+        self.notifier.start()
+        self.calls.start()
+        await self.uz_client.warm_up()
         
         while self.is_running:
             try:
@@ -28,96 +157,342 @@ class TicketMonitor:
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
             
-            await asyncio.sleep(config.MONITORING_INTERVAL_SECONDS)
+            # Wake up for the next due key; the cap also bounds how long new routes wait
+            delay = self.scheduler.seconds_until_next_due(time.monotonic())
+            if delay is None:
+                delay = config.MONITORING_INTERVAL_SECONDS
+            delay = min(max(delay, 1), config.MONITORING_INTERVAL_SECONDS)
+            # Stay quiet until the UZ circuit breaker lets requests through again
+            delay = max(delay, self.uz_client.breaker.seconds_until_retry())
+            # stop() wakes the loop, so shutdown doesn't wait out the delay
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
     
     async def stop(self):
         self.is_running = False
+        if self._stopped is not None:
+            self._stopped.set()
+        await self.registry.close()
+        await self.notifier.stop()
+        await self.calls.stop()
         logger.info("Ticket monitoring stopped")
     
     async def check_all_routes(self):
-        routes = await RouteService.get_all_active_routes()
-        logger.info(f"Checking {len(routes)} active routes")
+        if self.uz_client.breaker.is_open:
+            logger.warning(
+                f"UZ API circuit open, skipping cycle ({self.uz_client.breaker.stats()})"
+            )
+            return
+        
+        # Past dates leave route_dates once a day; the registry picks the change up
+        if self.purged_on != date.today():
+            await RouteService.purge_past_dates()
+            self.purged_on = date.today()
+        
+        started = time.monotonic()
+        index = await self.registry.refresh()
+        added_keys, removed_keys, removed_routes = self.registry.pop_changes()
+        
+        now = time.monotonic()
+        self.scheduler.discard(removed_keys)
+        for key in removed_keys:
+            self.fetched_at.pop(key, None)
+        self.scheduler.add(added_keys, now)
+        for route_id in removed_routes:
+            self.change_detector.forget(route_id)
+        
+        due_keys = self.scheduler.pop_due(now, config.MONITOR_MAX_KEYS_PER_CYCLE)
+        if not due_keys:
+            return
+        
+        logger.info(
+            f"Checking {len(due_keys)} due of {len(index)} unique queries "
+            f"for {len(self.registry)} active routes"
+        )
+        logger.debug(
+            f"UZ cache: {self.uz_client.cache.stats()}, "
+            f"circuit: {self.uz_client.breaker.stats()}, "
+            f"rate: {self.uz_client.rate_limiter.rate:.2f}/s"
+        )
+        
+        response_times: Dict[FetchKey, float] = {}
+        trains = await self.fetch_all(due_keys, response_times)
+        
+        finished = time.monotonic()
+        retry_delay = max(config.MONITOR_RETRY_SECONDS, self.uz_client.breaker.seconds_until_retry())
+        for key in due_keys:
+            if trains.get(key) is None:
+                self.scheduler.reschedule(key, finished, retry_delay)
+            else:
+                self.scheduler.reschedule(key, finished)
+        if metrics.enabled:
+            self.observe_fetches(due_keys, trains, finished)
+        
+        await self.process_results(
+            due_keys, self.registry.routes, index, trains, response_times=response_times
+        )
+        cycle_seconds.observe(time.monotonic() - started)
+    
+    def observe_fetches(self, keys: List[FetchKey], trains, finished: float):
+        for key in keys:
+            if trains.get(key) is None:
+                keys_fetched.inc("failed")
+                continue
+            keys_fetched.inc("ok")
+            previous = self.fetched_at.get(key)
+            if previous is not None:
+                key_staleness_seconds.observe(finished - previous)
+            self.fetched_at[key] = finished
+    
+    def collect_metrics(self):
+        yield "ukz_active_routes", "gauge", "Active routes in the route registry", {}, len(self.registry)
+        yield "ukz_fetch_keys", "gauge", "Fetch keys with at least one subscribed route", {}, len(self.registry.index)
+        yield "ukz_scheduled_keys", "gauge", "Fetch keys in the poll scheduler", {}, len(self.scheduler)
+        
+        now = time.monotonic()
+        if self.fetched_at:
+            oldest = min(self.fetched_at.values())
+            yield "ukz_key_max_staleness_seconds", "gauge", "Age of the least recently fetched key", {}, now - oldest
+        
+        for queue, stats in (("notifications", self.notifier.stats()), ("calls", self.calls.stats())):
+            for name, value in stats.items():
+                yield "ukz_dispatcher", "gauge", "Notification and call dispatcher queues and counters", {"queue": queue, "stat": name}, value
+    
+    async def process_results(
+        self,
+        keys: List[FetchKey],
+        routes: Dict[int, Route],
+        index: SubscriptionIndex,
+        trains,
+        reload_snapshots: bool = False,
+        response_times: Optional[Dict[FetchKey, float]] = None
+    ):
+        """
+        Match fetched keys against their subscribed routes
+
+        Each payload is matched once for all subscribers of its key. Routes
+        are checked for every date fetched successfully in this cycle, also
+        without offers, so disappearing offers leave their snapshots.
+        `reload_snapshots` re-reads every route's snapshot from the database,
+        which sharded workers need since other workers update the same routes.
+        `response_times` (monotonic time each key's response arrived) starts
+        the alert traces.
+        """
+        offers: Dict[int, Dict[date, List[TicketOffer]]] = {}
+        checked_dates: Dict[int, List[date]] = {}
+        for key in keys:
+            if trains.get(key) is None:
+                continue
+            for route_id in index.subscribers(key):
+                checked_dates.setdefault(route_id, []).append(key.travel_date)
+            for route_id, route_offers in index.match(key, trains[key]).items():
+                offers.setdefault(route_id, {})[key.travel_date] = route_offers
+        
+        routes_to_check = {
+            route_id: routes[route_id] for route_id in checked_dates if route_id in routes
+        }
+        
+        # Snapshots survive restarts through monitorings.last_result
+        if reload_snapshots:
+            to_load = list(routes_to_check)
+        else:
+            to_load = [route_id for route_id in routes_to_check if not self.change_detector.is_loaded(route_id)]
+        if to_load:
+            last_results = await MonitoringService.get_last_results(to_load)
+            for route_id in to_load:
+                self.change_detector.load(route_id, last_results.get(route_id))
         
-        for idx, route in enumerate(routes):
+        notifications = []
+        for route in routes_to_check.values():
             try:
-                await self.check_route(route)
-                
-                # Add delay between routes to avoid rate limiting
-                if idx < len(routes) - 1:  # Don't delay after last route
-                    delay = random.uniform(2, 5)  # Random delay 2-5 seconds
-                    await asyncio.sleep(delay)
-                    
+                changes = self.check_route(route, offers.get(route.id, {}), checked_dates[route.id])
+                if changes.has_tickets:
+                    trace = self.tracer.start(route.id, self.response_time(route, changes, response_times))
+                    trace.mark("diffed")
+                    notifications.append((route, changes, trace))
             except Exception as e:
                 logger.error(f"Error checking route {route.id}: {e}")
+        
+        # One write for the whole cycle, before anyone is notified
+        try:
+            await self.results.flush()
+        except Exception as e:
+            # Unsaved snapshots mustn't be alerted on: the routes are re-read from
+            # monitorings and diffed again next cycle, after the batch is retried
+            logger.error(f"Failed to store results of {len(routes_to_check)} routes, holding back alerts: {e}")
+            for route_id in routes_to_check:
+                self.change_detector.forget(route_id)
+            for _, _, trace in notifications:
+                trace.finish("store_failed")
+            notifications = []
+        
+        for route, changes, trace in notifications:
+            trace.mark("stored")
+            logger.info(f"Found new tickets for route {route.id}")
+            await self.notify_user(route, changes, trace)
+        
+        if self.history is not None:
+            await self.record_history(keys, trains, reload_state=reload_snapshots)
+    
+    async def record_history(self, keys, trains, reload_state: bool = False):
+        """Append offer changes of all subscribable wagon classes to availability_events"""
+        try:
+            await self.history.observe(
+                {
+                    key: self.uz_client.extract_tickets(trains[key], ALL_WAGON_CLASSES)
+                    for key in keys if trains.get(key) is not None
+                },
+                reload_state=reload_state
+            )
+            await self.history.flush()
+        except Exception as e:
+            logger.error(f"Error recording availability history: {e}")
     
-    async def check_route(self, route):
-        result = await self.uz_client.check_tickets_availability(
-            station_from_id=route['station_from_id'],
-            station_to_id=route['station_to_id'],
-            dates=route['dates'],
-            wagon_classes=route['wagon_classes']
+    async def fetch_all(self, keys, response_times: Optional[Dict[FetchKey, float]] = None):
+        """
+        Fetch keys with MONITOR_WORKERS concurrent workers, paced by the UZ rate limiter
+        
+        If given, `response_times` is filled with the monotonic time each response arrived.
+        """
+        trains = {}
+        pending = iter(keys)
+        
+        async def worker():
+            for key in pending:
+                trains[key] = await self.uz_client.fetch_trains(
+                    key.station_from_id,
+                    key.station_to_id,
+                    key.travel_date.isoformat()
+                )
+                if response_times is not None:
+                    response_times[key] = time.monotonic()
+        
+        workers = min(config.MONITOR_WORKERS, len(keys))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return trains
+    
+    def check_route(
+        self,
+        route: Route,
+        offers_by_date: Dict[date, List[TicketOffer]],
+        fetched_dates: List[date]
+    ) -> Availability:
+        """Diff the route against this cycle's offers, buffer its result and return the changes"""
+        # Only dates fetched successfully in this cycle are evaluated, so a failed
+        # request doesn't wipe the snapshot and re-fire notifications later
+        result = Availability()
+        for travel_date in fetched_dates:
+            result.add(travel_date, offers_by_date.get(travel_date, []))
+        
+        # Snapshots are keyed by ISO dates, as persisted in monitorings.last_result
+        route_dates = {travel_date.isoformat() for travel_date in route.dates}
+        checked_dates = [travel_date.isoformat() for travel_date in fetched_dates]
+        stale_dates = [
+            travel_date for travel_date in self.change_detector.snapshot(route.id)
+            if travel_date not in route_dates
+        ]
+        changes = self.change_detector.diff(
+            route.id,
+            route.dates,
+            result.details,
+            fetched_dates
         )
-        print(result)
+        snapshot = self.change_detector.snapshot(route.id)
         
-        await MonitoringService.update_monitoring(
-            route_id=route['id'],
-            last_result=result,
-            found_tickets=result["has_tickets"]
+        self.results.add(
+            route_id=route.id,
+            last_result=result.to_dict(),
+            snapshot_dates=checked_dates + stale_dates,
+            snapshot={
+                travel_date: snapshot[travel_date]
+                for travel_date in checked_dates if travel_date in snapshot
+            }
         )
         
-        if result["has_tickets"]:
-            logger.info(f"Found tickets for route {route['id']}")
-            await self.notify_user(route, result)
+        return changes
+    
+    @staticmethod
+    def response_time(
+        route: Route,
+        changes: Availability,
+        response_times: Optional[Dict[FetchKey, float]]
+    ) -> Optional[float]:
+        """When the earliest response carrying the route's new offers arrived"""
+        if not response_times:
+            return None
+        times = [
+            response_times[key]
+            for key in (
+                FetchKey(route.station_from_id, route.station_to_id, travel_date)
+                for travel_date in changes.details
+            )
+            if key in response_times
+        ]
+        return min(times) if times else None
     
-    async def notify_user(self, route, result):
+    async def notify_user(self, route: Route, result: Availability, trace: Optional[AlertTrace] = None):
+        """Queue the found-tickets message; the call follows once it is delivered"""
         try:
-            telegram_id = route.get('telegram_id')
-            username = route.get('username')
-            
-            dates_str = ", ".join(result["dates_with_tickets"][:5])
-            if len(result["dates_with_tickets"]) > 5:
-                dates_str += f" ... (+{len(result['dates_with_tickets'])-5})"
+            dates_with_tickets = result.dates_with_tickets
+            dates_str = ", ".join(travel_date.isoformat() for travel_date in dates_with_tickets[:5])
+            if len(dates_with_tickets) > 5:
+                dates_str += f" ... (+{len(dates_with_tickets)-5})"
             
             message = (
                 f"<b>🎉 Знайдено квитки!</b>\n\n"
-                f"🚉 Маршрут: <b>{route['station_from_name']} → {route['station_to_name']}</b>\n"
+                f"🚉 Маршрут: <b>{route.station_from_name} → {route.station_to_name}</b>\n"
                 f"📅 Дати: <b>{dates_str}</b>\n\n"
                 f"<blockquote>Деталі:\n"
             )
             
-            for date, tickets in list(result["details"].items())[:3]:
-                message += f"\n📆 {date}:\n"
+            for travel_date, tickets in list(result.details.items())[:3]:
+                message += f"\n📆 {travel_date.isoformat()}:\n"
                 for ticket in tickets[:2]:
-                    depart_time = datetime.fromtimestamp(ticket['depart_at']).strftime('%H:%M')
-                    arrive_time = datetime.fromtimestamp(ticket['arrive_at']).strftime('%H:%M')
+                    depart_time = datetime.fromtimestamp(ticket.depart_at).strftime('%H:%M')
+                    arrive_time = datetime.fromtimestamp(ticket.arrive_at).strftime('%H:%M')
                     message += (
-                        f"  \n🚂 Поїзд {ticket['train_number']}\n"
+                        f"  \n🚂 Поїзд {ticket.train_number}\n"
                         f"  ⏰ {depart_time} → {arrive_time}\n"
-                        f"  🎫 {ticket['wagon_name']}: {ticket['free_seats']} місць, {ticket['price']/100:.0f} грн\n"
+                        f"  🎫 {ticket.wagon_name}: {ticket.free_seats} місць, {ticket.price/100:.0f} грн\n"
                     )
             
             message += "</blockquote>\n"
             message += f"\n💬 Здійснюється дзвінок..."
             
-            await self.bot.send_message(
-                chat_id=telegram_id,
-                text=message
-            )
+            await self.notifier.enqueue(Notification(
+                chat_id=route.telegram_id,
+                text=message,
+                route_id=route.id,
+                on_sent=lambda: self.call_user(route, trace),
+                trace=trace
+            ))
             
-            # Attempt to make voice call using username (preferred) or telegram_id
-            if caller_instance.is_initialized:
-                await caller_instance.make_group_call(
-                    user_ids=[telegram_id],
-                    usernames=[username] if username else []
-                )
-            else:
-                # If caller not initialized, send reminder message
-                await self.bot.send_message(
-                    chat_id=telegram_id,
-                    text=f"⚠️ Щоб отримувати голосові дзвінки, напишіть сервісному аккаунту {config.NOTIFICATION_ACCOUNT}"
-                )
-            
-            logger.info(f"Sent notification to user {telegram_id} for route {route['id']}")
+            logger.info(f"Queued notification to user {route.telegram_id} for route {route.id}")
             
         except Exception as e:
             logger.error(f"Error sending notification: {e}")
+    
+    async def call_user(self, route: Route, trace: Optional[AlertTrace] = None):
+        telegram_id = route.telegram_id
+        
+        # Calls are placed by the call dispatcher, at most once per cooldown per user
+        if caller_instance.is_initialized:
+            queued = self.calls.enqueue(CallRequest(
+                telegram_id=telegram_id,
+                username=route.username,
+                route_id=route.id,
+                trace=trace
+            ))
+            if not queued and trace is not None:
+                trace.finish("call_skipped")
+        else:
+            if trace is not None:
+                trace.finish("sent")
+            # If caller not initialized, send reminder message
+            await self.notifier.enqueue(Notification(
+                chat_id=telegram_id,
+                text=f"⚠️ Щоб отримувати голосові дзвінки, напишіть сервісному аккаунту {config.NOTIFICATION_ACCOUNT}",
+                route_id=route.id
+            ))
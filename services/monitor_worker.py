@@ -0,0 +1,170 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Set, Tuple
+from aiogram import Bot
+from models import FetchKey
+from services.db_service import RouteService, FetchKeyService
+from services.subscription_index import SubscriptionIndex
+from services.monitor import TicketMonitor
+from config import config
+from utils.metrics import cycle_seconds
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class MonitorWorker:
+    """
+    Sharded monitor: claims batches of due fetch keys from Postgres
+
+    Keys are leased with FOR UPDATE SKIP LOCKED, so any number of workers can
+    run side by side. Leases are extended by a heartbeat while a batch is being
+    processed; if a worker dies its leases expire and other workers pick the
+    keys up again. A worker that stops cleanly releases its leases at once.
+    Releases that fail are retried on every loop and once more on stop.
+    """
+
+    def __init__(self, bot: Bot):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.monitor = TicketMonitor(bot)
+        self.is_running = False
+        self._last_sync = 0.0
+        # Keys leased to this worker and not yet released
+        self._claimed: Set[FetchKey] = set()
+        # Processed keys whose release failed, with their poll interval
+        self._unreleased: Dict[FetchKey, int] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.is_running = True
+        logger.info(f"Monitor worker {self.worker_id} started")
+        self.monitor.notifier.start()
+        self.monitor.calls.start()
+        await self.monitor.uz_client.warm_up()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+        try:
+            while self.is_running:
+                breaker = self.monitor.uz_client.breaker
+                if breaker.is_open:
+                    logger.warning(f"UZ API circuit open, worker paused ({breaker.stats()})")
+                    await asyncio.sleep(breaker.seconds_until_retry())
+                    continue
+
+                try:
+                    if self._unreleased:
+                        await self._release({})
+
+                    if time.monotonic() - self._last_sync >= config.WORKER_SYNC_SECONDS:
+                        await RouteService.purge_past_dates()
+                        await FetchKeyService.sync_keys()
+                        self._last_sync = time.monotonic()
+
+                    keys = await FetchKeyService.claim_due(
+                        self.worker_id,
+                        config.WORKER_BATCH_SIZE,
+                        config.WORKER_LEASE_SECONDS
+                    )
+
+                    if keys:
+                        self._claimed.update(keys)
+                        await self.process_batch(keys)
+                        continue
+                except Exception as e:
+                    logger.error(f"Error in worker loop: {e}")
+
+                await asyncio.sleep(config.WORKER_IDLE_SECONDS)
+        finally:
+            await self._stop_heartbeat()
+
+    async def stop(self):
+        self.is_running = False
+        await self._stop_heartbeat()
+
+        # Keys interrupted mid-batch are due right away for the other workers
+        claimed, self._claimed = self._claimed, set()
+        if claimed or self._unreleased:
+            if await self._release((key, 0) for key in claimed):
+                logger.info(f"Worker {self.worker_id} released its leased keys")
+            else:
+                logger.warning(
+                    f"Worker {self.worker_id} left {len(self._unreleased)} keys leased "
+                    f"until their leases expire"
+                )
+
+        # Also closes the monitor's route registry, which the worker never refreshes
+        await self.monitor.stop()
+        logger.info(f"Monitor worker {self.worker_id} stopped")
+
+    async def process_batch(self, keys):
+        logger.info(f"Worker {self.worker_id} claimed {len(keys)} keys")
+        started = time.monotonic()
+
+        # Failed keys and batches become due again soon instead of waiting a full interval
+        intervals = {key: config.MONITOR_RETRY_SECONDS for key in keys}
+
+        try:
+            pairs = list({(key.station_from_id, key.station_to_id) for key in keys})
+            routes = await RouteService.get_active_routes_for_pairs(pairs)
+            index = SubscriptionIndex.from_routes(routes)
+
+            response_times = {}
+            trains = await self.monitor.fetch_all(keys, response_times)
+            await self.monitor.process_results(
+                keys,
+                {route.id: route for route in routes},
+                index,
+                trains,
+                reload_snapshots=True,
+                response_times=response_times
+            )
+
+            for key in keys:
+                interval = self.monitor.scheduler.interval_for(key)
+                if interval is not None and trains.get(key) is not None:
+                    intervals[key] = interval
+        finally:
+            self._claimed.difference_update(keys)
+            await self._release(intervals.items())
+            cycle_seconds.observe(time.monotonic() - started)
+
+    async def _release(self, intervals: Iterable[Tuple[FetchKey, int]]) -> bool:
+        """Release the given keys and any earlier failed releases; False if it failed again"""
+        pending = {**self._unreleased, **dict(intervals)}
+        if not pending:
+            return True
+
+        try:
+            await FetchKeyService.release(self.worker_id, list(pending.items()))
+        except Exception as e:
+            self._unreleased = pending
+            logger.error(f"Worker {self.worker_id} failed to release {len(pending)} keys: {e}")
+            return False
+
+        self._unreleased = {}
+        return True
+
+    async def _stop_heartbeat(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    async def _heartbeat_loop(self):
+        last_beat = time.monotonic()
+        while True:
+            await asyncio.sleep(config.WORKER_LEASE_SECONDS / 3)
+            try:
+                await FetchKeyService.heartbeat(self.worker_id, config.WORKER_LEASE_SECONDS)
+                last_beat = time.monotonic()
+            except Exception as e:
+                silent = time.monotonic() - last_beat
+                logger.error(f"Worker heartbeat failed ({silent:.0f}s since the last one): {e}")
+                if silent >= config.WORKER_LEASE_SECONDS:
+                    logger.warning(
+                        f"Worker {self.worker_id} leases may have expired, "
+                        f"other workers can claim its keys"
+                    )
@@ -0,0 +1,255 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+)
+from services.db_service import NotificationService
+from utils.rate_limiter import TokenBucket
+from utils.tracing import AlertTrace
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Idle per-chat buckets are swept once there are more than this many
+CHAT_BUCKETS_SWEEP_SIZE = 1024
+
+
+class Notification(NamedTuple):
+    chat_id: int
+    text: str
+    route_id: Optional[int] = None
+    # Awaited by the dispatcher once the message is delivered
+    on_sent: Optional[Callable[[], Awaitable[None]]] = None
+    trace: Optional[AlertTrace] = None
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """
+    Queue of outgoing bot messages drained by worker tasks
+
+    Sends are paced by a global token bucket and a per-chat one, matching
+    Telegram's bot limits. Workers never wait on a chat's bucket: a message
+    for a chat that is over its rate goes to that chat's backlog, sent in
+    order by a task of its own, so one busy chat can't hold up the others.
+    TelegramRetryAfter pauses every worker for the
+    requested time and retries the message. Other transient errors are
+    retried with backoff. After `max_attempts`, or on errors that retrying
+    can't fix (blocked bot, unknown chat), the message goes to
+    notification_dead_letters.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = 4,
+        global_rate: float = 25,
+        chat_rate: float = 1,
+        max_attempts: int = 5,
+        queue_size: int = 10000
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.max_attempts = max_attempts
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.global_bucket = TokenBucket(global_rate, burst=max(1, int(global_rate)))
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._sweep_at = CHAT_BUCKETS_SWEEP_SIZE
+        self._paused_until = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._delayed: Dict[asyncio.Task, Notification] = {}
+        # chat_id -> messages waiting for the chat's bucket, and the task sending them
+        self._chat_backlogs: Dict[int, Deque[Notification]] = {}
+        self._backlog_tasks: Dict[int, asyncio.Task] = {}
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Notification dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """Deliver what is queued within `timeout`, dead-letter the rest"""
+        if not self._tasks:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Notification dispatcher stopped with {self.queue.qsize()} messages queued "
+                f"and {self._backlog_size()} waiting on chat limits"
+            )
+
+        delayed = dict(self._delayed)
+        backlog = [notification for chat_backlog in self._chat_backlogs.values() for notification in chat_backlog]
+        backlog_tasks = list(self._backlog_tasks.values())
+        for task in self._tasks + list(delayed) + backlog_tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *delayed, *backlog_tasks, return_exceptions=True)
+        self._tasks = []
+
+        leftover = list(delayed.values()) + backlog
+        while not self.queue.empty():
+            leftover.append(self.queue.get_nowait())
+            self.queue.task_done()
+        for notification in leftover:
+            await self._dead_letter(notification, notification.attempts, "dispatcher stopped")
+
+    async def enqueue(self, notification: Notification) -> bool:
+        """Queue a message without waiting for it to be sent; a full queue dead-letters it"""
+        try:
+            self.queue.put_nowait(notification)
+            return True
+        except asyncio.QueueFull:
+            logger.error(f"Notification queue full, dead-lettering message to {notification.chat_id}")
+            await self._dead_letter(notification, notification.attempts, "queue full")
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "delayed": len(self._delayed),
+            "chat_backlog": self._backlog_size(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    async def _worker(self):
+        while True:
+            notification = await self.queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception as e:
+                logger.error(f"Error delivering notification to {notification.chat_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _drain(self):
+        """Wait until the queue and every chat backlog are empty"""
+        while True:
+            await self.queue.join()
+            if not self._backlog_tasks:
+                return
+            # wait(), unlike gather(), leaves the tasks running if the timeout cancels us
+            await asyncio.wait(list(self._backlog_tasks.values()))
+
+    def _backlog_size(self) -> int:
+        return sum(len(chat_backlog) for chat_backlog in self._chat_backlogs.values())
+
+    async def _deliver(self, notification: Notification):
+        chat_id = notification.chat_id
+        chat_backlog = self._chat_backlogs.get(chat_id)
+        if chat_backlog is not None:
+            # Behind earlier messages to the same chat, keeping their order
+            chat_backlog.append(notification)
+            return
+
+        if not self._chat_bucket(chat_id).try_acquire():
+            self._chat_backlogs[chat_id] = deque([notification])
+            self._backlog_tasks[chat_id] = asyncio.create_task(self._send_backlog(chat_id))
+            return
+
+        await self._send(notification)
+
+    async def _send_backlog(self, chat_id: int):
+        chat_backlog = self._chat_backlogs[chat_id]
+        try:
+            while chat_backlog:
+                await self._chat_bucket(chat_id).acquire()
+                notification = chat_backlog.popleft()
+                try:
+                    await self._send(notification)
+                except Exception as e:
+                    logger.error(f"Error delivering notification to {chat_id}: {e}")
+        finally:
+            del self._chat_backlogs[chat_id]
+            del self._backlog_tasks[chat_id]
+
+    async def _send(self, notification: Notification):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self.global_bucket.acquire()
+
+        attempts = notification.attempts + 1
+        try:
+            await self.bot.send_message(chat_id=notification.chat_id, text=notification.text)
+        except TelegramRetryAfter as e:
+            # Flood control is per bot, so every worker holds off, not just this one
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            logger.warning(f"Telegram flood control, pausing notifications for {e.retry_after}s")
+            await self._retry(notification._replace(attempts=attempts), e.retry_after, e)
+            return
+        except (TelegramForbiddenError, TelegramNotFound, TelegramBadRequest) as e:
+            # Bot blocked, chat gone or a malformed message: another attempt won't help
+            await self._dead_letter(notification, attempts, e)
+            return
+        except Exception as e:
+            await self._retry(notification._replace(attempts=attempts), min(2 ** attempts, 60), e)
+            return
+
+        self.sent += 1
+        if notification.trace is not None:
+            notification.trace.mark("sent")
+        if notification.on_sent is not None:
+            try:
+                await notification.on_sent()
+            except Exception as e:
+                logger.error(f"Error in post-send hook for {notification.chat_id}: {e}")
+
+    async def _retry(self, notification: Notification, delay: float, error: Exception):
+        if notification.attempts >= self.max_attempts:
+            await self._dead_letter(notification, notification.attempts, error)
+            return
+
+        self.retried += 1
+        task = asyncio.create_task(self._requeue_later(notification, delay))
+        self._delayed[task] = notification
+
+    async def _requeue_later(self, notification: Notification, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            await self.enqueue(notification)
+        finally:
+            self._delayed.pop(asyncio.current_task(), None)
+
+    async def _dead_letter(self, notification: Notification, attempts: int, error):
+        self.dead_lettered += 1
+        if notification.trace is not None:
+            notification.trace.finish("dead_letter")
+        logger.error(f"Notification to {notification.chat_id} dead-lettered after {attempts} attempts: {error}")
+        try:
+            await NotificationService.add_dead_letter(
+                chat_id=notification.chat_id,
+                text=notification.text,
+                attempts=attempts,
+                error=str(error),
+                route_id=notification.route_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to store dead letter for {notification.chat_id}: {e}")
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self._sweep_at:
+                self._sweep_chat_buckets()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+        return bucket
+
+    def _sweep_chat_buckets(self):
+        # A full, idle bucket is the same as a fresh one, so dropping it loses nothing
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_full()]:
+            del self._chat_buckets[chat_id]
+        self._sweep_at = max(CHAT_BUCKETS_SWEEP_SIZE, 2 * len(self._chat_buckets))
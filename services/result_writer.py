@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Tuple
+from services.db_service import MonitoringService
+
+
+class MonitoringResultBuffer:
+    """
+    Write-behind buffer for monitorings updates of one cycle
+
+    Results are collected per route and flushed in a single transaction: an
+    executemany for small batches, COPY into a temp table plus one
+    UPDATE ... FROM once the batch reaches `copy_threshold` rows. A failed
+    flush raises and keeps its results for the next one.
+    """
+
+    def __init__(self, copy_threshold: int = 1000):
+        self.copy_threshold = copy_threshold
+        self._pending: Dict[int, Tuple[Dict[str, Any], List[str], Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        route_id: int,
+        last_result: Dict[str, Any],
+        snapshot_dates: List[str],
+        snapshot: Dict[str, Any]
+    ):
+        pending = self._pending.get(route_id)
+        if pending is not None:
+            # Same route twice in one cycle: keep the newest result, merge snapshot dates
+            _, pending_dates, pending_snapshot = pending
+            merged = {
+                date: offers for date, offers in pending_snapshot.items()
+                if date not in snapshot_dates
+            }
+            merged.update(snapshot)
+            snapshot_dates = list(dict.fromkeys(pending_dates + snapshot_dates))
+            snapshot = merged
+
+        self._pending[route_id] = (last_result, snapshot_dates, snapshot)
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+
+        updates = [
+            (route_id, last_result, snapshot_dates, snapshot)
+            for route_id, (last_result, snapshot_dates, snapshot) in self._pending.items()
+        ]
+        self._pending.clear()
+
+        try:
+            if len(updates) >= self.copy_threshold:
+                await MonitoringService.update_monitorings_copy(updates)
+            else:
+                await MonitoringService.update_monitorings(updates)
+        except Exception:
+            # Keep the batch for the next flush; results added meanwhile are newer and win
+            newer = self._pending
+            self._pending = {
+                route_id: (last_result, snapshot_dates, snapshot)
+                for route_id, last_result, snapshot_dates, snapshot in updates
+            }
+            for route_id, (last_result, snapshot_dates, snapshot) in newer.items():
+                self.add(route_id, last_result, snapshot_dates, snapshot)
+            raise
+
+        return len(updates)
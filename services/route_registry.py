@@ -0,0 +1,174 @@
+import json
+import time
+from typing import Dict, Optional, Set, Tuple
+import asyncpg
+from db.database import db
+from services.db_service import RouteService
+from models import FetchKey, Route
+from services.subscription_index import SubscriptionIndex
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHANNEL = "route_changes"
+
+
+class RouteRegistry:
+    """
+    In-memory active routes and their subscription index (the fetch plan)
+
+    Routes are loaded once; after that only routes named in `route_changes`
+    notifications (sent by the routes trigger) are re-read. A periodic
+    count/checksum comparison with the table catches anything missed and
+    forces a full reload. Without a LISTEN connection every refresh is a
+    full reload.
+    """
+
+    def __init__(self, reconcile_seconds: int = 600):
+        self.reconcile_seconds = reconcile_seconds
+        self.routes: Dict[int, Route] = {}
+        self.index = SubscriptionIndex()
+        self._checksum = 0
+        self._pending: Set[int] = set()
+        self._needs_reload = True
+        self._listener: Optional[asyncpg.Connection] = None
+        self._next_listen = 0.0
+        self._next_reconcile = 0.0
+        self._added_keys: Set[FetchKey] = set()
+        self._removed_keys: Set[FetchKey] = set()
+        self._removed_routes: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    async def refresh(self) -> SubscriptionIndex:
+        """Bring the registry up to date; cost is proportional to the changes"""
+        now = time.monotonic()
+
+        if (self._listener is None or self._listener.is_closed()) and now >= self._next_listen:
+            await self._listen()
+
+        if self._listener is None or self._listener.is_closed():
+            self._needs_reload = True
+
+        if self._needs_reload:
+            await self.reload()
+            return self.index
+
+        if self._pending:
+            await self._apply_pending()
+        # Checked even while notifications keep coming, so a steady stream can't starve it
+        if now >= self._next_reconcile:
+            await self._reconcile()
+            if self._needs_reload:
+                await self.reload()
+
+        return self.index
+
+    def pop_changes(self) -> Tuple[Set[FetchKey], Set[FetchKey], Set[int]]:
+        """Keys added, keys removed and routes removed since the previous call"""
+        changes = (self._added_keys, self._removed_keys, self._removed_routes)
+        self._added_keys, self._removed_keys, self._removed_routes = set(), set(), set()
+        return changes
+
+    async def reload(self):
+        # Notifications arriving while the query runs stay pending and are re-applied
+        self._pending.clear()
+        self._needs_reload = False
+        self._next_reconcile = time.monotonic() + self.reconcile_seconds
+
+        try:
+            routes, plan_keys = await RouteService.get_active_routes_with_plan()
+        except Exception:
+            self._needs_reload = True
+            raise
+
+        # Keys as the consumer knows them: the old plan minus changes it hasn't popped yet
+        known_keys = (set(self.index) - self._added_keys) | self._removed_keys
+        old_route_ids = set(self.routes)
+
+        self.routes = {route.id: route for route in routes}
+        self._checksum = sum(route.row_hash for route in routes)
+
+        # Routes and keys come from one snapshot; later changes arrive as notifications
+        self.index = SubscriptionIndex()
+        for key, route_ids in plan_keys:
+            for route_id in route_ids:
+                route = self.routes.get(route_id)
+                if route is not None:
+                    self.index.subscribe(key, route)
+
+        self._added_keys = set(self.index) - known_keys
+        self._removed_keys = known_keys - set(self.index)
+        self._removed_routes |= old_route_ids - set(self.routes)
+
+        logger.info(f"Route registry loaded {len(self.routes)} routes, {len(self.index)} unique queries")
+
+    async def close(self):
+        if self._listener is not None and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+
+    async def _listen(self):
+        self._next_listen = time.monotonic() + self.reconcile_seconds
+        try:
+            self._listener = await asyncpg.connect(db.dsn)
+            await self._listener.add_listener(CHANNEL, self._on_notify)
+        except Exception as e:
+            logger.error(f"Route registry LISTEN failed, falling back to full reloads: {e}")
+            self._listener = None
+        # Changes made while nobody was listening are unknown
+        self._needs_reload = True
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self._pending.add(int(json.loads(payload)["id"]))
+        except (ValueError, KeyError, TypeError):
+            self._needs_reload = True
+
+    async def _apply_pending(self):
+        route_ids, self._pending = self._pending, set()
+        routes = await RouteService.get_active_routes_by_ids(list(route_ids))
+        fresh = {route.id: route for route in routes}
+
+        for route_id in route_ids:
+            old, new = self.routes.get(route_id), fresh.get(route_id)
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add(new)
+            elif old is not None:
+                self._removed_routes.add(route_id)
+
+        logger.debug(f"Route registry applied {len(route_ids)} changes")
+
+    async def _reconcile(self):
+        self._next_reconcile = time.monotonic() + self.reconcile_seconds
+        checksum = await RouteService.get_active_routes_checksum()
+        if checksum is None:
+            return
+
+        if checksum != (len(self.routes), self._checksum):
+            logger.warning(
+                f"Route registry out of sync ({len(self.routes)} routes in memory, "
+                f"{checksum[0]} in the database), reloading"
+            )
+            self._needs_reload = True
+
+    def _add(self, route: Route):
+        self.routes[route.id] = route
+        self._checksum += route.row_hash
+        for key in self.index.add(route):
+            if key in self._removed_keys:
+                self._removed_keys.discard(key)
+            else:
+                self._added_keys.add(key)
+
+    def _remove(self, route: Route):
+        del self.routes[route.id]
+        self._checksum -= route.row_hash
+        for key in self.index.remove(route):
+            if key in self._added_keys:
+                self._added_keys.discard(key)
+            else:
+                self._removed_keys.add(key)
@@ -0,0 +1,224 @@
+import asyncio
+import re
+from typing import Any, Dict, List, Optional, Set
+from services.db_service import StationService
+from config import config
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ukrainian (and stray Russian) letters to Latin, so "Львів", "Lviv" and "Lvov" meet halfway
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie",
+    "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l",
+    "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ь": "", "ю": "iu",
+    "я": "ia", "ы": "y", "э": "e", "ё": "e", "ъ": "",
+}
+
+# A bulk refresh searches every letter, so the index covers more than what users looked up
+SEED_QUERIES = list("абвгґдеєжзиіїйклмнопрстуфхцчшщюя")
+
+_APOSTROPHES = re.compile(r"['’ʼ`]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    text = _APOSTROPHES.sub("", text.lower())
+    text = "".join(TRANSLIT.get(char, char) for char in text)
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+
+    return previous[-1]
+
+
+class StationIndex:
+    """
+    Local station search: prefix trie plus trigram/edit-distance fuzzy match
+
+    Names are normalized to Latin transliteration, so Cyrillic and Latin input
+    hit the same entries. Stations come from UZ responses as they arrive and
+    are persisted in the `stations` table. Until a bulk refresh has filled the
+    index, only prefix hits are served: a fuzzy match against a partial index
+    would hide the station the user meant.
+    """
+
+    def __init__(self):
+        self.complete = False
+        self._stations: Dict[int, Dict[str, Any]] = {}
+        self._names: Dict[int, str] = {}
+        self._trie: Dict[str, Any] = {}
+        self._trigrams: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    async def load(self):
+        stations = await StationService.get_all_stations()
+        for station in stations:
+            self._index(station)
+        logger.info(f"Loaded {len(self._stations)} stations into the local index")
+
+    async def remember(self, stations: List[Dict[str, Any]]):
+        """Index and persist stations returned by the UZ API"""
+        new_stations = [station for station in stations if self._index(station)]
+        if new_stations:
+            await StationService.upsert_stations(new_stations)
+
+    async def refresh(self, uz_client, queries: Optional[List[str]] = None):
+        """
+        Bulk refresh from the API
+
+        By default queries every letter plus the first word of every known name.
+        The index counts as complete (fuzzy search allowed) once a refresh
+        gets through all its queries.
+        """
+        if queries is None:
+            queries = sorted(set(SEED_QUERIES) | {station["name"].split()[0] for station in self._stations.values()})
+
+        failed = 0
+        for query in queries:
+            try:
+                stations = await uz_client.search_stations(query)
+            except Exception as e:
+                logger.error(f"Station refresh failed for '{query}': {e}")
+                failed += 1
+                continue
+
+            self._index_all(stations)
+            await StationService.upsert_stations(stations)
+
+        if not failed:
+            self.complete = True
+        logger.info(
+            f"Refreshed station index with {len(queries)} queries ({failed} failed), "
+            f"{len(self._stations)} stations"
+        )
+
+    async def refresh_periodically(self, uz_client, interval: float):
+        """Refresh now and then every `interval` seconds, until cancelled"""
+        while True:
+            try:
+                await self.refresh(uz_client)
+            except Exception as e:
+                logger.error(f"Station index refresh failed: {e}")
+            await asyncio.sleep(interval)
+
+    def search(self, query: str, limit: int = config.MAX_STATIONS_TO_SHOW) -> List[Dict[str, Any]]:
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        station_ids = self._prefix_search(normalized)
+        if not station_ids:
+            return self._fuzzy_search(normalized, limit) if self.complete else []
+
+        ranked = sorted(
+            station_ids,
+            key=lambda station_id: (
+                self._names[station_id] != normalized,
+                len(self._names[station_id]),
+                self._names[station_id]
+            )
+        )
+        return [self._stations[station_id] for station_id in ranked[:limit]]
+
+    def _index_all(self, stations: List[Dict[str, Any]]):
+        for station in stations:
+            self._index(station)
+
+    def _index(self, station: Dict[str, Any]) -> bool:
+        """Add or update a station; returns True when anything changed"""
+        station_id, name = station.get("id"), station.get("name")
+        if station_id is None or not name:
+            return False
+
+        station_id = int(station_id)
+        if self._stations.get(station_id) == station:
+            return False
+
+        if station_id in self._names:
+            self._unindex(station_id)
+
+        normalized = normalize(name)
+        self._stations[station_id] = station
+        self._names[station_id] = normalized
+
+        # The full name and every word are prefixes, so "ivano" and "frankivsk" both match
+        for term in {normalized, *normalized.split()}:
+            node = self._trie
+            for char in term:
+                node = node.setdefault(char, {})
+                node.setdefault("$", set()).add(station_id)
+
+        for gram in trigrams(normalized):
+            self._trigrams.setdefault(gram, set()).add(station_id)
+
+        return True
+
+    def _unindex(self, station_id: int):
+        normalized = self._names[station_id]
+
+        for term in {normalized, *normalized.split()}:
+            node = self._trie
+            for char in term:
+                node = node.get(char)
+                if node is None:
+                    break
+                node.get("$", set()).discard(station_id)
+
+        for gram in trigrams(normalized):
+            self._trigrams.get(gram, set()).discard(station_id)
+
+    def _prefix_search(self, prefix: str) -> Set[int]:
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get("$", set())
+
+    def _fuzzy_search(self, normalized: str, limit: int) -> List[Dict[str, Any]]:
+        candidates: Dict[int, int] = {}
+        for gram in trigrams(normalized):
+            for station_id in self._trigrams.get(gram, ()):
+                candidates[station_id] = candidates.get(station_id, 0) + 1
+
+        max_distance = 1 if len(normalized) < 4 else max(2, len(normalized) // 4)
+        scored = []
+        for station_id, shared in candidates.items():
+            name = self._names[station_id]
+            # Compare against the same-length head of the name and every word,
+            # so typos in a prefix or in the second word of a name count too
+            distance = min(
+                edit_distance(normalized, name[:len(normalized)]),
+                *(edit_distance(normalized, word) for word in name.split())
+            )
+            if distance <= max_distance:
+                scored.append((distance, -shared, len(name), station_id))
+
+        scored.sort()
+        return [self._stations[station_id] for *_, station_id in scored[:limit]]
+
+
+station_index = StationIndex()
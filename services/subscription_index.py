@@ -0,0 +1,112 @@
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from models import FetchKey, Route, TicketOffer, WAGON_CLASS_BITS
+
+
+class SubscriptionIndex:
+    """
+    Inverted index of active routes: fetch key -> route id -> wagon mask
+
+    Doubles as the fetch plan (its keys are what has to be polled). A fetched
+    trips payload is matched against every subscriber of its key in one pass:
+    wagons no subscriber wants are skipped, and each offer is built once and
+    handed to the routes subscribed to its class.
+    """
+
+    def __init__(self):
+        self._keys: Dict[FetchKey, Dict[int, int]] = {}
+
+    @classmethod
+    def from_routes(cls, routes: Iterable[Route]) -> "SubscriptionIndex":
+        index = cls()
+        for route in routes:
+            index.add(route)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: FetchKey) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[FetchKey]:
+        return iter(self._keys)
+
+    def subscribe(self, key: FetchKey, route: Route) -> bool:
+        """Subscribe a route to one key; returns True if the key is new"""
+        if not route.wagon_mask:
+            return False
+
+        subscription = self._keys.get(key)
+        is_new = subscription is None
+        if is_new:
+            subscription = self._keys[key] = {}
+        subscription[route.id] = route.wagon_mask
+        return is_new
+
+    def add(self, route: Route) -> List[FetchKey]:
+        """Subscribe a route to its keys from today on; returns the keys that are new"""
+        return [key for key in route.fetch_keys() if self.subscribe(key, route)]
+
+    def remove(self, route: Route) -> List[FetchKey]:
+        """Unsubscribe a route; returns the keys nobody subscribes to anymore"""
+        dropped_keys = []
+        # All dates, including ones that passed since the route was added
+        for key in route.fetch_keys(today=date.min):
+            subscription = self._keys.get(key)
+            if subscription is None:
+                continue
+            subscription.pop(route.id, None)
+            if not subscription:
+                del self._keys[key]
+                dropped_keys.append(key)
+        return dropped_keys
+
+    def subscribers(self, key: FetchKey) -> Set[int]:
+        subscription = self._keys.get(key)
+        return set(subscription) if subscription else set()
+
+    def match(self, key: FetchKey, trains_data: Optional[Dict[str, Any]]) -> Dict[int, List[TicketOffer]]:
+        """Offers of a trips payload per subscribed route id; routes without offers are absent"""
+        subscription = self._keys.get(key)
+        if subscription is None or not trains_data:
+            return {}
+
+        wanted = 0
+        for mask in subscription.values():
+            wanted |= mask
+
+        # Routes per wagon class bit, grouped only for classes present in the payload
+        by_class: Dict[int, List[int]] = {}
+        matches: Dict[int, List[TicketOffer]] = {}
+        for trip in trains_data.get("direct", ()):
+            train = trip.get("train")
+            if not train:
+                continue
+
+            for wagon in train.get("wagon_classes", ()):
+                bit = WAGON_CLASS_BITS.get(wagon.get("id", ""), 0)
+                free_seats = wagon.get("free_seats", 0)
+                if not bit & wanted or free_seats <= 0:
+                    continue
+
+                offer = TicketOffer(
+                    train_number=train.get("number"),
+                    wagon_type=wagon["id"],
+                    free_seats=free_seats,
+                    price=wagon.get("price"),
+                    depart_at=trip.get("depart_at"),
+                    arrive_at=trip.get("arrive_at"),
+                    wagon_name=wagon.get("name"),
+                    station_from=trip.get("station_from"),
+                    station_to=trip.get("station_to")
+                )
+                route_ids = by_class.get(bit)
+                if route_ids is None:
+                    route_ids = by_class[bit] = [
+                        route_id for route_id, mask in subscription.items() if mask & bit
+                    ]
+                for route_id in route_ids:
+                    matches.setdefault(route_id, []).append(offer)
+
+        return matches
@@ -1,121 +1,245 @@
 import logging
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple
 from pyrogram import Client
-from pyrogram.errors import FloodWait, PhoneNumberInvalid, SessionPasswordNeeded
+from pyrogram.errors import FloodWait, PeerIdInvalid, PhoneNumberInvalid, SessionPasswordNeeded
 from pyrogram.raw.functions.phone import RequestCall
-from pyrogram.raw.types import InputPhoneCall, PhoneCallProtocol
-import asyncio
+from pyrogram.raw.types import InputUser, PhoneCallProtocol
 import random
+from services.db_service import CallerPeerService
 from config import config
+from utils.metrics import calls_total, metrics
 
 logger = logging.getLogger(__name__)
 
 
+class CallerAccount:
+    """One Pyrogram session placing calls, with its own peer cache and FloodWait state"""
+    
+    def __init__(self, session: str, phone_number: str):
+        self.session = session
+        self.phone_number = phone_number
+        self.client = None
+        self.username: Optional[str] = None
+        # telegram_id -> (peer user_id, access_hash) as resolved by this session
+        self.peers: Dict[int, Tuple[int, int]] = {}
+        self.flood_until = 0.0
+        self.in_flight = 0
+        self.calls = 0
+    
+    @property
+    def is_flooded(self) -> bool:
+        return self.flood_until > time.monotonic()
+    
+    async def start(self):
+        self.client = Client(
+            name=self.session,
+            api_id=config.API_ID,
+            api_hash=config.API_HASH,
+            phone_number=self.phone_number,
+            workdir="."
+        )
+        
+        await self.client.start()
+        self.username = self.client.me.username if self.client.me else None
+        self.peers = await CallerPeerService.get_peers(self.session)
+        logger.info(f"Caller session {self.session} (@{self.username}) started, {len(self.peers)} cached peers")
+    
+    async def stop(self):
+        await self.client.stop()
+    
+    async def knows(self, telegram_id: int) -> bool:
+        """True if the user is in this session's cache or local storage, i.e. has talked to it"""
+        if telegram_id in self.peers:
+            return True
+        try:
+            await self.client.storage.get_peer_by_id(telegram_id)
+            return True
+        except Exception:
+            return False
+    
+    async def resolve_user(self, telegram_id: int, username: Optional[str] = None) -> InputUser:
+        cached = self.peers.get(telegram_id)
+        if cached is not None:
+            return InputUser(user_id=cached[0], access_hash=cached[1])
+        
+        # Username first: the caller account may have never seen this user id
+        if username:
+            peer = await self.client.resolve_peer(username.replace('@', ''))
+        else:
+            peer = await self.client.resolve_peer(telegram_id)
+        
+        self.peers[telegram_id] = (peer.user_id, peer.access_hash)
+        await CallerPeerService.save_peer(
+            self.session, telegram_id, username, peer.user_id, peer.access_hash
+        )
+        return InputUser(user_id=peer.user_id, access_hash=peer.access_hash)
+    
+    async def forget_peer(self, telegram_id: int):
+        if self.peers.pop(telegram_id, None) is not None:
+            await CallerPeerService.delete_peer(self.session, telegram_id)
+    
+    async def call_user(self, telegram_id: int, username: Optional[str] = None):
+        self.in_flight += 1
+        try:
+            user = await self.resolve_user(telegram_id, username)
+            
+            # Create call protocol
+            protocol = PhoneCallProtocol(
+                min_layer=65,
+                max_layer=92,
+                udp_p2p=True,
+                udp_reflector=True,
+                library_versions=["2.4.4"]
+            )
+            
+            # Request call via MTProto
+            await self.client.invoke(
+                RequestCall(
+                    user_id=user,
+                    random_id=random.randint(1, 2147483647),  # 32-bit int
+                    g_a_hash=bytes([0] * 32),  # Placeholder for encryption
+                    protocol=protocol,
+                    video=False
+                )
+            )
+            self.calls += 1
+        except PeerIdInvalid:
+            # Cached access hash no longer valid, resolve again on the next call
+            await self.forget_peer(telegram_id)
+            raise
+        finally:
+            self.in_flight -= 1
+
+
 class TelegramCaller:
+    """
+    Pool of caller accounts (config.CALLER_SESSIONS)
+    
+    A user is pinned to the account they talked to: the one whose cache or
+    local storage already knows them, checking the NOTIFICATION_ACCOUNT
+    session first. Users no account knows go to the least loaded account.
+    An account in FloodWait is skipped until the wait is over, and its calls
+    fail over to the others. FloodWait is raised only when every account is
+    waiting.
+    """
+    
     def __init__(self):
-        self.client = None
+        self.accounts: List[CallerAccount] = []
         self.is_initialized = False
+        # telegram_id -> session of the account that calls the user
+        self.pins: Dict[int, str] = {}
+    
+    @property
+    def client(self):
+        """Client of the primary account, for sending messages"""
+        return self.accounts[0].client if self.accounts else None
     
     async def initialize(self):
         if not config.API_ID or not config.API_HASH:
             logger.warning("API_ID or API_HASH not configured. Group calls disabled.")
             return False
         
-        try:
-            self.client = Client(
-                name=config.SESSION_NAME,
-                api_id=config.API_ID,
-                api_hash=config.API_HASH,
-                phone_number=config.PHONE_NUMBER,
-                workdir="."
-            )
-            
-            await self.client.start()
-            self.is_initialized = True
-            logger.info("Pyrogram client initialized successfully")
-            return True
-            
-        except PhoneNumberInvalid:
-            logger.error("Invalid phone number")
-            return False
-        except SessionPasswordNeeded:
-            logger.error("2FA password required. Please authorize manually.")
-            return False
-        except Exception as e:
-            logger.error(f"Error initializing Pyrogram client: {e}")
+        for session, phone_number in config.CALLER_SESSIONS:
+            account = CallerAccount(session, phone_number)
+            try:
+                await account.start()
+                self.accounts.append(account)
+            except PhoneNumberInvalid:
+                logger.error(f"Invalid phone number for caller session {session}")
+            except SessionPasswordNeeded:
+                logger.error(f"2FA password required for caller session {session}. Please authorize manually.")
+            except Exception as e:
+                logger.error(f"Error initializing Pyrogram client {session}: {e}")
+        
+        if not self.accounts:
             return False
+        
+        # The account users are asked to message is checked first when pinning
+        primary = config.NOTIFICATION_ACCOUNT.lstrip('@').lower()
+        self.accounts.sort(key=lambda account: (account.username or '').lower() != primary)
+        
+        for account in self.accounts:
+            for telegram_id in account.peers:
+                self.pins.setdefault(telegram_id, account.session)
+        
+        self.is_initialized = True
+        logger.info(f"Pyrogram caller pool initialized with {len(self.accounts)} accounts")
+        return True
     
     async def close(self):
-        if self.client and self.is_initialized:
-            await self.client.stop()
-            logger.info("Pyrogram client stopped")
+        for account in self.accounts:
+            try:
+                await account.stop()
+            except Exception as e:
+                logger.error(f"Error stopping caller session {account.session}: {e}")
+        if self.accounts:
+            logger.info("Pyrogram clients stopped")
+        self.accounts = []
+        self.is_initialized = False
+    
+    def collect_metrics(self):
+        for session, stats in self.stats().items():
+            yield "ukz_caller_in_flight", "gauge", "Calls being placed per caller session", {"session": session}, stats["in_flight"]
+            yield "ukz_caller_flood_wait_seconds", "gauge", "Remaining FloodWait per caller session", {"session": session}, stats["flood_wait"]
+    
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        return {
+            account.session: {
+                "in_flight": account.in_flight,
+                "calls": account.calls,
+                "flood_wait": max(0.0, account.flood_until - now),
+            }
+            for account in self.accounts
+        }
     
-    async def make_group_call(self, user_ids: List[int], usernames: List[str] = None) -> bool:
+    async def call_user(self, telegram_id: int, username: Optional[str] = None) -> bool:
         """
-        Initiate voice call to users via Pyrogram
+        Initiate a voice call to one user via MTProto
         Note: User must have started conversation with the caller account first
         
-        Args:
-            user_ids: List of telegram user IDs (fallback)
-            usernames: List of usernames (preferred, without @)
+        FloodWait is raised to the caller instead of being waited out here,
+        so the call can be rescheduled without blocking anything else.
         """
         if not self.is_initialized:
-            logger.warning("Caller not initialized. Skipping group call.")
+            logger.warning("Caller not initialized. Skipping call.")
             return False
         
-        if not usernames:
-            usernames = []
+        if telegram_id not in self.pins:
+            for account in self.accounts:
+                if await account.knows(telegram_id):
+                    self.pins[telegram_id] = account.session
+                    break
         
-        try:
-            for idx, user_id in enumerate(user_ids):
-                try:
-                    # Try to use username first if available
-                    username = usernames[idx] if idx < len(usernames) and usernames[idx] else None
-                    
-                    if username:
-                        # Use username (remove @ if present)
-                        username_clean = username.replace('@', '')
-                        logger.info(f"Initiating voice call to @{username_clean}")
-                        user = await self.client.get_users(username_clean)
-                    else:
-                        # Fallback to user_id
-                        logger.info(f"Initiating voice call to user {user_id}")
-                        user = await self.client.get_users(user_id)
-                    
-                    # Create call protocol
-                    protocol = PhoneCallProtocol(
-                        min_layer=65,
-                        max_layer=92,
-                        udp_p2p=True,
-                        udp_reflector=True,
-                        library_versions=["2.4.4"]
-                    )
-                    
-                    # Request call via MTProto
-                    result = await self.client.invoke(
-                        RequestCall(
-                            user_id=await self.client.resolve_peer(user.id),
-                            random_id=random.randint(1, 2147483647),  # 32-bit int
-                            g_a_hash=bytes([0] * 32),  # Placeholder for encryption
-                            protocol=protocol,
-                            video=False
-                        )
-                    )
-                    
-                    logger.info(f"Call initiated successfully to user {user.id} (@{user.username})")
-                    
-                except FloodWait as e:
-                    logger.warning(f"FloodWait for user {user_id}: {e.value} seconds")
-                    await asyncio.sleep(e.value)
-                except Exception as e:
-                    logger.error(f"Error calling user {user_id}: {e}")
-                    # Don't send duplicate notification - user already got message via bot
+        for account in self._candidates(telegram_id):
+            try:
+                await account.call_user(telegram_id, username)
+            except FloodWait as e:
+                calls_total.inc(account.session, "flood_wait")
+                account.flood_until = time.monotonic() + e.value
+                logger.warning(f"FloodWait {e.value}s on caller session {account.session}, failing over")
+                continue
+            except Exception:
+                calls_total.inc(account.session, "error")
+                raise
             
+            calls_total.inc(account.session, "ok")
+            # A failover call doesn't move the pin off the account the user talked to
+            self.pins.setdefault(telegram_id, account.session)
+            logger.info(f"Call initiated successfully to user {telegram_id} from {account.session}")
             return True
-            
-        except Exception as e:
-            logger.error(f"Error making group call: {e}")
-            return False
+        
+        # Every account is waiting out a FloodWait
+        wait = min(account.flood_until for account in self.accounts) - time.monotonic()
+        raise FloodWait(value=max(1, int(wait) + 1))
+    
+    def _candidates(self, telegram_id: int) -> List[CallerAccount]:
+        pinned = self.pins.get(telegram_id)
+        return sorted(
+            (account for account in self.accounts if not account.is_flooded),
+            key=lambda account: (account.session != pinned, account.in_flight, account.calls)
+        )
     
     async def send_call_notification(self, user_id: int, message: str) -> bool:
         if not self.is_initialized:
@@ -135,3 +259,4 @@ class TelegramCaller:
 
 
 caller_instance = TelegramCaller()
+metrics.collector(caller_instance.collect_metrics)
@@ -0,0 +1,68 @@
+"""
+FloodWait reschedules a call without using up its attempts
+
+Attempts are for real failures; FloodWait is bounded by the total time a
+call may spend waiting on it.
+"""
+import asyncio
+import time
+from pyrogram.errors import FloodWait
+from services.call_dispatcher import CallDispatcher, CallRequest
+
+
+class FakeCaller:
+    """Raises the scripted errors in turn, then places the call"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def call_user(self, telegram_id, username=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return True
+
+
+async def run_call(caller: FakeCaller, timeout: float = 5, **kwargs) -> CallDispatcher:
+    dispatcher = CallDispatcher(caller, workers=1, **kwargs)
+    dispatcher.start()
+    assert dispatcher.enqueue(CallRequest(telegram_id=1))
+
+    deadline = time.monotonic() + timeout
+    while dispatcher.placed + dispatcher.failed == 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    await dispatcher.stop()
+    return dispatcher
+
+
+def test_flood_wait_does_not_use_up_attempts():
+    caller = FakeCaller([FloodWait(value=0) for _ in range(5)])
+
+    dispatcher = asyncio.run(run_call(caller, max_attempts=2))
+
+    assert caller.calls == 6
+    assert dispatcher.placed == 1
+    assert dispatcher.failed == 0
+
+
+def test_other_errors_still_use_up_attempts():
+    caller = FakeCaller([FloodWait(value=0), FloodWait(value=0), RuntimeError("call failed")])
+
+    dispatcher = asyncio.run(run_call(caller, max_attempts=1))
+
+    assert caller.calls == 3
+    assert dispatcher.placed == 0
+    assert dispatcher.failed == 1
+
+
+def test_total_flood_wait_is_capped():
+    caller = FakeCaller([FloodWait(value=1) for _ in range(5)])
+
+    dispatcher = asyncio.run(run_call(caller, max_attempts=10, max_flood_wait=1.5))
+
+    # 1s of waiting fits the budget, the second FloodWait would make it 2s
+    assert caller.calls == 2
+    assert dispatcher.placed == 0
+    assert dispatcher.failed == 1
+    assert dispatcher.stats()["pending"] == 0
@@ -0,0 +1,73 @@
+"""
+UZ circuit breaker states and the metrics exported for them
+"""
+import time
+import pytest
+from uz_api.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from uz_api.client import UZApiClient
+from uz_api.session_pool import SessionPool
+
+
+def wait_for_retry(breaker: CircuitBreaker):
+    time.sleep(breaker.seconds_until_retry() + 0.01)
+
+
+def exported(client: UZApiClient, name: str):
+    return {
+        tuple(sorted(labels.items())): value
+        for metric, _, _, labels, value in client.collect_metrics()
+        if metric == name
+    }
+
+
+def test_breaker_cycle_with_retry_after():
+    client = UZApiClient(session_pool=SessionPool(size=1))
+    breaker = client.breaker = CircuitBreaker(failure_threshold=2, base_delay=0.01, max_delay=0.02)
+
+    # Retry-After opens the circuit at once and sets the minimum open time
+    breaker.record_failure(retry_after=0.2)
+    assert breaker.state == OPEN
+    assert breaker.seconds_until_retry() > 0.1
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # One probe goes through once the open period is over
+    wait_for_retry(breaker)
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # A failed probe opens the circuit again
+    breaker.record_failure(retry_after=0.1)
+    assert breaker.state == OPEN
+    assert breaker.seconds_until_retry() > 0.05
+
+    wait_for_retry(breaker)
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+    # Without Retry-After it takes failure_threshold consecutive failures
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    assert breaker.transitions == {
+        (CLOSED, OPEN): 2,
+        (OPEN, HALF_OPEN): 2,
+        (HALF_OPEN, OPEN): 1,
+        (HALF_OPEN, CLOSED): 1,
+    }
+    assert exported(client, "ukz_uz_breaker_transitions_total") == {
+        (("from", CLOSED), ("to", OPEN)): 2,
+        (("from", OPEN), ("to", HALF_OPEN)): 2,
+        (("from", HALF_OPEN), ("to", OPEN)): 1,
+        (("from", HALF_OPEN), ("to", CLOSED)): 1,
+    }
+    assert exported(client, "ukz_uz_breaker_state") == {
+        (("state", CLOSED),): 0,
+        (("state", OPEN),): 1,
+        (("state", HALF_OPEN),): 0,
+    }
@@ -0,0 +1,55 @@
+"""
+Migrations and hot-query indexes against a real Postgres
+
+Needs BENCH_DATABASE_URL; each test works in its own throwaway schema.
+"""
+import asyncio
+import os
+import pytest
+import asyncpg
+from benchmarks.check_indexes import check
+from db.migrations import MIGRATIONS, migrate
+
+DSN = os.getenv("BENCH_DATABASE_URL")
+SCHEMA = "test_migrations"
+
+pytestmark = pytest.mark.skipif(not DSN, reason="BENCH_DATABASE_URL is not set")
+
+
+async def migrate_concurrently(starts: int):
+    admin = await asyncpg.connect(DSN)
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await admin.execute(f"CREATE SCHEMA {SCHEMA}")
+
+    conns = [
+        await asyncpg.connect(DSN, server_settings={"search_path": SCHEMA})
+        for _ in range(starts)
+    ]
+    try:
+        applied = await asyncio.gather(*(migrate(conn) for conn in conns))
+        versions = [row["version"] for row in await conns[0].fetch(
+            "SELECT version FROM schema_version ORDER BY version"
+        )]
+    finally:
+        for conn in conns:
+            await conn.close()
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+    return applied, versions
+
+
+def test_concurrent_starts_migrate_once():
+    applied, versions = asyncio.run(migrate_concurrently(4))
+
+    expected = [version for version, _, _ in MIGRATIONS]
+    assert versions == expected
+    # One start applies everything, the others find nothing left to do
+    assert sorted(applied, key=len) == [[]] * 3 + [expected]
+
+
+def test_hot_queries_use_their_indexes():
+    results = asyncio.run(check(20000))
+
+    failed = [result for result in results if not result["ok"]]
+    assert not failed, failed
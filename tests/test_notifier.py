@@ -0,0 +1,52 @@
+"""
+A burst of notifications to one chat doesn't hold up other chats
+
+Telegram allows about one message per second per chat, so a busy chat's
+messages wait for its bucket; the workers must keep serving other chats.
+"""
+import asyncio
+import time
+from services.notifier import Notification, NotificationDispatcher
+
+CHAT_RATE = 10
+BURST = 6
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text, time.monotonic()))
+
+
+async def burst_to_one_chat():
+    bot = FakeBot()
+    dispatcher = NotificationDispatcher(bot, workers=2, global_rate=1000, chat_rate=CHAT_RATE)
+    dispatcher.start()
+
+    started = time.monotonic()
+    for i in range(BURST):
+        await dispatcher.enqueue(Notification(chat_id=1, text=f"busy {i}"))
+    await dispatcher.enqueue(Notification(chat_id=2, text="other"))
+
+    await dispatcher.stop(timeout=5)
+    return bot.sent, started, dispatcher
+
+
+def test_busy_chat_does_not_stall_other_chats():
+    sent, started, dispatcher = asyncio.run(burst_to_one_chat())
+
+    other = [at for chat_id, _, at in sent if chat_id == 2]
+    busy = [(text, at) for chat_id, text, at in sent if chat_id == 1]
+
+    # Sent right away, not after the busy chat's burst
+    assert len(other) == 1
+    assert other[0] - started < 1 / CHAT_RATE
+    assert other[0] < busy[-1][1]
+
+    # The busy chat still gets everything, in order and at its rate
+    assert [text for text, _ in busy] == [f"busy {i}" for i in range(BURST)]
+    assert busy[-1][1] - busy[0][1] >= (BURST - 1) / CHAT_RATE * 0.9
+    assert dispatcher.dead_lettered == 0
+    assert dispatcher.stats()["chat_backlog"] == 0
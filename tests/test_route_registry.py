@@ -0,0 +1,129 @@
+"""
+RouteRegistry: the checksum reconcile repairs a missed NOTIFY
+
+The routes table and the LISTEN connection are faked in memory; the
+registry only sees the table through RouteService.
+"""
+import asyncio
+import json
+from datetime import date, timedelta
+from models import FetchKey, Route
+from services import route_registry
+from services.db_service import RouteService
+from services.route_registry import CHANNEL, RouteRegistry
+
+TRAVEL_DATE = date.today() + timedelta(days=7)
+
+
+def route(route_id: int, station_to_id: int, row_hash: int, wagon_mask: int = 1) -> Route:
+    return Route(
+        id=route_id,
+        user_id=1,
+        station_from_id=2200001,
+        station_from_name="Київ",
+        station_to_id=station_to_id,
+        station_to_name=str(station_to_id),
+        dates=(TRAVEL_DATE,),
+        wagon_mask=wagon_mask,
+        is_active=True,
+        row_hash=row_hash
+    )
+
+
+def key(route: Route) -> FetchKey:
+    return FetchKey(route.station_from_id, route.station_to_id, TRAVEL_DATE)
+
+
+class FakeListener:
+    def __init__(self):
+        self.callback = None
+
+    async def add_listener(self, channel, callback):
+        assert channel == CHANNEL
+        self.callback = callback
+
+    def is_closed(self) -> bool:
+        return False
+
+    async def close(self):
+        pass
+
+    def notify(self, route_id: int):
+        self.callback(self, 0, CHANNEL, json.dumps({"id": route_id}))
+
+
+class FakeRoutesTable:
+    def __init__(self, monkeypatch):
+        self.routes = {}
+        self.listener = FakeListener()
+        monkeypatch.setattr(RouteService, "get_active_routes_with_plan", self.with_plan)
+        monkeypatch.setattr(RouteService, "get_active_routes_by_ids", self.by_ids)
+        monkeypatch.setattr(RouteService, "get_active_routes_checksum", self.checksum)
+        monkeypatch.setattr(route_registry.asyncpg, "connect", self.connect, raising=False)
+
+    async def connect(self, dsn):
+        return self.listener
+
+    def put(self, route: Route, notify: bool = True):
+        self.routes[route.id] = route
+        if notify:
+            self.listener.notify(route.id)
+
+    def delete(self, route_id: int, notify: bool = True):
+        del self.routes[route_id]
+        if notify:
+            self.listener.notify(route_id)
+
+    async def with_plan(self):
+        plan = {}
+        for route in self.routes.values():
+            for fetch_key in route.fetch_keys():
+                plan.setdefault(fetch_key, []).append(route.id)
+        return list(self.routes.values()), list(plan.items())
+
+    async def by_ids(self, route_ids):
+        return [self.routes[route_id] for route_id in route_ids if route_id in self.routes]
+
+    async def checksum(self):
+        return len(self.routes), sum(route.row_hash for route in self.routes.values())
+
+
+def test_reconcile_repairs_missed_notify(monkeypatch):
+    table = FakeRoutesTable(monkeypatch)
+    lviv, odesa, kharkiv, dnipro = (
+        route(1, 2218000, 11), route(2, 2208001, 22), route(3, 2204001, 33), route(4, 2210700, 44)
+    )
+    table.put(lviv, notify=False)
+    table.put(odesa, notify=False)
+    registry = RouteRegistry(reconcile_seconds=600)
+
+    async def scenario():
+        await registry.refresh()
+        assert registry.pop_changes() == ({key(lviv), key(odesa)}, set(), set())
+
+        # A notified insert is applied from the notification alone
+        table.put(kharkiv)
+        await registry.refresh()
+        assert registry.pop_changes() == ({key(kharkiv)}, set(), set())
+
+        # These NOTIFYs are lost; steady traffic for another route keeps coming
+        table.delete(odesa.id, notify=False)
+        table.put(dnipro, notify=False)
+        table.put(lviv._replace(wagon_mask=3, row_hash=12))
+        await registry.refresh()
+        assert registry.pop_changes() == (set(), set(), set())
+        assert odesa.id in registry.routes and dnipro.id not in registry.routes
+
+        # The reconcile is due even though notifications are pending
+        registry._next_reconcile = 0
+        table.put(lviv._replace(wagon_mask=1, row_hash=13))
+        await registry.refresh()
+        return registry.pop_changes()
+
+    added_keys, removed_keys, removed_routes = asyncio.run(scenario())
+
+    assert added_keys == {key(dnipro)}
+    assert removed_keys == {key(odesa)}
+    assert removed_routes == {odesa.id}
+    assert registry.routes == table.routes
+    assert set(registry.index) == {key(lviv), key(kharkiv), key(dnipro)}
@@ -0,0 +1,81 @@
+"""
+Station search goes to UZ unless the local index really has the station
+
+The index fills as users search, so a fuzzy hit in a partial index must not
+hide a station it has never seen.
+"""
+import asyncio
+from bot.handlers import routes
+from services.db_service import StationService
+from services.station_index import StationIndex
+
+KIVERTSI = {"id": 2218300, "name": "Ківерці"}
+LVIV = {"id": 2218000, "name": "Львів"}
+KYIV = {"id": 2200001, "name": "Київ"}
+
+
+class FakeUZClient:
+    def __init__(self, stations):
+        self.stations = stations
+        self.queries = []
+
+    async def search_stations(self, query):
+        self.queries.append(query)
+        return [station for station in self.stations if station["name"].lower().startswith(query.lower())]
+
+
+async def no_upsert(stations):
+    pass
+
+
+def partial_index() -> StationIndex:
+    index = StationIndex()
+    index._index_all([KIVERTSI, LVIV])
+    return index
+
+
+def test_partial_index_serves_prefix_hits_only():
+    index = partial_index()
+
+    assert index.search("Льв") == [LVIV]
+    assert index.search("Київ") == []
+    assert index.search("Киверци") == []
+
+
+def test_find_stations_asks_uz_when_index_misses(monkeypatch):
+    uz = FakeUZClient([KYIV])
+    monkeypatch.setattr(routes, "station_index", partial_index())
+    monkeypatch.setattr(routes, "uz_client", uz)
+    monkeypatch.setattr(StationService, "upsert_stations", no_upsert)
+
+    assert asyncio.run(routes.find_stations("Київ")) == [KYIV]
+    assert uz.queries == ["Київ"]
+    # Remembered, so the next search is a prefix hit in the index
+    assert routes.station_index.search("Київ") == [KYIV]
+
+
+def test_fuzzy_search_after_bulk_refresh(monkeypatch):
+    monkeypatch.setattr(StationService, "upsert_stations", no_upsert)
+    index = StationIndex()
+
+    asyncio.run(index.refresh(FakeUZClient([KIVERTSI, LVIV, KYIV])))
+
+    assert index.complete
+    assert len(index) == 3
+    assert index.search("Киверци") == [KIVERTSI]
+
+
+def test_failed_refresh_keeps_fuzzy_search_off(monkeypatch):
+    class FailingUZClient(FakeUZClient):
+        async def search_stations(self, query):
+            if query == "к":
+                raise RuntimeError("UZ is down")
+            return await super().search_stations(query)
+
+    monkeypatch.setattr(StationService, "upsert_stations", no_upsert)
+    index = StationIndex()
+
+    asyncio.run(index.refresh(FailingUZClient([KIVERTSI, LVIV])))
+
+    assert not index.complete
+    assert index.search("Киверци") == []
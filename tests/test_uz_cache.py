@@ -0,0 +1,84 @@
+"""
+Single-flight in TTLCache: coalesced callers survive a cancelled leader
+"""
+import asyncio
+import pytest
+from uz_api.cache import TTLCache
+
+
+class SlowFetch:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"result {self.calls}"
+
+
+async def cancel_leader_with_waiters():
+    cache = TTLCache()
+    fetch = SlowFetch()
+
+    leader = asyncio.create_task(cache.get_or_fetch("key", 60, fetch))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_fetch("key", 60, fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+    results = await asyncio.gather(*waiters)
+    return cache, fetch, waiters, results
+
+
+def test_cancelled_leader_lets_waiters_retry():
+    cache, fetch, waiters, results = asyncio.run(cancel_leader_with_waiters())
+
+    assert not any(waiter.cancelled() for waiter in waiters)
+    # One waiter took over the fetch, the others joined it
+    assert results == ["result 2"] * 3
+    assert fetch.calls == 2
+    assert cache.get("key") == (True, "result 2")
+    assert cache.stats()["misses"] + cache.stats()["coalesced"] == 4
+
+
+async def cancel_waiter():
+    cache = TTLCache()
+    fetch = SlowFetch()
+
+    leader = asyncio.create_task(cache.get_or_fetch("key", 60, fetch))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_or_fetch("key", 60, fetch))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    return await leader, fetch
+
+
+def test_cancelled_waiter_leaves_leader_running():
+    result, fetch = asyncio.run(cancel_waiter())
+
+    assert result == "result 1"
+    assert fetch.calls == 1
+
+
+async def fail_leader():
+    cache = TTLCache()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("UZ error")
+
+    tasks = [asyncio.create_task(cache.get_or_fetch("key", 60, fetch)) for _ in range(2)]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_fetch_errors_reach_waiters():
+    results = asyncio.run(fail_leader())
+
+    assert [type(result) for result in results] == [ValueError, ValueError]
@@ -0,0 +1,68 @@
+"""
+Bot handlers keep responding while the monitor waits on a slow UZ API
+
+Runs UZApiClient against a local aiohttp server that answers /api/v3/trips
+after a multi-second delay, all on one event loop, and times a handler-like
+coroutine while the UZ request is in flight.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from utils.rate_limiter import TokenBucket
+from uz_api.client import UZApiClient
+
+UZ_LATENCY = 2.0
+
+TRIPS = {"direct": [{"train": {"number": "091К", "wagon_classes": []}}]}
+
+
+async def slow_trips(request: web.Request) -> web.Response:
+    await asyncio.sleep(UZ_LATENCY)
+    return web.json_response(TRIPS)
+
+
+async def handler() -> str:
+    """Stand-in for a bot handler: a few awaits and some work"""
+    for _ in range(10):
+        await asyncio.sleep(0.01)
+    return "ok"
+
+
+async def check_handler_latency():
+    app = web.Application()
+    app.router.add_get("/api/v3/trips", slow_trips)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="uz-http")
+    client = UZApiClient(rate_limiter=TokenBucket(100, 10), executor=executor)
+    client.base_url = f"http://127.0.0.1:{port}/api/"
+
+    try:
+        fetch = asyncio.create_task(client.fetch_trains(2200001, 2218000, "2030-01-01"))
+        # Let the request reach the server before the handler runs
+        await asyncio.sleep(0.2)
+        assert not fetch.done()
+
+        started = time.monotonic()
+        assert await handler() == "ok"
+        handler_seconds = time.monotonic() - started
+
+        fetch_started = time.monotonic()
+        trains = await asyncio.wait_for(fetch, UZ_LATENCY * 5)
+        remaining_fetch_seconds = time.monotonic() - fetch_started
+    finally:
+        executor.shutdown(wait=False)
+        await runner.cleanup()
+
+    assert handler_seconds < UZ_LATENCY / 4
+    # The handler ran while the request was still waiting on UZ
+    assert remaining_fetch_seconds > UZ_LATENCY / 2
+    assert trains["direct"][0]["train"]["number"] == "091К"
+
+
+def test_handlers_respond_while_uz_is_slow():
+    asyncio.run(check_handler_latency())
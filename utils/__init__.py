@@ -1,3 +1,4 @@
-from utils.telegram_logger import setup_logger, AsyncTelegramHandler
+from utils.telegram_logger import setup_logger, AsyncTelegramHandler, close_telegram_logging
+from utils.rate_limiter import TokenBucket
 
-__all__ = ["setup_logger", "AsyncTelegramHandler"]
+__all__ = ["setup_logger", "AsyncTelegramHandler", "close_telegram_logging", "TokenBucket"]
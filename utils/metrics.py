@@ -0,0 +1,203 @@
+import bisect
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from aiohttp import web
+from config import config
+
+# Seconds; covers everything from a DB query to a slow UZ request
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, (counts, total) in self._values.items():
+            base = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**base, "le": repr(float(bound))}, cumulative
+            cumulative += counts[-1]
+            yield f"{self.name}_bucket", {**base, "le": "+Inf"}, cumulative
+            yield f"{self.name}_sum", base, total[0]
+            yield f"{self.name}_count", base, cumulative
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format
+
+    Hot paths update counters and histograms directly; with metrics disabled
+    every update returns on its first line. Values that already live
+    elsewhere (queue sizes, pool usage, cache stats) are read by collectors
+    at scrape time instead, so they cost nothing between scrapes.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(self, name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labels, buckets=buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]):
+        """Register a scrape-time callback yielding (name, kind, help, labels, value)"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        described = set()
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric):
+        self._metrics.append(metric)
+        return metric
+
+
+metrics = MetricsRegistry(enabled=config.METRICS_PORT > 0)
+
+# Shared instruments, updated from the monitor, UZ client, DB and caller
+cycle_seconds = metrics.histogram(
+    "ukz_monitor_cycle_seconds", "Duration of one monitor cycle",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+key_staleness_seconds = metrics.histogram(
+    "ukz_key_staleness_seconds", "Time since the previous successful fetch of a key when it is fetched again",
+    buckets=(30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+)
+keys_fetched = metrics.counter("ukz_keys_fetched_total", "Fetch keys polled", ["result"])
+uz_request_seconds = metrics.histogram(
+    "ukz_uz_request_seconds", "UZ API request latency", ["endpoint", "status"]
+)
+db_query_seconds = metrics.histogram(
+    "ukz_db_query_seconds", "Database query latency", ["op"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+calls_total = metrics.counter("ukz_calls_total", "Voice calls attempted per caller session", ["session", "result"])
+
+
+def uz_status_label(status_code: Optional[int]) -> str:
+    if status_code in (200, 441):
+        return str(status_code)
+    return "other"
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(port: int) -> web.AppRunner:
+    """Serve /metrics from the running event loop"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    return runner
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `burst` tokens
+
+    Waiters are served in FIFO order, so concurrent callers share the budget fairly.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def is_full(self) -> bool:
+        """True when the bucket has refilled completely and nobody is waiting"""
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens only if they are available now and nobody is waiting"""
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def set_rate(self, rate: float):
+        self._refill()
+        self.rate = rate
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
@@ -1,33 +1,178 @@
 import logging
+from collections import deque
 from logging.handlers import RotatingFileHandler
+from typing import List, Optional
 import aiohttp
 import asyncio
 from config import config
 
+# Telegram's limit for one message
+MAX_MESSAGE_LENGTH = 4096
+PREFIX = '📢 '
+
 
 class AsyncTelegramHandler(logging.Handler):
-    def __init__(self, bot_token: str, chat_id: str):
+    """
+    Ships log records to a Telegram chat in batches
+
+    Records go into a bounded buffer. A background task, started with the
+    first record emitted inside the event loop, drains it every
+    `flush_interval` seconds, or sooner once a full message is waiting.
+    Records are joined into messages under Telegram's 4096 character limit
+    and sent over one long-lived aiohttp session. When the buffer is full,
+    new records are dropped and counted, and the next message says how many
+    were lost. 429 responses are retried after their `retry_after`.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        chat_id: str,
+        max_records: int = 1000,
+        flush_interval: float = 5.0,
+        max_retries: int = 3
+    ):
         super().__init__()
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.url = f'https://api.telegram.org/bot{self.bot_token}/sendMessage'
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        # deque appends are thread-safe, so records from executor threads are fine too
+        self._buffer: deque = deque()
+        self._buffered_chars = 0
+        self.dropped = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
 
-    async def _send_message(self, message):
+    def emit(self, record):
         try:
-            async with aiohttp.ClientSession() as session:
-                await session.post(self.url, data={
-                    'chat_id': self.chat_id,
-                    'text': f'📢 {message}'
-                })
-        except Exception as e:
-            print(f"Error sending log to Telegram: {e}")
+            log_entry = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if len(self._buffer) >= self.max_records:
+            self.dropped += 1
+            return
+
+        self._buffer.append(log_entry)
+        self._buffered_chars += len(log_entry) + 1
 
-    def emit(self, record):
-        log_entry = self.format(record)
         try:
-            asyncio.create_task(self._send_message(log_entry))
+            asyncio.get_running_loop()
         except RuntimeError:
-            pass
+            # Not on the loop thread; the next periodic flush picks it up
+            return
+
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._buffered_chars >= MAX_MESSAGE_LENGTH:
+            self._wake.set()
+
+    async def aclose(self):
+        """Send what is buffered and close the session"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush_async()
+        finally:
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+    async def flush_async(self):
+        for message in self._take_messages():
+            await self._send_message(message)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush_async()
+
+    def _take_messages(self) -> List[str]:
+        records = []
+        while self._buffer:
+            records.append(self._buffer.popleft())
+        self._buffered_chars = 0
+
+        if self.dropped:
+            records.append(f'⚠️ {self.dropped} log records dropped, log buffer was full')
+            self.dropped = 0
+
+        limit = MAX_MESSAGE_LENGTH - len(PREFIX)
+        messages = []
+        current = ''
+        for record in records:
+            if len(record) > limit:
+                record = record[:limit - 1] + '…'
+            if current and len(current) + 1 + len(record) > limit:
+                messages.append(current)
+                current = ''
+            current = f'{current}\n{record}' if current else record
+        if current:
+            messages.append(current)
+
+        return messages
+
+    async def _send_message(self, message: str):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+
+        for _ in range(self.max_retries):
+            try:
+                async with self._session.post(self.url, data={
+                    'chat_id': self.chat_id,
+                    'text': f'{PREFIX}{message}'
+                }) as response:
+                    if response.status != 429:
+                        return
+                    payload = await response.json(content_type=None)
+                    retry_after = payload.get('parameters', {}).get('retry_after', 5)
+            except Exception as e:
+                print(f"Error sending log to Telegram: {e}")
+                return
+
+            await asyncio.sleep(retry_after)
+
+        print(f"Dropped Telegram log message after {self.max_retries} rate-limited attempts")
+
+
+_telegram_handler: Optional[AsyncTelegramHandler] = None
+
+
+def get_telegram_handler() -> Optional[AsyncTelegramHandler]:
+    """The process-wide Telegram handler, shared by every logger; None if not configured"""
+    global _telegram_handler
+
+    if _telegram_handler is None and config.LOGGER_BOT_TOKEN and config.LOGGER_CHAT_ID:
+        _telegram_handler = AsyncTelegramHandler(
+            config.LOGGER_BOT_TOKEN,
+            config.LOGGER_CHAT_ID,
+            max_records=config.LOGGER_MAX_RECORDS,
+            flush_interval=config.LOGGER_FLUSH_SECONDS
+        )
+        _telegram_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+        _telegram_handler.setLevel(logging.INFO)
+
+    return _telegram_handler
+
+
+async def close_telegram_logging():
+    if _telegram_handler is not None:
+        await _telegram_handler.aclose()
 
 
 def setup_logger(name: str, telegram_logging: bool = False) -> logging.Logger:
@@ -55,14 +200,9 @@ def setup_logger(name: str, telegram_logging: bool = False) -> logging.Logger:
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
-    if telegram_logging and hasattr(config, 'LOGGER_BOT_TOKEN') and hasattr(config, 'LOGGER_CHAT_ID'):
-        if config.LOGGER_BOT_TOKEN and config.LOGGER_CHAT_ID:
-            telegram_handler = AsyncTelegramHandler(
-                config.LOGGER_BOT_TOKEN,
-                config.LOGGER_CHAT_ID
-            )
-            telegram_handler.setFormatter(formatter)
-            telegram_handler.setLevel(logging.INFO)
+    if telegram_logging:
+        telegram_handler = get_telegram_handler()
+        if telegram_handler is not None:
             logger.addHandler(telegram_handler)
 
     return logger
@@ -0,0 +1,78 @@
+import itertools
+import json
+import random
+import time
+from typing import List, Optional, Tuple
+from utils.metrics import metrics
+from utils.telegram_logger import setup_logger
+
+logger = setup_logger(__name__)
+
+alert_stage_seconds = metrics.histogram(
+    "ukz_alert_stage_seconds", "Time spent in each stage between fetching an offer and alerting the user", ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+alert_latency_seconds = metrics.histogram(
+    "ukz_alert_latency_seconds", "Time from the UZ response to the last alert stage reached", ["outcome"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+)
+
+_trace_ids = itertools.count(1)
+
+
+class AlertTrace:
+    """
+    Timeline of one detected offer, from the UZ response to the user's call
+
+    Stages are marked as the alert moves on: fetched, diffed, stored, sent,
+    called. `finish` records how long each stage took since the previous
+    one; sampled traces are also logged as one JSON line.
+    """
+
+    __slots__ = ("trace_id", "route_id", "sampled", "marks", "finished")
+
+    def __init__(self, route_id: int, fetched_at: float, sampled: bool):
+        self.trace_id = next(_trace_ids)
+        self.route_id = route_id
+        self.sampled = sampled
+        self.marks: List[Tuple[str, float]] = [("fetched", fetched_at)]
+        self.finished = False
+
+    def mark(self, stage: str):
+        if not self.finished:
+            self.marks.append((stage, time.monotonic()))
+
+    def finish(self, outcome: str = "called"):
+        if self.finished:
+            return
+        self.finished = True
+
+        stages = {}
+        for (_, previous), (stage, at) in zip(self.marks, self.marks[1:]):
+            stages[stage] = at - previous
+            alert_stage_seconds.observe(at - previous, stage)
+        total = self.marks[-1][1] - self.marks[0][1]
+        alert_latency_seconds.observe(total, outcome)
+
+        if self.sampled:
+            logger.info(json.dumps({
+                "trace": "alert",
+                "trace_id": self.trace_id,
+                "route_id": self.route_id,
+                "outcome": outcome,
+                "total_ms": round(total * 1000, 1),
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in stages.items()},
+            }))
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0):
+        self.sample_rate = sample_rate
+
+    def start(self, route_id: int, fetched_at: Optional[float] = None) -> AlertTrace:
+        """Trace an alert whose offers arrived at monotonic time `fetched_at` (now if unknown)"""
+        return AlertTrace(
+            route_id,
+            fetched_at if fetched_at is not None else time.monotonic(),
+            sampled=self.sample_rate > 0 and random.random() < self.sample_rate
+        )
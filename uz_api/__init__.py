@@ -1,3 +1,4 @@
-from uz_api.client import UZApiClient, UZApiException
+from uz_api.client import UZApiClient, UZApiException, uz_client
+from uz_api.cache import TTLCache
 
-__all__ = ["UZApiClient", "UZApiException"]
+__all__ = ["UZApiClient", "UZApiException", "uz_client", "TTLCache"]
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _LeaderCancelled(Exception):
+    """The fetch shared by coalesced callers was cancelled with its caller"""
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache with per-entry TTL and single-flight fetches
+
+    Concurrent `get_or_fetch` calls for the same key await one in-flight fetch
+    instead of issuing duplicate requests. If the caller running the fetch is
+    cancelled, the waiting callers retry it rather than being cancelled too.
+    `None` results are not cached.
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # The first waiter to get here runs the fetch, the rest join it;
+                # the retry counts the lookup again
+                self.coalesced -= 1
+                return await self.get_or_fetch(key, ttl, fetch)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            # Waiters retry on it; mark as retrieved in case there are none
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark as retrieved, the caller re-raises it below
+            future.exception()
+            raise
+        else:
+            if value is not None and ttl > 0:
+                self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+        }
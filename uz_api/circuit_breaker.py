@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, OPEN, HALF_OPEN)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_in: float):
+        super().__init__(f"UZ API circuit is open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Global circuit breaker for UZ API calls
+
+    After `failure_threshold` consecutive throttling/server failures the circuit
+    opens and every call fails fast. The open period grows exponentially with
+    every re-open (with jitter) and never ends before the server's Retry-After.
+    When it ends, a single probe call is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        base_delay: float = 10,
+        max_delay: float = 900
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = CLOSED
+        self.failures = 0
+        self.open_count = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+        # (from, to) -> count, for the transitions counter
+        self.transitions: Dict[Tuple[str, str], int] = {}
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() < self.opened_until
+
+    def seconds_until_retry(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_until - time.monotonic())
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a call may go through right now"""
+        if self.state == OPEN:
+            if time.monotonic() < self.opened_until:
+                raise CircuitOpenError(self.seconds_until_retry())
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(1.0)
+            self._probe_in_flight = True
+
+    def release_probe(self):
+        """Let another probe through if the current one was cancelled"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            self.open_count = 0
+            self._transition(CLOSED)
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        self.failures += 1
+
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            self._open(retry_after)
+        elif self.state == CLOSED and (self.failures >= self.failure_threshold or retry_after):
+            self._open(retry_after)
+
+    def _open(self, retry_after: Optional[float]):
+        delay = min(self.base_delay * 2 ** self.open_count, self.max_delay)
+        delay = random.uniform(delay / 2, delay)
+        if retry_after:
+            delay = max(delay, retry_after)
+
+        self.opened_until = time.monotonic() + delay
+        self.open_count += 1
+        self._transition(OPEN, f"for {delay:.0f}s after {self.failures} failures")
+
+    def _transition(self, state: str, reason: str = ""):
+        if state == self.state:
+            return
+        logger.warning(f"UZ API circuit {self.state} -> {state} {reason}".rstrip())
+        key = (self.state, state)
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.state = state
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_count": self.open_count,
+            "retry_in": round(self.seconds_until_retry(), 1)
+        }
@@ -1,49 +1,207 @@
-import uuid
 import logging
 import asyncio
-import random
-from typing import List, Optional, Dict, Any
-import cloudscraper
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from config import config
+from models import Availability, TicketOffer, WAGON_CLASS_BITS
+from utils.rate_limiter import TokenBucket
+from utils.metrics import metrics, uz_request_seconds, uz_status_label
+from uz_api.session_pool import SessionIdentity, SessionPool, is_error_status
+from uz_api.circuit_breaker import STATES, CircuitBreaker, CircuitOpenError
+from uz_api.cache import TTLCache
 
 
 logger = logging.getLogger(__name__)
 
+# Shared by every UZApiClient so the whole process stays within UZ limits
+uz_rate_limiter = TokenBucket(config.UZ_REQUESTS_PER_SECOND, config.UZ_REQUESTS_BURST)
+
+# cloudscraper is synchronous, so requests run in a dedicated pool to keep the event loop free
+uz_http_executor = ThreadPoolExecutor(
+    max_workers=config.UZ_HTTP_WORKERS,
+    thread_name_prefix="uz-http"
+)
+
 
 class UZApiException(Exception):
     pass
 
 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_cloudflare_challenge(response) -> bool:
+    if response.status_code not in (403, 503):
+        return False
+    return (
+        response.headers.get("cf-mitigated") == "challenge"
+        or "Just a moment" in response.text[:2000]
+    )
+
+
+def _configured_proxy_urls() -> List[Optional[str]]:
+    if config.UZ_PROXY_URLS:
+        return config.UZ_PROXY_URLS
+    if config.PROXY_ENABLED and config.PROXY_HOST:
+        return [
+            f"{config.PROXY_TYPE}://{config.PROXY_USER}:{config.PROXY_PASS}@{config.PROXY_HOST}:{config.PROXY_PORT}"
+        ]
+    return [None]
+
+
 class UZApiClient:
-    def __init__(self):
-        self.base_url = "https://app.uz.gov.ua/api/"
-        self.session_id = str(uuid.uuid4())
-        self.scraper = cloudscraper.create_scraper(
-            browser={
-                'browser': 'chrome',
-                'platform': 'windows',
-                'desktop': True
-            }
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucket] = None,
+        executor: Optional[ThreadPoolExecutor] = None,
+        session_pool: Optional[SessionPool] = None,
+        base_url: Optional[str] = None
+    ):
+        self.base_url = base_url or config.UZ_API_BASE_URL
+        self.rate_limiter = rate_limiter or uz_rate_limiter
+        self.executor = executor or uz_http_executor
+        
+        if session_pool is None:
+            proxy_urls = _configured_proxy_urls()
+            session_pool = SessionPool(
+                size=config.UZ_SESSION_POOL_SIZE,
+                proxy_urls=proxy_urls,
+                window=config.UZ_SESSION_WINDOW,
+                error_threshold=config.UZ_SESSION_ERROR_THRESHOLD,
+                quarantine_seconds=config.UZ_SESSION_QUARANTINE_SECONDS
+            )
+            proxied = sum(1 for identity in session_pool.identities if identity.proxies)
+            logger.info(
+                f"UZ session pool: {len(session_pool.identities)} sessions, "
+                f"{proxied} behind {len([url for url in proxy_urls if url])} proxies"
+            )
+        self.session_pool = session_pool
+        self.cache = TTLCache(config.UZ_CACHE_MAX_SIZE)
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.UZ_BREAKER_FAILURE_THRESHOLD,
+            base_delay=config.UZ_BREAKER_BASE_DELAY,
+            max_delay=config.UZ_BREAKER_MAX_DELAY
         )
+        self.base_rate = self.rate_limiter.rate
+    
+    def collect_metrics(self):
+        stats = self.cache.stats()
+        for result in ("hits", "misses", "coalesced"):
+            yield "ukz_uz_cache_lookups_total", "counter", "UZ response cache lookups", {"result": result}, stats[result]
+        yield "ukz_uz_cache_hit_ratio", "gauge", "UZ response cache hit ratio", {}, stats["hit_ratio"]
+        yield "ukz_uz_cache_entries", "gauge", "UZ response cache entries", {}, stats["size"]
+        yield "ukz_uz_cache_evictions_total", "counter", "UZ response cache evictions", {}, stats["evictions"]
+        for state in STATES:
+            yield (
+                "ukz_uz_breaker_state", "gauge", "1 for the current UZ circuit breaker state",
+                {"state": state}, int(self.breaker.state == state)
+            )
+        for (from_state, to_state), count in self.breaker.transitions.items():
+            yield (
+                "ukz_uz_breaker_transitions_total", "counter", "UZ circuit breaker state transitions",
+                {"from": from_state, "to": to_state}, count
+            )
+        yield "ukz_uz_request_rate", "gauge", "Current UZ request rate limit (requests/s)", {}, self.rate_limiter.rate
+    
+    def _request(
+        self,
+        identity: SessionIdentity,
+        path: str,
+        params: Dict[str, Any],
+        headers: Dict[str, str]
+    ) -> Tuple[Any, Any, float]:
+        """Blocking request, runs inside the executor thread"""
+        with identity.lock:
+            started = time.monotonic()
+            response = identity.scraper.get(
+                f"{self.base_url}{path}",
+                params=params,
+                headers=headers,
+                proxies=identity.proxies,
+                timeout=10
+            )
+            latency = time.monotonic() - started
+        data = response.json() if response.status_code == 200 else None
+        return response, data, latency
+    
+    async def _get(self, path: str, params: Dict[str, Any]) -> Tuple[Any, Any]:
+        # Fail fast while UZ is throttling us instead of extending the block
+        self.breaker.before_request()
+        loop = asyncio.get_running_loop()
+        identity = self.session_pool.acquire()
+        started = time.monotonic()
+        
+        try:
+            await self.rate_limiter.acquire()
+            started = time.monotonic()
+            response, data, latency = await loop.run_in_executor(
+                self.executor,
+                partial(self._request, identity, path, params, self._get_headers(identity.session_id))
+            )
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            self.session_pool.record(identity, None, time.monotonic() - started)
+            uz_request_seconds.observe(time.monotonic() - started, path, "other")
+            self._record_failure()
+            raise
+        
+        self.session_pool.record(identity, response.status_code, latency)
+        uz_request_seconds.observe(latency, path, uz_status_label(response.status_code))
+        if is_error_status(response.status_code) or is_cloudflare_challenge(response):
+            self._record_failure(parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            self._record_success()
         
-        # Configure proxy if enabled
-        self.proxies = None
-        if config.PROXY_ENABLED and config.PROXY_HOST:
-            proxy_url = f"{config.PROXY_TYPE}://{config.PROXY_USER}:{config.PROXY_PASS}@{config.PROXY_HOST}:{config.PROXY_PORT}"
-            self.proxies = {
-                'http': proxy_url,
-                'https': proxy_url
-            }
-            logger.info(f"Proxy enabled: {config.PROXY_TYPE}://{config.PROXY_HOST}:{config.PROXY_PORT}")
+        return response, data
     
-    def _regenerate_session_id(self):
-        """Regenerate session ID when getting 441 error"""
-        old_session = self.session_id
-        self.session_id = str(uuid.uuid4())
-        logger.info(f"Regenerated session ID: {old_session[:8]}... -> {self.session_id[:8]}...")
+    def _record_failure(self, retry_after: Optional[float] = None):
+        self.breaker.record_failure(retry_after)
+        # Multiplicative decrease of the request rate while UZ pushes back
+        self.rate_limiter.set_rate(max(self.base_rate / 8, self.rate_limiter.rate / 2))
     
-    def _get_headers(self) -> Dict[str, str]:
+    def _record_success(self):
+        self.breaker.record_success()
+        # Additive increase back to the configured rate
+        if self.rate_limiter.rate < self.base_rate:
+            self.rate_limiter.set_rate(min(self.base_rate, self.rate_limiter.rate + self.base_rate / 20))
+    
+    async def warm_up(self):
+        """Open every pooled session against the booking site to collect Cloudflare cookies"""
+        loop = asyncio.get_running_loop()
+        
+        def visit(identity: SessionIdentity):
+            with identity.lock:
+                identity.scraper.get(
+                    config.UZ_WARMUP_URL,
+                    proxies=identity.proxies,
+                    timeout=10
+                )
+        
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, visit, identity) for identity in self.session_pool.identities),
+            return_exceptions=True
+        )
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        logger.info(f"Warmed up {len(results) - failed}/{len(results)} UZ sessions")
+    
+    def _get_headers(self, session_id: str) -> Dict[str, str]:
         return {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
             "Accept": "application/json",
@@ -52,7 +210,7 @@ class UZApiClient:
             "Origin": "https://booking.uz.gov.ua",
             "Referer": "https://booking.uz.gov.ua/",
             "X-Client-Locale": "uk",
-            "X-Session-Id": self.session_id,
+            "X-Session-Id": session_id,
             "X-User-Agent": "UZ/2 Web/1 User/guest",
             "sec-ch-ua": '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
             "sec-ch-ua-mobile": "?0",
@@ -63,17 +221,17 @@ class UZApiClient:
         }
     
     async def search_stations(self, search_query: str) -> List[Dict[str, Any]]:
+        return await self.cache.get_or_fetch(
+            ("stations", search_query.strip().lower()),
+            config.UZ_CACHE_STATIONS_TTL,
+            partial(self._search_stations, search_query)
+        )
+    
+    async def _search_stations(self, search_query: str) -> List[Dict[str, Any]]:
         try:
-            response = self.scraper.get(
-                f"{self.base_url}stations",
-                params={"search": search_query},
-                headers=self._get_headers(),
-                proxies=self.proxies,
-                timeout=10
-            )
+            response, data = await self._get("stations", {"search": search_query})
             
             if response.status_code == 200:
-                data = response.json()
                 logger.info(f"Found {len(data)} stations for query: {search_query}")
                 return data
             else:
@@ -85,6 +243,19 @@ class UZApiClient:
             raise UZApiException(f"Failed to search stations: {str(e)}")
     
     async def fetch_trains(
+        self, 
+        station_from_id: int, 
+        station_to_id: int, 
+        date_str: str, 
+        with_transfers: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        return await self.cache.get_or_fetch(
+            ("trips", station_from_id, station_to_id, with_transfers, date_str),
+            config.UZ_CACHE_TRIPS_TTL,
+            partial(self._fetch_trains, station_from_id, station_to_id, date_str, with_transfers)
+        )
+    
+    async def _fetch_trains(
         self, 
         station_from_id: int, 
         station_to_id: int, 
@@ -93,28 +264,23 @@ class UZApiClient:
         retry_on_441: bool = True
     ) -> Optional[Dict[str, Any]]:
         try:
-            response = self.scraper.get(
-                f"{self.base_url}v3/trips", 
-                params={
+            response, data = await self._get(
+                "v3/trips",
+                {
                     "station_from_id": station_from_id,
                     "station_to_id": station_to_id,
                     "with_transfers": with_transfers,
                     "date": date_str
-                },
-                headers=self._get_headers(),
-                proxies=self.proxies,
-                timeout=10
+                }
             )
             
             if response.status_code == 200:
-                data = response.json()
                 logger.info(f"Fetched trains for {date_str}: {station_from_id} -> {station_to_id}")
                 return data
             elif response.status_code == 441 and retry_on_441:
-                logger.warning(f"Got 441 error, regenerating session ID and retrying...")
-                self._regenerate_session_id()
-                # Retry once with new session ID
-                return await self.fetch_trains(
+                logger.warning(f"Got 441 error, retrying with another session...")
+                # The pool regenerated the failed session's ID; retry once on the next session
+                return await self._fetch_trains(
                     station_from_id, 
                     station_to_id, 
                     date_str, 
@@ -127,62 +293,74 @@ class UZApiClient:
                 logger.error(f"Request URL: {response.url}")
                 return None
                 
+        except CircuitOpenError as e:
+            logger.debug(f"Skipping trains fetch: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error fetching trains: {e}")
             return None
     
+    @staticmethod
+    def extract_tickets(
+        trains_data: Optional[Dict[str, Any]],
+        wagon_mask: int
+    ) -> List[TicketOffer]:
+        tickets = []
+        
+        if not trains_data or "direct" not in trains_data:
+            return tickets
+        
+        for trip in trains_data["direct"]:
+            if "train" in trip and "wagon_classes" in trip["train"]:
+                for wagon in trip["train"]["wagon_classes"]:
+                    wagon_type = wagon.get("id", "")
+                    free_seats = wagon.get("free_seats", 0)
+                    
+                    if WAGON_CLASS_BITS.get(wagon_type, 0) & wagon_mask and free_seats > 0:
+                        tickets.append(TicketOffer(
+                            train_number=trip["train"].get("number"),
+                            wagon_type=wagon_type,
+                            free_seats=free_seats,
+                            price=wagon.get("price"),
+                            depart_at=trip.get("depart_at"),
+                            arrive_at=trip.get("arrive_at"),
+                            wagon_name=wagon.get("name"),
+                            station_from=trip.get("station_from"),
+                            station_to=trip.get("station_to")
+                        ))
+        
+        return tickets
+    
+    @classmethod
+    def build_availability(
+        cls,
+        trains_by_date: Dict[date, Optional[Dict[str, Any]]],
+        wagon_mask: int
+    ) -> Availability:
+        results = Availability()
+        
+        for travel_date, trains_data in trains_by_date.items():
+            results.add(travel_date, cls.extract_tickets(trains_data, wagon_mask))
+        
+        return results
+    
     async def check_tickets_availability(
         self,
         station_from_id: int,
         station_to_id: int,
-        dates: List[str],
-        wagon_classes: List[str]
-    ) -> Dict[str, Any]:
-        results = {
-            "has_tickets": False,
-            "dates_with_tickets": [],
-            "details": {}
-        }
+        dates: List[date],
+        wagon_mask: int
+    ) -> Availability:
+        trains_by_date = {}
         
-        for idx, date in enumerate(dates):
-            trains_data = await self.fetch_trains(
+        for travel_date in dates:
+            trains_by_date[travel_date] = await self.fetch_trains(
                 station_from_id, 
                 station_to_id, 
-                date
+                travel_date.isoformat()
             )
-            
-            # Add delay between date checks to avoid rate limiting
-            if idx < len(dates) - 1:
-                await asyncio.sleep(random.uniform(1, 2))
-            
-            if trains_data and "direct" in trains_data:
-                for trip in trains_data["direct"]:
-                    if "train" in trip and "wagon_classes" in trip["train"]:
-                        for wagon in trip["train"]["wagon_classes"]:
-                            wagon_type = wagon.get("id", "")
-                            free_seats = wagon.get("free_seats", 0)
-                            
-                            if wagon_type in wagon_classes and free_seats > 0:
-                                results["has_tickets"] = True
-                                if date not in results["dates_with_tickets"]:
-                                    results["dates_with_tickets"].append(date)
-                                
-                                if date not in results["details"]:
-                                    results["details"][date] = []
-                                
-                                results["details"][date].append({
-                                    "train_number": trip["train"].get("number"),
-                                    "depart_at": trip.get("depart_at"),
-                                    "arrive_at": trip.get("arrive_at"),
-                                    "station_from": trip.get("station_from"),
-                                    "station_to": trip.get("station_to"),
-                                    "wagon_type": wagon_type,
-                                    "wagon_name": wagon.get("name"),
-                                    "free_seats": free_seats,
-                                    "price": wagon.get("price")
-                                })
         
-        return results
+        return self.build_availability(trains_by_date, wagon_mask)
     
     def generate_dates(self, start_date: str, days: int = 50) -> List[str]:
         try:
@@ -195,3 +373,8 @@ class UZApiClient:
         except Exception as e:
             logger.error(f"Error generating dates: {e}")
             return []
+
+
+# Shared by the bot handlers and the monitor so they use one session pool and cache
+uz_client = UZApiClient()
+metrics.collector(uz_client.collect_metrics)
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+import cloudscraper
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_scraper() -> cloudscraper.CloudScraper:
+    return cloudscraper.create_scraper(
+        browser={
+            'browser': 'chrome',
+            'platform': 'windows',
+            'desktop': True
+        }
+    )
+
+
+def is_error_status(status: Optional[int]) -> bool:
+    """441/429/5xx and transport errors (status None) count against a session"""
+    return status is None or status in (429, 441) or status >= 500
+
+
+class SessionIdentity:
+    """One UZ session: its X-Session-Id, cloudscraper session and optional proxy"""
+
+    def __init__(self, index: int, proxy_url: Optional[str] = None, window: int = 20):
+        self.index = index
+        self.session_id = str(uuid.uuid4())
+        self.proxy_url = proxy_url
+        self.proxies: Optional[Dict[str, str]] = (
+            {'http': proxy_url, 'https': proxy_url} if proxy_url else None
+        )
+        self.scraper = create_scraper()
+        # A cloudscraper session is not thread-safe, executor threads take turns
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)
+        self.quarantined_until = 0.0
+        self.quarantine_count = 0
+
+    def regenerate_session_id(self):
+        old_session = self.session_id
+        self.session_id = str(uuid.uuid4())
+        logger.info(
+            f"Session #{self.index}: regenerated session ID "
+            f"{old_session[:8]}... -> {self.session_id[:8]}..."
+        )
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for is_error, _ in self.outcomes if is_error) / len(self.outcomes)
+
+    @property
+    def avg_latency(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(latency for _, latency in self.outcomes) / len(self.outcomes)
+
+    @property
+    def score(self) -> float:
+        """Health score in [0, 1]; errors weigh most, slow sessions lose a little"""
+        latency_penalty = min(self.avg_latency / 10.0, 1.0) * 0.2
+        return max(0.0, 1.0 - self.error_rate - latency_penalty)
+
+    def is_quarantined(self, now: float) -> bool:
+        return self.quarantined_until > now
+
+
+class SessionPool:
+    """
+    Round-robin pool of pre-warmed UZ session identities
+
+    Each identity is scored by its recent 441/429/5xx rate and latency and is
+    quarantined (with growing duration) once its error rate crosses the
+    threshold, so throughput scales with the number of healthy identities.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        proxy_urls: Optional[List[str]] = None,
+        window: int = 20,
+        error_threshold: float = 0.5,
+        quarantine_seconds: int = 120,
+        max_quarantine_seconds: int = 1800
+    ):
+        proxy_urls = proxy_urls or [None]
+        self.identities = [
+            SessionIdentity(i, proxy_urls[i % len(proxy_urls)], window)
+            for i in range(max(1, size))
+        ]
+        self.error_threshold = error_threshold
+        self.min_samples = max(1, window // 4)
+        self.quarantine_seconds = quarantine_seconds
+        self.max_quarantine_seconds = max_quarantine_seconds
+        self._next = 0
+
+    def acquire(self) -> SessionIdentity:
+        now = time.monotonic()
+
+        for _ in range(len(self.identities)):
+            identity = self.identities[self._next]
+            self._next = (self._next + 1) % len(self.identities)
+            if not identity.is_quarantined(now):
+                return identity
+
+        # Everything is quarantined: use whichever is released first
+        return min(self.identities, key=lambda identity: identity.quarantined_until)
+
+    def record(self, identity: SessionIdentity, status: Optional[int], latency: float):
+        is_error = is_error_status(status)
+        identity.outcomes.append((is_error, latency))
+
+        if status == 441:
+            identity.regenerate_session_id()
+
+        if not is_error:
+            # Quarantine backoff resets only after a full healthy sample
+            if len(identity.outcomes) >= self.min_samples and identity.error_rate < self.error_threshold:
+                identity.quarantine_count = 0
+            return
+
+        if len(identity.outcomes) >= self.min_samples and identity.error_rate >= self.error_threshold:
+            duration = min(
+                self.quarantine_seconds * 2 ** identity.quarantine_count,
+                self.max_quarantine_seconds
+            )
+            identity.quarantined_until = time.monotonic() + duration
+            identity.quarantine_count += 1
+            identity.outcomes.clear()
+            logger.warning(
+                f"Session #{identity.index} quarantined for {duration}s "
+                f"(last status {status}, proxy {'yes' if identity.proxy_url else 'no'})"
+            )
+
+    def stats(self) -> List[Dict[str, float]]:
+        now = time.monotonic()
+        return [
+            {
+                "index": identity.index,
+                "score": round(identity.score, 3),
+                "error_rate": round(identity.error_rate, 3),
+                "avg_latency": round(identity.avg_latency, 3),
+                "quarantined": identity.is_quarantined(now)
+            }
+            for identity in self.identities
+        ]
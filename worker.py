@@ -0,0 +1,68 @@
+import asyncio
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from config import config
+from db.database import db
+from services.monitor_worker import MonitorWorker
+from services.telegram_caller import caller_instance
+from uz_api.client import uz_http_executor
+from utils.metrics import start_metrics_server
+from utils.telegram_logger import setup_logger, close_telegram_logging
+
+logger = setup_logger(__name__)
+
+
+async def main():
+    if not config.BOT_TOKEN:
+        logger.error("BOT_TOKEN not found in environment variables!")
+        return
+
+    logger.info("Initializing database...")
+    try:
+        await db.init_db()
+    except Exception as e:
+        logger.error(f"Failed to initialize database. Please check your DATABASE_URL in .env file.")
+        logger.error(f"Error: {e}")
+        return
+
+    if db.pool is None:
+        logger.error("Database pool is not initialized. Cannot continue.")
+        return
+
+    logger.info("Initializing Pyrogram caller...")
+    await caller_instance.initialize()
+
+    # Used only to send notifications, updates are polled by main.py
+    bot = Bot(
+        token=config.BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+    metrics_runner = None
+    if config.METRICS_PORT:
+        logger.info(f"Serving metrics on port {config.METRICS_PORT}")
+        metrics_runner = await start_metrics_server(config.METRICS_PORT)
+
+    worker = MonitorWorker(bot)
+
+    try:
+        await worker.start()
+    finally:
+        logger.info("Shutting down worker...")
+        await worker.stop()
+        await caller_instance.close()
+        uz_http_executor.shutdown(wait=False)
+        await db.close()
+        await bot.session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await close_telegram_logging()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")